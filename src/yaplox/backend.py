@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Hashable, List, Tuple
+
+from yaplox.expr import Call, Expr
+from yaplox.stmt import Block, Function, Stmt
+
+# How a function captures a variable when it is created: `(True, depth, slot)` for a
+# local of the enclosing function, `(False, index, 0)` for one of its upvalues.
+Upvalue = Tuple[bool, int, int]
+
+
+class Resolution(ABC):
+    """
+    What the Resolver finds out about the local variables of the statements.
+
+    Every use of a local variable of the current function is reported through
+    `resolve`, with the scope depth and the slot of the variable. Variables of
+    enclosing functions are captured by the closure, the hooks that describe those
+    have no effect unless they are overridden.
+    """
+
+    @abstractmethod
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        raise NotImplementedError
+
+    def resolve_cell(self, expr: Hashable, depth: int, slot: int):
+        """ Like `resolve`, for a variable that is stored in a Cell """
+
+    def resolve_upvalue(self, expr: Hashable, index: int):
+        """ `expr` uses the captured variable `index` of the current function """
+
+    def resolve_function(self, function: Function, upvalues: List[Upvalue]):
+        """ The variables `function` captures when it is created """
+
+    def elide_scope(self, block: Block):
+        """
+        `block` declares no variables and gets no scope, it runs in the scope around
+        it. The depths the resolver reports don't count it.
+        """
+
+    def capture(self, declaration: Hashable):
+        """
+        The variable declared by `declaration` is captured by a closure, and has to
+        be stored in a Cell. `declaration` is the name token of the declaration,
+        the method for `this` and the class for `super`.
+        """
+
+    def declare(self, declaration: Hashable, uses: List[Hashable]):
+        """
+        The scope of the variable declared by `declaration` ended. `uses` are the
+        nodes that read or assign it in the function it belongs to, uses in the
+        closures that captured it are not included.
+        """
+
+
+class Backend(Resolution):
+    """
+    An execution engine for resolved Lox statements. The Resolver reports the local
+    variables to it, after which `interpret` runs the statements.
+    """
+
+    # Whether the backend can run a LazyFunction, of which the body is parsed and
+    # resolved when it is first called
+    lazy_functions = False
+
+    def inline(self, call: Call, function: Function, value: Expr):
+        """
+        `call` calls the global function `function`, unless it was reassigned. All
+        the function does is return `value`, which can be evaluated in place of the
+        call, with the arguments as the scope of the function.
+        """
+
+    @abstractmethod
+    def interpret(self, statements: List[Stmt], on_error=None) -> Any:
+        raise NotImplementedError
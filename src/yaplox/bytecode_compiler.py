@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from yaplox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from yaplox.function_type import FunctionType
+from yaplox.op_code import OpCode
+from yaplox.stmt import (
+    Block,
+    Class,
+    Expression,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.vm_objects import VMFunction
+
+_BINARY_OPCODES = {
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.STAR: OpCode.MULTIPLY,
+}
+
+
+class Local:
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+    """
+    Bookkeeping for the function that is being compiled. In clox this is the
+    Compiler struct; every function declaration pushes a new one.
+    """
+
+    def __init__(
+        self,
+        enclosing: Optional[FunctionState],
+        function_type: FunctionType,
+        function: VMFunction,
+    ):
+        self.enclosing = enclosing
+        self.function_type = function_type
+        self.function = function
+        self.upvalues: List[Tuple[bool, int]] = []
+        self.scope_depth = 0
+
+        # Slot zero holds the receiver in methods, and the called function otherwise
+        slot_zero = ""
+        if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            slot_zero = "this"
+        self.locals: List[Local] = [Local(slot_zero, 0)]
+
+    def resolve_local(self, name: str) -> Optional[int]:
+        for slot in range(len(self.locals) - 1, -1, -1):
+            if self.locals[slot].name == name:
+                return slot
+        return None
+
+    def resolve_upvalue(self, name: str) -> Optional[int]:
+        if self.enclosing is None:
+            return None
+
+        local = self.enclosing.resolve_local(name)
+        if local is not None:
+            self.enclosing.locals[local].is_captured = True
+            return self._add_upvalue(True, local)
+
+        upvalue = self.enclosing.resolve_upvalue(name)
+        if upvalue is not None:
+            return self._add_upvalue(False, upvalue)
+
+        return None
+
+    def _add_upvalue(self, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue in self.upvalues:
+            return self.upvalues.index(upvalue)
+
+        self.upvalues.append(upvalue)
+        self.function.upvalue_count = len(self.upvalues)
+        return len(self.upvalues) - 1
+
+
+class BytecodeCompiler(ExprVisitor, StmtVisitor):
+    """
+    Compile resolved statements into bytecode for the VM.
+
+    The Resolver has already reported every static error, so the compiler can trust
+    the tree. Like clox it keeps track of the local variables itself: locals live in
+    stack slots, variables of enclosing functions are reached through upvalues and
+    everything else is a global.
+    """
+
+    def __init__(self):
+        self.current: Optional[FunctionState] = None
+        self.line = 1
+
+    def compile(self, statements: List[Stmt]) -> VMFunction:
+        self.current = FunctionState(None, FunctionType.NONE, VMFunction())
+        for statement in statements:
+            self._compile_statement(statement)
+        self._emit_return()
+        return self.current.function
+
+    @property
+    def _state(self) -> FunctionState:
+        return self.current  # type: ignore
+
+    def _compile_statement(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def _compile_expression(self, expr: Expr):
+        expr.accept(self)
+
+    def _emit(self, *code: int) -> int:
+        """ Emit bytes at the current line, and return the offset of the last one """
+        chunk = self._state.function.chunk
+        offset = 0
+        for byte in code:
+            offset = chunk.write(byte, self.line)
+        return offset
+
+    def _emit_jump(self, instruction: OpCode) -> int:
+        """ Emit a jump with a placeholder target, the offset is used to patch it """
+        return self._emit(instruction, -1)
+
+    def _patch_jump(self, offset: int):
+        self._state.function.chunk.code[offset] = len(self._state.function.chunk.code)
+
+    def _emit_return(self):
+        if self._state.function_type == FunctionType.INITIALIZER:
+            self._emit(OpCode.GET_LOCAL, 0)
+        else:
+            self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+
+    def _make_constant(self, value) -> int:
+        return self._state.function.chunk.add_constant(value)
+
+    def _begin_scope(self):
+        self._state.scope_depth += 1
+
+    def _end_scope(self):
+        state = self._state
+        state.scope_depth -= 1
+
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals.pop().is_captured:
+                self._emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self._emit(OpCode.POP)
+
+    def _add_local(self, name: str):
+        self._state.locals.append(Local(name, self._state.scope_depth))
+
+    def _define_variable(self, name: Token):
+        """
+        Store the value on top of the stack in the variable `name`. Locals simply
+        stay in their stack slot, globals are moved into the globals table.
+        """
+        if self._state.scope_depth > 0:
+            self._add_local(name.lexeme)
+            return
+
+        self.line = name.line
+        self._emit(OpCode.DEFINE_GLOBAL, self._make_constant(name.lexeme))
+
+    def _named_variable(self, name: Token, value: Optional[Expr] = None):
+        """ Read the variable `name`, or assign `value` to it """
+        state = self._state
+        slot = state.resolve_local(name.lexeme)
+        if slot is not None:
+            get_op, set_op, operand = OpCode.GET_LOCAL, OpCode.SET_LOCAL, slot
+        else:
+            upvalue = state.resolve_upvalue(name.lexeme)
+            if upvalue is not None:
+                get_op, set_op, operand = (
+                    OpCode.GET_UPVALUE,
+                    OpCode.SET_UPVALUE,
+                    upvalue,
+                )
+            else:
+                get_op, set_op = OpCode.GET_GLOBAL, OpCode.SET_GLOBAL
+                operand = self._make_constant(name.lexeme)
+
+        if value is None:
+            self.line = name.line
+            self._emit(get_op, operand)
+        else:
+            self._compile_expression(value)
+            self.line = name.line
+            self._emit(set_op, operand)
+
+    def _function(self, stmt: Function, function_type: FunctionType):
+        function = VMFunction(stmt.name.lexeme, len(stmt.params))
+        self.current = FunctionState(self.current, function_type, function)
+        self._begin_scope()
+
+        for param in stmt.params:
+            self._add_local(param.lexeme)
+
+        for statement in stmt.body:
+            self._compile_statement(statement)
+        self._emit_return()
+
+        state = self._state
+        self.current = state.enclosing
+
+        self.line = stmt.name.line
+        operands = [OpCode.CLOSURE, self._make_constant(function)]
+        for is_local, index in state.upvalues:
+            operands.extend((int(is_local), index))
+        self._emit(*operands)
+
+    def visit_assign_expr(self, expr: Assign):
+        self._named_variable(expr.name, expr.value)
+
+    def visit_binary_expr(self, expr: Binary):
+        self._compile_expression(expr.left)
+        self._compile_expression(expr.right)
+        self.line = expr.operator.line
+        self._emit(_BINARY_OPCODES[expr.operator.token_type])
+
+    def visit_call_expr(self, expr: Call):
+        callee = expr.callee
+        if isinstance(callee, Get):
+            # Calling a method directly skips creating a bound method
+            self._compile_expression(callee.obj)
+            name = self._make_constant(callee.name.lexeme)
+            instruction = OpCode.INVOKE
+        elif isinstance(callee, Super):
+            self.line = callee.keyword.line
+            self._named_variable(Token(TokenType.THIS, "this", None, self.line))
+            name = self._make_constant(callee.method.lexeme)
+            instruction = OpCode.SUPER_INVOKE
+        else:
+            self._compile_expression(callee)
+            for argument in expr.arguments:
+                self._compile_expression(argument)
+            self.line = expr.paren.line
+            self._emit(OpCode.CALL, len(expr.arguments))
+            return
+
+        for argument in expr.arguments:
+            self._compile_expression(argument)
+
+        if instruction == OpCode.SUPER_INVOKE:
+            self._named_variable(Token(TokenType.SUPER, "super", None, self.line))
+        self.line = expr.paren.line
+        self._emit(instruction, name, len(expr.arguments))
+
+    def visit_get_expr(self, expr: Get):
+        self._compile_expression(expr.obj)
+        self.line = expr.name.line
+        self._emit(OpCode.GET_PROPERTY, self._make_constant(expr.name.lexeme))
+
+    def visit_grouping_expr(self, expr: Grouping):
+        self._compile_expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal):
+        if expr.value is None:
+            self._emit(OpCode.NIL)
+        elif expr.value is True:
+            self._emit(OpCode.TRUE)
+        elif expr.value is False:
+            self._emit(OpCode.FALSE)
+        else:
+            self._emit(OpCode.CONSTANT, self._make_constant(expr.value))
+
+    def visit_logical_expr(self, expr: Logical):
+        self._compile_expression(expr.left)
+
+        if expr.operator.token_type == TokenType.OR:
+            else_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump = self._emit_jump(OpCode.JUMP)
+            self._patch_jump(else_jump)
+        else:
+            end_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+
+        self._emit(OpCode.POP)
+        self._compile_expression(expr.right)
+        self._patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: Set):
+        self._compile_expression(expr.obj)
+        self._compile_expression(expr.value)
+        self.line = expr.name.line
+        self._emit(OpCode.SET_PROPERTY, self._make_constant(expr.name.lexeme))
+
+    def visit_super_expr(self, expr: Super):
+        self.line = expr.keyword.line
+        self._named_variable(Token(TokenType.THIS, "this", None, self.line))
+        self._named_variable(expr.keyword)
+        self.line = expr.method.line
+        self._emit(OpCode.GET_SUPER, self._make_constant(expr.method.lexeme))
+
+    def visit_this_expr(self, expr: This):
+        self._named_variable(expr.keyword)
+
+    def visit_unary_expr(self, expr: Unary):
+        self._compile_expression(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.token_type == TokenType.MINUS:
+            self._emit(OpCode.NEGATE)
+        else:
+            self._emit(OpCode.NOT)
+
+    def visit_variable_expr(self, expr: Variable):
+        self._named_variable(expr.name)
+
+    def visit_block_stmt(self, stmt: Block):
+        self._begin_scope()
+        for statement in stmt.statements:
+            self._compile_statement(statement)
+        self._end_scope()
+
+    def visit_class_stmt(self, stmt: Class):
+        self.line = stmt.name.line
+        self._emit(OpCode.CLASS, self._make_constant(stmt.name.lexeme))
+        self._define_variable(stmt.name)
+
+        if stmt.superclass is not None:
+            self._named_variable(stmt.superclass.name)
+            self._begin_scope()
+            self._add_local("super")
+            self._named_variable(stmt.name)
+            self.line = stmt.superclass.name.line
+            self._emit(OpCode.INHERIT)
+
+        self._named_variable(stmt.name)
+        for method in stmt.methods:
+            function_type = FunctionType.METHOD
+            if method.name.lexeme == "init":
+                function_type = FunctionType.INITIALIZER
+            self._function(method, function_type)
+            self._emit(OpCode.METHOD, self._make_constant(method.name.lexeme))
+        self._emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self._end_scope()
+
+    def visit_expression_stmt(self, stmt: Expression):
+        self._compile_expression(stmt.expression)
+        self._emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt: Function):
+        if self._state.scope_depth > 0:
+            # Declare the local before compiling the body, so it can call itself
+            self._add_local(stmt.name.lexeme)
+            self._function(stmt, FunctionType.FUNCTION)
+            return
+
+        self._function(stmt, FunctionType.FUNCTION)
+        self._define_variable(stmt.name)
+
+    def visit_if_stmt(self, stmt: If):
+        # Compile `else if` chains in a loop, they can be longer than the stack is
+        # deep. Every branch that ran jumps to the end of the chain.
+        end_jumps = []
+        else_branch: Optional[Stmt] = stmt
+        while isinstance(else_branch, If):
+            self._compile_expression(else_branch.condition)
+
+            then_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+            self._emit(OpCode.POP)
+            self._compile_statement(else_branch.then_branch)
+
+            end_jumps.append(self._emit_jump(OpCode.JUMP))
+            self._patch_jump(then_jump)
+            self._emit(OpCode.POP)
+            else_branch = else_branch.else_branch
+
+        if else_branch is not None:
+            self._compile_statement(else_branch)
+        for end_jump in end_jumps:
+            self._patch_jump(end_jump)
+
+    def visit_print_stmt(self, stmt: Print):
+        self._compile_expression(stmt.expression)
+        self._emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self._emit_return()
+        else:
+            self._compile_expression(stmt.value)
+            self._emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: Var):
+        self.line = stmt.name.line
+        if stmt.initializer is None:
+            self._emit(OpCode.NIL)
+        else:
+            self._compile_expression(stmt.initializer)
+
+        self._define_variable(stmt.name)
+
+    def visit_while_stmt(self, stmt: While):
+        loop_start = len(self._state.function.chunk.code)
+        self._compile_expression(stmt.condition)
+
+        exit_jump = self._emit_jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._compile_statement(stmt.body)
+        self._emit(OpCode.LOOP, loop_start)
+
+        self._patch_jump(exit_jump)
+        self._emit(OpCode.POP)
@@ -0,0 +1,14 @@
+from typing import Any
+
+
+class Cell:
+    """
+    Holds a local variable that a closure captured. The scope that declares the
+    variable and every closure that captures it share the same cell, like upvalues
+    in clox.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, Tuple
+
+from yaplox.op_code import OpCode
+
+# Instructions that read a single operand from the code array. CLOSURE has a variable
+# number of operands, INVOKE and SUPER_INVOKE have two.
+_ONE_OPERAND = {
+    OpCode.CONSTANT,
+    OpCode.GET_LOCAL,
+    OpCode.SET_LOCAL,
+    OpCode.GET_GLOBAL,
+    OpCode.DEFINE_GLOBAL,
+    OpCode.SET_GLOBAL,
+    OpCode.GET_UPVALUE,
+    OpCode.SET_UPVALUE,
+    OpCode.GET_PROPERTY,
+    OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER,
+    OpCode.JUMP,
+    OpCode.JUMP_IF_FALSE,
+    OpCode.LOOP,
+    OpCode.CALL,
+    OpCode.CLASS,
+    OpCode.METHOD,
+}
+
+# Instructions whose first operand is an index in the constant pool
+_CONSTANT_OPERAND = {
+    OpCode.CONSTANT,
+    OpCode.GET_GLOBAL,
+    OpCode.DEFINE_GLOBAL,
+    OpCode.SET_GLOBAL,
+    OpCode.GET_PROPERTY,
+    OpCode.SET_PROPERTY,
+    OpCode.GET_SUPER,
+    OpCode.INVOKE,
+    OpCode.SUPER_INVOKE,
+    OpCode.CLOSURE,
+    OpCode.CLASS,
+    OpCode.METHOD,
+}
+
+
+class Chunk:
+    """
+    A sequence of bytecode. `code` is a flat array of opcodes and their operands,
+    `lines` holds the source line of every entry in `code` for error reporting and
+    `constants` is the constant pool the instructions refer to by index.
+    """
+
+    def __init__(self):
+        self.code: List[int] = []
+        self.lines: List[int] = []
+        self.constants: List[Any] = []
+        self._constant_index: Dict[Tuple[type, str], int] = {}
+
+    def write(self, byte: int, line: int) -> int:
+        """ Append a byte to the code, and return its offset """
+        self.code.append(byte)
+        self.lines.append(line)
+        return len(self.code) - 1
+
+    def add_constant(self, value: Any) -> int:
+        """
+        Add a value to the constant pool and return its index. Numbers and strings
+        are stored once. The key is the type and the repr, since `1.0 == True` and
+        `-0.0 == 0.0`.
+        """
+        if isinstance(value, (float, str)):
+            key = (type(value), repr(value))
+            if key not in self._constant_index:
+                self.constants.append(value)
+                self._constant_index[key] = len(self.constants) - 1
+            return self._constant_index[key]
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def disassemble(self) -> List[str]:
+        """ Return a human readable listing of the instructions in this chunk """
+        listing = []
+        offset = 0
+        while offset < len(self.code):
+            op = OpCode(self.code[offset])
+            operands: List[Any] = []
+            size = 1
+            if op in _ONE_OPERAND:
+                operands = [self.code[offset + 1]]
+                size = 2
+            elif op in (OpCode.INVOKE, OpCode.SUPER_INVOKE):
+                operands = self.code[offset + 1 : offset + 3]
+                size = 3
+            elif op == OpCode.CLOSURE:
+                function = self.constants[self.code[offset + 1]]
+                size = 2 + 2 * function.upvalue_count
+                operands = self.code[offset + 1 : offset + size]
+
+            text = f"{offset:04} {self.lines[offset]:4} {op.name}"
+            if operands:
+                text += " " + " ".join(str(operand) for operand in operands)
+            if op in _CONSTANT_OPERAND:
+                text += f" '{self.constants[operands[0]]}'"
+            listing.append(text)
+            offset += size
+        return listing
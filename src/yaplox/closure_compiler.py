@@ -0,0 +1,852 @@
+from __future__ import annotations
+
+from operator import ge, gt, le, lt, mul, sub, truediv
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from typing import Set as SetType
+from typing import Tuple
+
+from yaplox.backend import Backend, Upvalue
+from yaplox.cell import Cell
+from yaplox.clock import Clock
+from yaplox.environment import Environment
+from yaplox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from yaplox.global_environment import UNDEFINED, GlobalEnvironment
+from yaplox.inline_cache import GetCache, SetCache
+from yaplox.interpreter import Interpreter
+from yaplox.return_value import ReturnValue, TailCall
+from yaplox.stmt import (
+    Block,
+    Class,
+    Expression,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.yaplox_callable import YaploxCallable
+from yaplox.yaplox_class import YaploxClass
+from yaplox.yaplox_function import YaploxFunction
+from yaplox.yaplox_instance import YaploxInstance
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+# A compiled node. It is called with the environment it runs in, and returns the value
+# of the expression. Statements return None, or a ReturnValue when they returned.
+Closure = Callable[[Environment], Any]
+
+
+class CompiledFunction(YaploxFunction):
+    """
+    A YaploxFunction that runs a compiled body instead of walking its declaration.
+    """
+
+    def __init__(
+        self,
+        declaration: Function,
+        upvalues: List[Cell],
+        is_initializer: bool,
+        body: Closure,
+        boxed: Optional[Tuple[bool, ...]],
+        receiver: Optional[YaploxInstance] = None,
+    ):
+        super().__init__(declaration, upvalues, is_initializer, receiver)
+        self.body = body
+        # Which of `this` and the parameters are stored in a Cell, None if none are
+        self.boxed = boxed
+
+    def bind(self, instance: YaploxInstance) -> CompiledFunction:
+        return CompiledFunction(
+            self.declaration,
+            self.upvalues,
+            self.is_initializer,
+            self.body,
+            self.boxed,
+            receiver=instance,
+        )
+
+    def call(self, interpreter, arguments):
+        return self.invoke(interpreter, self.receiver, arguments)
+
+    def invoke(self, interpreter, receiver, arguments):
+        # Every call builds a new list of arguments, so it can become the scope
+        return self.enter(arguments if receiver is None else [receiver, *arguments])
+
+    def enter(self, values: List[Any]) -> Any:
+        """
+        Run the body with `values` as its scope, for a method the receiver comes
+        first. The list is owned by the call from here on. When the body ends in a
+        tail call, the called function runs next in this loop.
+        """
+        function = self
+        while True:
+            environment = Environment(upvalues=function.upvalues)
+            receiver = values[0] if function.is_initializer else None
+            if function.boxed is not None:
+                values = [
+                    Cell(value) if boxed else value
+                    for value, boxed in zip(values, function.boxed)
+                ]
+            environment.values = values
+            completion = function.body(environment)
+
+            if function.is_initializer:
+                return receiver
+            if completion is None:
+                return None
+            if type(completion) is not TailCall:
+                return completion.value
+            function = completion.function
+            values = completion.arguments
+            if completion.receiver is not None:
+                values.insert(0, completion.receiver)
+
+
+class ClosureCompiler(Backend, ExprVisitor, StmtVisitor):
+    """
+    Execute statements by compiling them into nested Python closures.
+
+    The tree is walked once. Every node becomes a closure with the resolved variable
+    depth and slot, the operator and literal values baked in, so running a loop no
+    longer pays for the visitor double dispatch on every node.
+    """
+
+    def __init__(self):
+        self.globals = GlobalEnvironment()
+        self.locals: Dict[Hashable, Tuple[int, int]] = dict()
+        self.cells: Dict[Hashable, Tuple[int, int]] = dict()
+        self.upvalues: Dict[Hashable, int] = dict()
+        self.captured: SetType[Hashable] = set()
+        self.functions: Dict[Function, List[Upvalue]] = dict()
+        self.elided: SetType[Block] = set()
+        self.inlined: Dict[Call, Tuple[Function, Expr]] = dict()
+        # The compiled value of every inlined function, shared by its calls
+        self.inlined_bodies: Dict[Function, Closure] = dict()
+
+        self.globals.define("clock", Clock())
+
+    def interpret(self, statements: List[Stmt], on_error=None) -> Any:
+        try:
+            compiled = [
+                # Just like the Interpreter, return the last value to ease testing
+                (
+                    self._compile_expression(statement.expression)
+                    if isinstance(statement, Expression)
+                    else self._compile_statement(statement)
+                )
+                for statement in statements
+            ]
+            res = None
+            for statement in compiled:
+                res = statement(self.globals)
+            return res
+        except YaploxRuntimeError as excp:
+            on_error(excp)
+
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        self.locals[expr] = (depth, slot)
+
+    def resolve_cell(self, expr: Hashable, depth: int, slot: int):
+        self.cells[expr] = (depth, slot)
+
+    def resolve_upvalue(self, expr: Hashable, index: int):
+        self.upvalues[expr] = index
+
+    def resolve_function(self, function: Function, upvalues: List[Upvalue]):
+        self.functions[function] = upvalues
+
+    def capture(self, declaration: Hashable):
+        self.captured.add(declaration)
+
+    def elide_scope(self, block: Block):
+        self.elided.add(block)
+
+    def inline(self, call: Call, function: Function, value: Expr):
+        self.inlined[call] = (function, value)
+
+    def _compile_expression(self, expr: Expr) -> Closure:
+        return expr.accept(self)
+
+    def _compile_statement(self, stmt: Stmt) -> Closure:
+        return stmt.accept(self)
+
+    def _compile_statements(self, statements: List[Stmt]) -> Closure:
+        compiled = tuple(self._compile_statement(statement) for statement in statements)
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def sequence(env):
+            for statement in compiled:
+                completion = statement(env)
+                if completion is not None:
+                    return completion
+
+        return sequence
+
+    def _variable_getter(self, name: Token, expr: Hashable) -> Closure:
+        resolved = self.locals.get(expr)
+
+        if resolved is None:
+            return self._captured_getter(name, expr)
+        distance, slot = resolved
+        if distance == 0:
+            return lambda env: env.values[slot]
+        if distance == 1:
+            return lambda env: env.enclosing.values[slot]  # type: ignore
+        return lambda env: env.get_at(distance, slot)
+
+    def _captured_getter(self, name: Token, expr: Hashable) -> Closure:
+        index = self.upvalues.get(expr)
+        if index is not None:
+            return lambda env: env.upvalues[index].value
+
+        resolved = self.cells.get(expr)
+        if resolved is None:
+            return self._global_getter(name)
+        distance, slot = resolved
+        if distance == 0:
+            return lambda env: env.values[slot].value
+        return lambda env: env.get_at(distance, slot).value
+
+    def _global_getter(self, name: Token) -> Closure:
+        values = self.globals.values
+        slot = self.globals.slot(name.lexeme)
+
+        def get_global(env):
+            value = values[slot]
+            if value is UNDEFINED:
+                raise YaploxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+            return value
+
+        return get_global
+
+    def _closure(self, function: Function) -> Callable[[Environment], List[Cell]]:
+        """ Compile capturing the variables `function` uses, when it is created """
+        upvalues = self.functions[function]
+
+        def closure(env):
+            return [
+                env.get_at(depth, slot) if is_local else env.upvalues[depth]
+                for is_local, depth, slot in upvalues
+            ]
+
+        return closure
+
+    def _boxed(self, function: Function, is_method: bool) -> Optional[Tuple[bool, ...]]:
+        declarations: List[Hashable] = list(function.params)
+        if is_method:
+            declarations.insert(0, function)
+        boxed = tuple(declaration in self.captured for declaration in declarations)
+        return boxed if any(boxed) else None
+
+    def _define(self, name: Token) -> Callable[[Environment, Callable[[], Any]], None]:
+        """
+        Compile defining a function or class. `create` is called once the variable
+        exists, so a captured function or class can refer to itself.
+        """
+        lexeme = name.lexeme
+        if name not in self.captured:
+            return lambda env, create: env.define(lexeme, create())
+
+        def define_cell(env, create):
+            cell = Cell(None)
+            env.define(lexeme, cell)
+            cell.value = create()
+
+        return define_cell
+
+    def visit_assign_expr(self, expr: Assign) -> Closure:
+        value = self._compile_expression(expr.value)
+        resolved = self.locals.get(expr)
+
+        if resolved is None:
+            return self._assign_captured(expr, value)
+
+        distance, slot = resolved
+        if distance == 0:
+
+            def assign_local(env):
+                result = value(env)
+                env.values[slot] = result
+                return result
+
+            return assign_local
+
+        def assign_at(env):
+            result = value(env)
+            env.assign_at(distance, slot, result)
+            return result
+
+        return assign_at
+
+    def _assign_captured(self, expr: Assign, value: Closure) -> Closure:
+        index = self.upvalues.get(expr)
+        if index is not None:
+
+            def assign_upvalue(env):
+                result = value(env)
+                env.upvalues[index].value = result
+                return result
+
+            return assign_upvalue
+
+        resolved = self.cells.get(expr)
+        if resolved is None:
+            assign_slot = self.globals.assign_slot
+            name = expr.name
+            slot = self.globals.slot(name.lexeme)
+
+            def assign_global(env):
+                result = value(env)
+                assign_slot(slot, name, result)
+                return result
+
+            return assign_global
+
+        distance, slot = resolved
+
+        def assign_cell(env):
+            result = value(env)
+            env.get_at(distance, slot).value = result
+            return result
+
+        return assign_cell
+
+    @staticmethod
+    def _plus(left: Closure, right: Closure, operator: Token) -> Closure:
+        number = (float, int)
+
+        def plus(env):
+            a = left(env)
+            b = right(env)
+            if isinstance(a, number) and isinstance(b, number):
+                return a + b
+            if isinstance(a, str) and isinstance(b, str):
+                return a + b
+            raise YaploxRuntimeError(
+                operator, "Operands must be two numbers or two strings"
+            )
+
+        return plus
+
+    def visit_binary_expr(self, expr: Binary) -> Closure:
+        left = self._compile_expression(expr.left)
+        right = self._compile_expression(expr.right)
+        operator = expr.operator
+        token_type = operator.token_type
+        number = (float, int)
+
+        if token_type == TokenType.PLUS:
+            return self._plus(left, right, operator)
+
+        if token_type == TokenType.EQUAL_EQUAL:
+            return lambda env: left(env) == right(env)
+
+        if token_type == TokenType.BANG_EQUAL:
+            return lambda env: left(env) != right(env)
+
+        operations = {
+            TokenType.GREATER: gt,
+            TokenType.GREATER_EQUAL: ge,
+            TokenType.LESS: lt,
+            TokenType.LESS_EQUAL: le,
+            TokenType.MINUS: sub,
+            TokenType.SLASH: truediv,
+            TokenType.STAR: mul,
+        }
+        try:
+            operation = operations[token_type]
+        except KeyError:
+            raise YaploxRuntimeError(operator, f"Unknown operator {operator.lexeme}")
+
+        def arithmetic(env):
+            a = left(env)
+            b = right(env)
+            if isinstance(a, number) and isinstance(b, number):
+                return operation(a, b)
+            raise YaploxRuntimeError(operator, "Operands must be numbers.")
+
+        return arithmetic
+
+    def visit_call_expr(self, expr: Call) -> Closure:
+        if type(expr.callee) is Get:
+            return self._invoke(expr, expr.callee)
+        if expr in self.inlined:
+            return self._inlined(expr, *self.inlined[expr])
+
+        callee = self._compile_expression(expr.callee)
+        arguments = tuple(
+            self._compile_expression(argument) for argument in expr.arguments
+        )
+        paren = expr.paren
+        call_value = self._call
+
+        def call(env):
+            try:
+                function = callee(env)
+                if type(function) is YaploxClass:
+                    # The instance is placed in front of the arguments, where the
+                    # initializer expects `this`
+                    instance = YaploxInstance(function)
+                    values = [instance]
+                    values.extend([argument(env) for argument in arguments])
+                    initializer = function.initializer
+                    if initializer is None or initializer.arity() != len(arguments):
+                        return call_value(paren, function, values[1:])
+                    # The classes this backend creates only have compiled methods
+                    initializer.enter(values)  # type: ignore
+                    return instance
+
+                values = [argument(env) for argument in arguments]
+                return call_value(paren, function, values)
+            except RecursionError:
+                # Every Lox call nests Python calls, the innermost call reports it
+                raise YaploxRuntimeError(paren, "Stack overflow.")
+
+        return call
+
+    def _inlined(self, expr: Call, function: Function, value: Expr) -> Closure:
+        """
+        Compile the `value` that `function` returns into the call, it is evaluated
+        with the arguments as its scope as long as the callee is that function.
+        """
+        callee = self._compile_expression(expr.callee)
+        arguments = tuple(
+            self._compile_expression(argument) for argument in expr.arguments
+        )
+        body = self.inlined_bodies.get(function)
+        if body is None:
+            # Compiled once, an inlined body that calls helpers would otherwise be
+            # compiled again for every call it makes
+            body = self.inlined_bodies[function] = self._compile_expression(value)
+        paren = expr.paren
+        call_value = self._call
+
+        def inlined(env):
+            try:
+                called = callee(env)
+                values = [argument(env) for argument in arguments]
+                if type(called) is CompiledFunction and called.declaration is function:
+                    environment = Environment(upvalues=called.upvalues)
+                    environment.values = values
+                    return body(environment)
+                return call_value(paren, called, values)
+            except RecursionError:
+                raise YaploxRuntimeError(paren, "Stack overflow.")
+
+        return inlined
+
+    def _call(self, paren: Token, function: Any, values: List[Any]) -> Any:
+        if not isinstance(function, YaploxCallable):
+            raise YaploxRuntimeError(paren, "Can only call functions and classes.")
+
+        Interpreter._check_arity(paren, function, values)
+        return function.call(self, values)
+
+    def _tail_call(self, expr: Call) -> Closure:
+        """
+        Compile `return f(...)`. A Lox function isn't called here: the TailCall lets
+        the function that returns run it instead, in the same Python frame.
+        """
+        if type(expr.callee) is Get:
+            return self._invoke(expr, expr.callee, tail=True)
+
+        callee = self._compile_expression(expr.callee)
+        arguments = tuple(
+            self._compile_expression(argument) for argument in expr.arguments
+        )
+        paren = expr.paren
+        tail = self._tail
+
+        def tail_call(env):
+            function = callee(env)
+            return tail(paren, function, [argument(env) for argument in arguments])
+
+        return tail_call
+
+    def _tail(self, paren: Token, function: Any, values: List[Any]) -> ReturnValue:
+        if type(function) is not CompiledFunction:
+            return ReturnValue(self._call(paren, function, values))
+
+        Interpreter._check_arity(paren, function, values)
+        return TailCall(function, function.receiver, values)
+
+    def _invoke(self, expr: Call, callee: Get, tail: bool = False) -> Closure:
+        """
+        Call a property, like `object.method()`. A method gets the instance passed
+        directly, without creating a bound method first. With `tail` the closure
+        gives the completion of returning the result instead.
+        """
+        obj = self._compile_expression(callee.obj)
+        name = callee.name
+        arguments = tuple(
+            self._compile_expression(argument) for argument in expr.arguments
+        )
+        paren = expr.paren
+        call_value = self._tail if tail else self._call
+        check_arity = Interpreter._check_arity
+        interpreter = self
+        cache = GetCache()
+
+        def invoke(env):
+            try:
+                instance = obj(env)
+                if not isinstance(instance, YaploxInstance):
+                    raise YaploxRuntimeError(name, "Only instances have properties.")
+
+                entry = cache.get(instance.shape)
+                if entry is None:
+                    entry = cache.miss(instance, name)
+                values = [argument(env) for argument in arguments]
+                if type(entry) is int:
+                    # A field, which may hold any callable
+                    return call_value(paren, instance.values[entry], values)
+
+                check_arity(paren, entry, values)
+                if tail:
+                    return TailCall(entry, instance, values)
+                return entry.invoke(interpreter, instance, values)
+            except RecursionError:
+                raise YaploxRuntimeError(paren, "Stack overflow.")
+
+        return invoke
+
+    def visit_get_expr(self, expr: Get) -> Closure:
+        obj = self._compile_expression(expr.obj)
+        name = expr.name
+        cache = GetCache()
+
+        def get(env):
+            instance = obj(env)
+            if isinstance(instance, YaploxInstance):
+                entry = cache.get(instance.shape)
+                if entry is None:
+                    entry = cache.miss(instance, name)
+                if type(entry) is int:
+                    return instance.values[entry]
+                return entry.bind(instance)
+
+            raise YaploxRuntimeError(name, "Only instances have properties.")
+
+        return get
+
+    def visit_grouping_expr(self, expr: Grouping) -> Closure:
+        # A grouping only changes how the tree was parsed, there is nothing to run
+        return self._compile_expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> Closure:
+        value = expr.value
+        return lambda env: value
+
+    def visit_logical_expr(self, expr: Logical) -> Closure:
+        left = self._compile_expression(expr.left)
+        right = self._compile_expression(expr.right)
+
+        if expr.operator.token_type == TokenType.OR:
+
+            def logical_or(env):
+                value = left(env)
+                if value is None or value is False:
+                    return right(env)
+                return value
+
+            return logical_or
+
+        def logical_and(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return logical_and
+
+    def visit_set_expr(self, expr: Set) -> Closure:
+        obj = self._compile_expression(expr.obj)
+        value = self._compile_expression(expr.value)
+        name = expr.name
+        cache = SetCache()
+
+        def set_(env):
+            instance = obj(env)
+
+            if not isinstance(instance, YaploxInstance):
+                raise YaploxRuntimeError(name, "Only instances have fields.")
+
+            result = value(env)
+            shape = instance.shape
+            slot, new_shape = cache.get(shape) or cache.miss(instance, name)
+            if new_shape is shape:
+                instance.values[slot] = result
+            else:
+                instance.values.append(result)
+                instance.shape = new_shape
+            return result
+
+        return set_
+
+    def visit_super_expr(self, expr: Super) -> Closure:
+        get_superclass = self._variable_getter(expr.keyword, expr)
+        # The resolver resolves `this` with the keyword as key
+        get_this = self._variable_getter(expr.keyword, expr.keyword)
+        method_name = expr.method
+
+        def super_(env):
+            superclass: YaploxClass = get_superclass(env)
+            obj = get_this(env)
+            method = superclass.find_method(method_name.lexeme)
+
+            if method is None:
+                raise YaploxRuntimeError(
+                    method_name, f"Undefined property '{method_name.lexeme}'."
+                )
+            return method.bind(obj)
+
+        return super_
+
+    def visit_this_expr(self, expr: This) -> Closure:
+        return self._variable_getter(expr.keyword, expr)
+
+    def visit_unary_expr(self, expr: Unary) -> Closure:
+        right = self._compile_expression(expr.right)
+        operator = expr.operator
+        token_type = operator.token_type
+
+        if token_type == TokenType.MINUS:
+
+            def negate(env):
+                value = right(env)
+                if isinstance(value, (float, int)):
+                    return -value
+                raise YaploxRuntimeError(operator, f"{value} must be a number.")
+
+            return negate
+
+        if token_type == TokenType.BANG:
+
+            def bang(env):
+                value = right(env)
+                return value is None or value is False
+
+            return bang
+
+        return lambda env: None
+
+    def visit_variable_expr(self, expr: Variable) -> Closure:
+        return self._variable_getter(expr.name, expr)
+
+    def visit_block_stmt(self, stmt: Block) -> Closure:
+        body = self._compile_statements(stmt.statements)
+        if stmt in self.elided:
+            return body
+
+        def block(env):
+            return body(Environment(env))
+
+        return block
+
+    def visit_class_stmt(self, stmt: Class) -> Closure:
+        superclass_getter = None
+        if stmt.superclass is not None:
+            superclass_getter = self._compile_expression(stmt.superclass)
+            superclass_name = stmt.superclass.name
+
+        name = stmt.name.lexeme
+        define = self._define(stmt.name)
+        box_super = stmt in self.captured
+        methods = [
+            (
+                method,
+                self._closure(method),
+                self._compile_statements(method.body),
+                self._boxed(method, is_method=True),
+            )
+            for method in stmt.methods
+        ]
+
+        def class_(env):
+            superclass = None
+            if superclass_getter is not None:
+                superclass = superclass_getter(env)
+                if not isinstance(superclass, YaploxClass):
+                    raise YaploxRuntimeError(
+                        superclass_name, "Superclass must be a class."
+                    )
+
+            define(env, lambda: create_class(env, superclass))
+
+        def create_class(env, superclass):
+            method_env = env
+            if superclass is not None:
+                method_env = Environment(env)
+                method_env.define(
+                    "super", Cell(superclass) if box_super else superclass
+                )
+
+            functions: Dict[str, YaploxFunction] = {
+                method.name.lexeme: CompiledFunction(
+                    method,
+                    closure(method_env),
+                    method.name.lexeme == "init",
+                    body,
+                    boxed,
+                )
+                for method, closure, body, boxed in methods
+            }
+
+            return YaploxClass(name, superclass, functions)
+
+        return class_
+
+    def visit_expression_stmt(self, stmt: Expression) -> Closure:
+        expression = self._compile_expression(stmt.expression)
+
+        def expression_statement(env):
+            expression(env)
+
+        return expression_statement
+
+    def visit_function_stmt(self, stmt: Function) -> Closure:
+        body = self._compile_statements(stmt.body)
+        closure = self._closure(stmt)
+        boxed = self._boxed(stmt, is_method=False)
+        define = self._define(stmt.name)
+
+        def function(env):
+            define(
+                env, lambda: CompiledFunction(stmt, closure(env), False, body, boxed)
+            )
+
+        return function
+
+    def visit_if_stmt(self, stmt: If) -> Closure:
+        if type(stmt.else_branch) is If:
+            return self._else_if_chain(stmt)
+
+        condition = self._compile_expression(stmt.condition)
+        then_branch = self._compile_statement(stmt.then_branch)
+
+        if stmt.else_branch is None:
+
+            def if_then(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+                return None
+
+            return if_then
+
+        else_branch = self._compile_statement(stmt.else_branch)
+
+        def if_then_else(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+
+        return if_then_else
+
+    def _else_if_chain(self, stmt: If) -> Closure:
+        """
+        Compile an `else if` chain into one closure that tries the branches in a
+        loop. Nested closures would nest a Python call for every `else if`.
+        """
+        branches = []
+        else_branch: Optional[Stmt] = stmt
+        while isinstance(else_branch, If):
+            branches.append(
+                (
+                    self._compile_expression(else_branch.condition),
+                    self._compile_statement(else_branch.then_branch),
+                )
+            )
+            else_branch = else_branch.else_branch
+        otherwise = None
+        if else_branch is not None:
+            otherwise = self._compile_statement(else_branch)
+
+        def else_if_chain(env):
+            for condition, then_branch in branches:
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+            if otherwise is not None:
+                return otherwise(env)
+            return None
+
+        return else_if_chain
+
+    def visit_print_stmt(self, stmt: Print) -> Closure:
+        expression = self._compile_expression(stmt.expression)
+        stringify = Interpreter._stringify
+
+        def print_(env):
+            print(stringify(expression(env)))
+
+        return print_
+
+    def visit_return_stmt(self, stmt: Return) -> Closure:
+        if stmt.value is None:
+
+            return lambda env: ReturnValue(None)
+
+        if type(stmt.value) is Call and stmt.value not in self.inlined:
+            return self._tail_call(stmt.value)
+
+        value = self._compile_expression(stmt.value)
+
+        def return_(env):
+            return ReturnValue(value(env))
+
+        return return_
+
+    def visit_var_stmt(self, stmt: Var) -> Closure:
+        name = stmt.name.lexeme
+
+        if stmt.initializer is None:
+            if stmt.name in self.captured:
+                return lambda env: env.define(name, Cell(None))
+            return lambda env: env.define(name, None)
+
+        initializer = self._compile_expression(stmt.initializer)
+
+        if stmt.name in self.captured:
+            return lambda env: env.define(name, Cell(initializer(env)))
+
+        def var(env):
+            env.define(name, initializer(env))
+
+        return var
+
+    def visit_while_stmt(self, stmt: While) -> Closure:
+        condition = self._compile_expression(stmt.condition)
+        body = self._compile_statement(stmt.body)
+
+        def while_(env):
+            value = condition(env)
+            while value is not None and value is not False:
+                completion = body(env)
+                if completion is not None:
+                    return completion
+                value = condition(env)
+
+        return while_
@@ -14,6 +14,55 @@ class AppConfig(Configuration):
         ]
 
     DEBUG = Value(default=False, cast=as_boolean, help="Toggle debugging mode.")
+    BACKEND = Value(
+        default="interpreter",
+        help="Execution engine: 'interpreter' walks the tree, 'closure' compiles "
+        "it to Python closures first, 'vm' runs it as bytecode and 'python' "
+        "translates it into a Python module.",
+    )
+    SCANNER = Value(
+        default="regex",
+        help="Scanner: 'regex' matches whole lexemes with a regular expression, "
+        "'classic' looks at one character at a time.",
+    )
+    OPTIMIZE = Value(
+        default=True,
+        cast=as_boolean,
+        help="Simplify the statements, like folding constants, before they run.",
+    )
+    LAZY = Value(
+        default=False,
+        cast=as_boolean,
+        help="Parse the body of a top level function when it is first called, in "
+        "the 'interpreter' backend. Errors in a body are only reported then.",
+    )
+    LAZY_CHECK = Value(
+        default=False,
+        cast=as_boolean,
+        help="With LAZY, parse the bodies of the functions that weren't called at "
+        "the end of a run, to report their syntax errors.",
+    )
+    CACHE_DIR = Value(
+        default="",
+        help="Directory where a script that is run keeps its parsed statements, "
+        "they're used again while the script doesn't change. Empty turns the "
+        "cache off. The cache loads pickles from it, so only use a directory "
+        "that nobody else can write to.",
+    )
+    CACHE_CHECK = Value(
+        default="hash",
+        help="How a cached script is found to be unchanged: 'hash' compares a "
+        "hash of the source, 'timestamp' the modification time and size of the "
+        "file.",
+    )
+    MAX_FRAMES = Value(
+        default=100000,
+        cast=int,
+        help="How deep calls can nest in the 'vm' backend, which keeps its call "
+        "frames on a stack of its own, before it reports a stack overflow. The "
+        "other backends nest Python calls, so the Python recursion limit applies "
+        "to them instead.",
+    )
 
 
 def set_logging():
@@ -1,18 +1,37 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, List, Optional
 
-from yaplox.token import Token
-from yaplox.yaplox_runtime_error import YaploxRuntimeError
+from yaplox.cell import Cell
 
 
 class Environment:
-    def __init__(self, enclosing: Optional[Environment] = None):
-        self.values: Dict[str, Any] = dict()
+    """
+    The variables of a local scope. The resolver gives every local a slot: the
+    position of its declaration in the scope. Declarations run in that same order,
+    so defining a variable appends it to `values`, and a variable is found by its
+    distance and slot, without looking up its name.
+
+    An environment doesn't reach outside the function it belongs to. The variables
+    the function captured are in `upvalues`, shared by all scopes of a call.
+    """
+
+    __slots__ = ("values", "enclosing", "upvalues")
+
+    def __init__(
+        self,
+        enclosing: Optional[Environment] = None,
+        upvalues: Optional[List[Cell]] = None,
+    ):
+        self.values: List[Any] = []
         self.enclosing = enclosing
+        if upvalues is None:
+            upvalues = enclosing.upvalues if enclosing is not None else []
+        self.upvalues: List[Cell] = upvalues
 
     def define(self, name: str, value: Any):
-        self.values[name] = value
+        """ Define the next variable of this scope, `name` is only used by globals """
+        self.values.append(value)
 
     def _ancestor(self, distance: int) -> Environment:
         environment = self
@@ -22,39 +41,11 @@ class Environment:
 
         return environment
 
-    def get_at(self, distance: int, name: str) -> Any:
+    def get_at(self, distance: int, slot: int) -> Any:
         """
         Return a variable at a distance
         """
-        return self._ancestor(distance=distance).values.get(name)
+        return self._ancestor(distance=distance).values[slot]
 
-    def get(self, name: Token) -> Any:
-        try:
-            return self.values[name.lexeme]
-        except KeyError:
-            # We ignore this key error, if an nested Environment is available, test this
-            # first.
-            pass
-
-        if self.enclosing:
-            return self.enclosing.get(name)
-
-        raise YaploxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
-
-    def assign(self, name: Token, value: Any):
-        """Assign a new value to an existing variable. Eg:
-        var a = 3;
-        a = 4  # This calls assign.
-        """
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
-
-        if self.enclosing:
-            self.enclosing.assign(name, value)
-            return
-
-        raise YaploxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
-
-    def assign_at(self, distance: int, name: Token, value: Any):
-        self._ancestor(distance).values[name.lexeme] = value
+    def assign_at(self, distance: int, slot: int, value: Any):
+        self._ancestor(distance).values[slot] = value
@@ -0,0 +1,57 @@
+from typing import Any, Dict
+
+from yaplox.environment import Environment
+from yaplox.token import Token
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+# The value of a global slot whose variable is used, but not defined (yet)
+UNDEFINED = object()
+
+
+class GlobalEnvironment(Environment):
+    """
+    The outermost scope. The resolver doesn't know about globals, so a global gets
+    a slot in `values` the first time its name is seen. The backends resolve every
+    use of a global to its slot once, after that it is looked up by index.
+
+    Globals are never removed, so a slot always belongs to the same name.
+    """
+
+    __slots__ = ("slots",)
+
+    def __init__(self):
+        super().__init__()
+        self.slots: Dict[str, int] = dict()
+
+    def slot(self, name: str) -> int:
+        """ Return the slot of the global `name`, the first use adds it """
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.values)
+            self.values.append(UNDEFINED)
+        return slot
+
+    def define(self, name: str, value: Any):
+        self.values[self.slot(name)] = value
+
+    def get(self, name: Token) -> Any:
+        return self.get_slot(self.slot(name.lexeme), name)
+
+    def get_slot(self, slot: int, name: Token) -> Any:
+        value = self.values[slot]
+        if value is UNDEFINED:
+            raise YaploxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        return value
+
+    def assign(self, name: Token, value: Any):
+        """Assign a new value to an existing variable. Eg:
+        var a = 3;
+        a = 4  # This calls assign.
+        """
+        self.assign_slot(self.slot(name.lexeme), name, value)
+
+    def assign_slot(self, slot: int, name: Token, value: Any):
+        if self.values[slot] is UNDEFINED:
+            raise YaploxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+
+        self.values[slot] = value
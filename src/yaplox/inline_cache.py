@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+from yaplox.shape import Shape
+from yaplox.token import Token
+from yaplox.yaplox_instance import YaploxInstance
+
+# The number of shapes a cache remembers. Most sites only ever see one. A site that
+# sees more than this is megamorphic, and new shapes are looked up every time.
+POLYMORPHIC_LIMIT = 4
+
+
+class GetCache(Dict[Shape, Any]):
+    """
+    The inline cache of a Get expression. For every Shape it has seen, it has the
+    slot of the field, or the method when there is no such field. Classes can't
+    change, so an entry stays right.
+
+    It is a dict, so the backends look up the Shape without calling a method, and
+    only call `miss` for a Shape that isn't in the cache.
+    """
+
+    __slots__ = ()
+
+    def miss(self, instance: YaploxInstance, name: Token) -> Any:
+        entry = instance.lookup(name)
+        if len(self) < POLYMORPHIC_LIMIT:
+            self[instance.shape] = entry
+        return entry
+
+
+class SetCache(Dict[Shape, Tuple[int, Shape]]):
+    """
+    The inline cache of a Set expression. For every Shape it has seen, it has the
+    slot of the field and the Shape after setting it.
+    """
+
+    __slots__ = ()
+
+    def miss(self, instance: YaploxInstance, name: Token) -> Tuple[int, Shape]:
+        entry = instance.transition(name.lexeme)
+        if len(self) < POLYMORPHIC_LIMIT:
+            self[instance.shape] = entry
+        return entry
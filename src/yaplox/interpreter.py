@@ -1,7 +1,12 @@
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, Dict, Hashable, List, Optional
+from typing import Set as SetType
+from typing import Tuple
 
 from structlog import get_logger
 
+from yaplox.backend import Backend, Upvalue
+from yaplox.cell import Cell
 from yaplox.clock import Clock
 from yaplox.environment import Environment
 from yaplox.expr import (
@@ -20,6 +25,10 @@ from yaplox.expr import (
     Unary,
     Variable,
 )
+from yaplox.global_environment import GlobalEnvironment
+from yaplox.inline_cache import GetCache, SetCache
+from yaplox.operators import specialize_binary, specialize_unary
+from yaplox.return_value import ReturnValue, TailCall
 from yaplox.stmt import (
     Block,
     Class,
@@ -39,17 +48,33 @@ from yaplox.yaplox_callable import YaploxCallable
 from yaplox.yaplox_class import YaploxClass
 from yaplox.yaplox_function import YaploxFunction
 from yaplox.yaplox_instance import YaploxInstance
-from yaplox.yaplox_return_exception import YaploxReturnException
 from yaplox.yaplox_runtime_error import YaploxRuntimeError
 
 logger = get_logger()
 
 
-class Interpreter(ExprVisitor, StmtVisitor):
+class Interpreter(Backend, ExprVisitor, StmtVisitor):
+    lazy_functions = True
+
     def __init__(self):
-        self.globals = Environment()
-        self.environment = self.globals
-        self.locals = dict()
+        self.globals = GlobalEnvironment()
+        self.environment: Environment = self.globals
+        self.locals: Dict[Hashable, Tuple[int, int]] = dict()
+        # Locals that are captured by a closure, these are stored in a Cell
+        self.cells: Dict[Hashable, Tuple[int, int]] = dict()
+        self.upvalues: Dict[Hashable, int] = dict()
+        self.captured: SetType[Hashable] = set()
+        self.functions: Dict[Function, List[Upvalue]] = dict()
+        self.elided: SetType[Block] = set()
+        # The slots of the globals used by Variable and Assign nodes that ran
+        self.global_slots: Dict[Hashable, int] = dict()
+        # Calls the Optimizer found can be inlined, with the function and its value
+        self.inlined: Dict[Call, Tuple[Function, Expr]] = dict()
+        # The operations Binary and Unary nodes were specialized to
+        self.operations: Dict[Expr, Callable] = dict()
+        # The inline caches of the Get and Set expressions
+        self.get_caches: DefaultDict[Get, GetCache] = defaultdict(GetCache)
+        self.set_caches: DefaultDict[Set, SetCache] = defaultdict(SetCache)
 
         self.globals.define("clock", Clock())
 
@@ -58,18 +83,56 @@ class Interpreter(ExprVisitor, StmtVisitor):
             res = None
             for statement in statements:
                 logger.debug("Executing", statement=statement)
-                res = self._execute(statement)
+                if isinstance(statement, Expression):
+                    res = self._evaluate(statement.expression)
+                else:
+                    res = self._execute(statement)
             # The return in the interpreter is not default Lox. It's added for now
             # to make testing and debugging easier.
             return res
         except YaploxRuntimeError as excp:
             on_error(excp)
 
-    def _execute(self, stmt: Stmt):
+    def _execute(self, stmt: Stmt) -> Optional[ReturnValue]:
         return stmt.accept(self)
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        self.locals[expr] = (depth, slot)
+
+    def resolve_cell(self, expr: Hashable, depth: int, slot: int):
+        self.cells[expr] = (depth, slot)
+
+    def resolve_upvalue(self, expr: Hashable, index: int):
+        self.upvalues[expr] = index
+
+    def resolve_function(self, function: Function, upvalues: List[Upvalue]):
+        self.functions[function] = upvalues
+
+    def capture(self, declaration: Hashable):
+        self.captured.add(declaration)
+
+    def inline(self, call: Call, function: Function, value: Expr):
+        self.inlined[call] = (function, value)
+
+    def elide_scope(self, block: Block):
+        self.elided.add(block)
+
+    def box_captured(self, declaration: Hashable, value: Any) -> Any:
+        """ Put the value of a new variable in a Cell when a closure captures it """
+        if declaration in self.captured:
+            return Cell(value)
+        return value
+
+    def _closure(self, function: Function) -> List[Cell]:
+        """ Capture the variables `function` uses from the current environment """
+        return [
+            (
+                self.environment.get_at(depth, slot)
+                if is_local
+                else self.environment.upvalues[depth]
+            )
+            for is_local, depth, slot in self.functions[function]
+        ]
 
     @staticmethod
     def _stringify(obj) -> str:
@@ -83,96 +146,129 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         return str(obj)
 
-    @staticmethod
-    def _binary_plus(expr, left, right):
-        if isinstance(left, (float, int)) and isinstance(right, (float, int)):
-            return left + right
-
-        if isinstance(left, str) and isinstance(right, str):
-            return str(left + right)
-
-        raise YaploxRuntimeError(
-            expr.operator, "Operands must be two numbers or two strings"
-        )
-
-    @staticmethod
-    def _is_equal(a, b) -> bool:
-        if a is None and b is None:
-            return True
-
-        if a is None:
-            return False
-
-        return a == b
-
     def visit_binary_expr(self, expr: Binary):
         left = self._evaluate(expr.left)
         right = self._evaluate(expr.right)
-        token_type = expr.operator.token_type
-
-        # Validate that for the following Tokens the operands are numeric.
-        # Orginal jpox does this in a switch statement. Since python does not
-        # have this statement, the dict method is chosen. To not duplicate this line
-        # over and over, the check is done seperately.
-        if token_type in (
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-            TokenType.MINUS,
-            TokenType.SLASH,
-            TokenType.STAR,
-        ):
-            self._check_number_operands(expr.operator, left, right)
-
-        choices = {
-            # Comparison operators
-            TokenType.GREATER: lambda: float(left) > float(right),
-            TokenType.GREATER_EQUAL: lambda: float(left) >= float(right),
-            TokenType.LESS: lambda: float(left) < float(right),
-            TokenType.LESS_EQUAL: lambda: float(left) <= float(right),
-            # Equality
-            TokenType.BANG_EQUAL: lambda: not self._is_equal(left, right),
-            TokenType.EQUAL_EQUAL: lambda: self._is_equal(left, right),
-            # Arithmetic operators
-            TokenType.MINUS: lambda: float(left) - float(right),
-            TokenType.SLASH: lambda: float(left) / float(right),
-            TokenType.STAR: lambda: float(left) * float(right),
-            TokenType.PLUS: lambda: self._binary_plus(expr, left, right),
-        }
 
-        try:
-            option = choices[token_type]
-            result = option()
-            return result
-
-        except KeyError:
-            raise YaploxRuntimeError(
-                expr.operator, f"Unknown operator {expr.operator.lexeme}"
-            )
+        operation = self.operations.get(expr)
+        if operation is None:
+            # Quicken the node: the first operands pick the operation it keeps using
+            operation = specialize_binary(expr.operator, left, right)
+            self.operations[expr] = operation
+        return operation(expr.operator, left, right)
 
     def visit_call_expr(self, expr: Call):
-        function = self._evaluate(expr.callee)
-
-        arguments = [self._evaluate(argument) for argument in expr.arguments]
+        try:
+            if type(expr.callee) is Get:
+                return self._invoke(expr, expr.callee)
+
+            function = self._evaluate(expr.callee)
+
+            arguments = [self._evaluate(argument) for argument in expr.arguments]
+            inlined = self.inlined.get(expr)
+            if (
+                inlined is not None
+                and type(function) is YaploxFunction
+                and function.declaration is inlined[0]
+            ):
+                return self._evaluate_inlined(function, inlined[1], arguments)
+            if type(function) is YaploxFunction:
+                # Most calls are of Lox functions, they skip two Python calls
+                self._check_arity(expr.paren, function, arguments)
+                return function.invoke(self, function.receiver, arguments)
+            return self._call(expr.paren, function, arguments)
+        except RecursionError:
+            # Every Lox call nests Python calls, the innermost call reports it
+            raise YaploxRuntimeError(expr.paren, "Stack overflow.")
+
+    def _evaluate_inlined(
+        self, function: YaploxFunction, value: Expr, arguments: List[Any]
+    ) -> Any:
+        """
+        Evaluate the `value` that `function` returns in place of calling it, with the
+        arguments as its scope. The function is still the one the Optimizer saw,
+        so that is all the call would do.
+        """
+        environment = Environment(upvalues=function.upvalues)
+        environment.values = arguments
+        previous_env = self.environment
+        try:
+            self.environment = environment
+            return self._evaluate(value)
+        finally:
+            self.environment = previous_env
 
+    def _call(self, paren: Token, function: Any, arguments: List[Any]) -> Any:
         if not isinstance(function, YaploxCallable):
-            raise YaploxRuntimeError(expr.paren, "Can only call functions and classes.")
+            raise YaploxRuntimeError(paren, "Can only call functions and classes.")
+
+        self._check_arity(paren, function, arguments)
+        return function.call(self, arguments)
 
-        # function = YaploxCallable(callee)
+    @staticmethod
+    def _check_arity(paren: Token, function: YaploxCallable, arguments: List[Any]):
         if len(arguments) != function.arity():
             raise YaploxRuntimeError(
-                expr.paren,
+                paren,
                 f"Expected {function.arity()} arguments but got {len(arguments)}.",
             )
-        return function.call(self, arguments)
+
+    def _tail_call(self, expr: Call) -> ReturnValue:
+        """
+        Run `return f(...)`. A Lox function isn't called here: the TailCall lets the
+        function that returns run it instead, in the same Python frame.
+        """
+        if type(expr.callee) is Get:
+            return self._invoke(expr, expr.callee, tail=True)
+
+        function = self._evaluate(expr.callee)
+        arguments = [self._evaluate(argument) for argument in expr.arguments]
+        return self._tail(expr.paren, function, arguments)
+
+    def _tail(self, paren: Token, function: Any, arguments: List[Any]) -> ReturnValue:
+        if type(function) is not YaploxFunction:
+            return ReturnValue(self._call(paren, function, arguments))
+
+        self._check_arity(paren, function, arguments)
+        return TailCall(function, function.receiver, arguments)
+
+    def _invoke(self, expr: Call, callee: Get, tail: bool = False) -> Any:
+        """
+        Call a property, like `object.method()`. A method gets the instance passed
+        directly, without creating a bound method first. With `tail` the completion
+        of returning the result is given instead.
+        """
+        obj = self._evaluate(callee.obj)
+        entry = self._property(callee, obj)
+        arguments = [self._evaluate(argument) for argument in expr.arguments]
+        if type(entry) is int:
+            # A field, which may hold any callable
+            if tail:
+                return self._tail(expr.paren, obj.values[entry], arguments)
+            return self._call(expr.paren, obj.values[entry], arguments)
+
+        self._check_arity(expr.paren, entry, arguments)
+        if tail:
+            return TailCall(entry, obj, arguments)
+        return entry.invoke(self, obj, arguments)
+
+    def _property(self, expr: Get, obj: Any) -> Any:
+        """ Return the slot of the field `expr` gets from `obj`, or the method """
+        if not isinstance(obj, YaploxInstance):
+            raise YaploxRuntimeError(expr.name, "Only instances have properties.")
+
+        cache = self.get_caches[expr]
+        entry = cache.get(obj.shape)
+        if entry is None:
+            entry = cache.miss(obj, expr.name)
+        return entry
 
     def visit_get_expr(self, expr: Get):
         obj = self._evaluate(expr.obj)
-        if isinstance(obj, YaploxInstance):
-            return obj.get(expr.name)
-
-        raise YaploxRuntimeError(expr.name, "Only instances have properties.")
+        entry = self._property(expr, obj)
+        if type(entry) is int:
+            return obj.values[entry]
+        return entry.bind(obj)
 
     def visit_grouping_expr(self, expr: Grouping):
         return self._evaluate(expr.expression)
@@ -197,15 +293,21 @@ class Interpreter(ExprVisitor, StmtVisitor):
             raise YaploxRuntimeError(expr.name, "Only instances have fields.")
 
         value = self._evaluate(expr.value)
-        obj.set(expr.name, value)
+        cache = self.set_caches[expr]
+        shape = obj.shape
+        slot, new_shape = cache.get(shape) or cache.miss(obj, expr.name)
+        if new_shape is shape:
+            obj.values[slot] = value
+        else:
+            # A new field
+            obj.values.append(value)
+            obj.shape = new_shape
         return value
 
     def visit_super_expr(self, expr: Super):
-        distance = self.locals[expr]
-        superclass: YaploxClass = self.environment.get_at(
-            distance=distance, name="super"
-        )
-        obj = self.environment.get_at(distance=distance - 1, name="this")
+        superclass: YaploxClass = self._look_up_variable(expr.keyword, expr)
+        # The resolver resolves `this` with the keyword as key
+        obj = self._look_up_variable(expr.keyword, expr.keyword)
         method = superclass.find_method(expr.method.lexeme)
 
         # Check that we have a super method
@@ -221,24 +323,11 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_unary_expr(self, expr: Unary):
         right = self._evaluate(expr.right)
 
-        token_type = expr.operator.token_type
-        if token_type == TokenType.MINUS:
-            self._check_number_operand(expr.operator, right)
-            return -float(right)
-        elif token_type == TokenType.BANG:
-            return not Interpreter._is_truthy(right)
-
-    @staticmethod
-    def _check_number_operand(operator: Token, operand: Any):
-        if isinstance(operand, (float, int)):
-            return
-        raise YaploxRuntimeError(operator, f"{operand} must be a number.")
-
-    @staticmethod
-    def _check_number_operands(operator: Token, left: Any, right: Any):
-        if isinstance(left, (float, int)) and isinstance(right, (float, int)):
-            return
-        raise YaploxRuntimeError(operator, "Operands must be numbers.")
+        operation = self.operations.get(expr)
+        if operation is None:
+            operation = specialize_unary(expr.operator)
+            self.operations[expr] = operation
+        return operation(expr.operator, right)
 
     @staticmethod
     def _is_truthy(obj):
@@ -256,23 +345,73 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_variable_expr(self, expr: "Variable") -> Any:
         return self._look_up_variable(expr.name, expr)
 
-    def _look_up_variable(self, name: Token, expr: Expr) -> Any:
-        distance = self.locals.get(expr)
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
-        else:
-            return self.globals.get(name)
+    def _look_up_variable(self, name: Token, expr: Hashable) -> Any:
+        resolved = self.locals.get(expr)
+        if resolved is not None:
+            return self.environment.get_at(*resolved)
+
+        slot = self.global_slots.get(expr)
+        if slot is not None:
+            return self.globals.get_slot(slot, name)
+
+        index = self.upvalues.get(expr)
+        if index is not None:
+            return self.environment.upvalues[index].value
+
+        resolved = self.cells.get(expr)
+        if resolved is not None:
+            return self.environment.get_at(*resolved).value
+
+        return self.globals.get_slot(self._global_slot(name, expr), name)
+
+    def _global_slot(self, name: Token, expr: Hashable) -> int:
+        slot = self.global_slots[expr] = self.globals.slot(name.lexeme)
+        return slot
 
     def visit_assign_expr(self, expr: "Assign") -> Any:
         value = self._evaluate(expr.value)
-        distance = self.locals.get(expr)
-        if distance:
-            self.environment.assign_at(distance, expr.name, value)
+        resolved = self.locals.get(expr)
+        if resolved is not None:
+            distance, slot = resolved
+            self.environment.assign_at(distance, slot, value)
+            return value
+
+        global_slot = self.global_slots.get(expr)
+        if global_slot is not None:
+            self.globals.assign_slot(global_slot, expr.name, value)
+            return value
+
+        index = self.upvalues.get(expr)
+        if index is not None:
+            self.environment.upvalues[index].value = value
+            return value
+
+        resolved = self.cells.get(expr)
+        if resolved is not None:
+            self.environment.get_at(*resolved).value = value
         else:
-            self.globals.assign(expr.name, value)
+            global_slot = self._global_slot(expr.name, expr)
+            self.globals.assign_slot(global_slot, expr.name, value)
 
         return value
 
+    def _define_early(self, name: Token) -> Optional[Cell]:
+        """
+        A function or class that is captured can refer to itself, so its Cell is
+        defined before it is created.
+        """
+        if name not in self.captured:
+            return None
+        cell = Cell(None)
+        self.environment.define(name.lexeme, cell)
+        return cell
+
+    def _define_late(self, name: Token, cell: Optional[Cell], value: Any):
+        if cell is None:
+            self.environment.define(name.lexeme, value)
+        else:
+            cell.value = value
+
     # statement stuff
     def visit_class_stmt(self, stmt: Class):
         superclass = None
@@ -283,17 +422,16 @@ class Interpreter(ExprVisitor, StmtVisitor):
                     stmt.superclass.name, "Superclass must be a class."
                 )
 
-        self.environment.define(stmt.name.lexeme, None)
-
+        cell = self._define_early(stmt.name)
         if stmt.superclass is not None:
             self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            self.environment.define("super", self.box_captured(stmt, superclass))
 
         methods: Dict[str, YaploxFunction] = {}
 
         for method in stmt.methods:
             function = YaploxFunction(
-                method, self.environment, method.name.lexeme == "init"
+                method, self._closure(method), method.name.lexeme == "init"
             )
             methods[method.name.lexeme] = function
 
@@ -304,50 +442,77 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if stmt.superclass is not None:
             self.environment = self.environment.enclosing  # type: ignore
 
-        self.environment.assign(stmt.name, klass)
+        self._define_late(stmt.name, cell, klass)
 
     def visit_expression_stmt(self, stmt: Expression) -> None:
-        return self._evaluate(stmt.expression)
+        self._evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        function = YaploxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
-
-    def visit_if_stmt(self, stmt: If) -> None:
-        if self._is_truthy(self._evaluate(stmt.condition)):
-            self._execute(stmt.then_branch)
-        elif stmt.else_branch is not None:
-            self._execute(stmt.else_branch)
-
-    def visit_while_stmt(self, stmt: While) -> None:
+        cell = self._define_early(stmt.name)
+        function = YaploxFunction(stmt, self._closure(stmt), False)
+        self._define_late(stmt.name, cell, function)
+
+    def visit_if_stmt(self, stmt: If) -> Optional[ReturnValue]:
+        # Walk `else if` chains in a loop, they can be longer than the stack is deep
+        while True:
+            if self._is_truthy(self._evaluate(stmt.condition)):
+                return self._execute(stmt.then_branch)
+            else_branch = stmt.else_branch
+            if type(else_branch) is not If:
+                break
+            stmt = else_branch  # type: ignore
+        if else_branch is not None:
+            return self._execute(else_branch)
+        return None
+
+    def visit_while_stmt(self, stmt: While) -> Optional[ReturnValue]:
         while self._is_truthy(self._evaluate(stmt.condition)):
-            self._execute(stmt.body)
+            completion = self._execute(stmt.body)
+            if completion is not None:
+                return completion
+        return None
 
     def visit_print_stmt(self, stmt: Print) -> None:
         value = self._evaluate(stmt.expression)
         print(self._stringify(value))
 
-    def visit_return_stmt(self, stmt: Return) -> None:
+    def visit_return_stmt(self, stmt: Return) -> ReturnValue:
+        if type(stmt.value) is Call and stmt.value not in self.inlined:
+            return self._tail_call(stmt.value)
+
         value = None
         if stmt.value:
             value = self._evaluate(stmt.value)
-        raise YaploxReturnException(value=value)
+        return ReturnValue(value)
 
     def visit_var_stmt(self, stmt: "Var") -> None:
         value = None
         if stmt.initializer is not None:
             value = self._evaluate(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        self.environment.define(stmt.name.lexeme, self.box_captured(stmt.name, value))
+
+    def visit_block_stmt(self, stmt: "Block") -> Optional[ReturnValue]:
+        if stmt in self.elided:
+            for statement in stmt.statements:
+                completion = self._execute(statement)
+                if completion is not None:
+                    return completion
+            return None
 
-    def visit_block_stmt(self, stmt: "Block") -> None:
-        self.execute_block(stmt.statements, Environment(self.environment))
+        return self.execute_block(stmt.statements, Environment(self.environment))
 
-    def execute_block(self, statements: List[Stmt], environment: Environment):
+    def execute_block(
+        self, statements: List[Stmt], environment: Environment
+    ) -> Optional[ReturnValue]:
+        """ Run statements until the end, or until one of them returns """
         previous_env = self.environment
         try:
             self.environment = environment
             for statement in statements:
-                self._execute(statement)
+                completion = self._execute(statement)
+                if completion is not None:
+                    return completion
+            return None
         finally:
             self.environment = previous_env
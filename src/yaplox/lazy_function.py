@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from typing import Callable, List
+
+from yaplox.stmt import Function, Stmt
+from yaplox.token import Token
+
+
+class LazyFunction(Function):
+    """
+    A top level function of which the parser only matched the braces of the body.
+    `tokens` are the tokens after the `{`, up to and including the matching `}`.
+
+    The body is not set until it is first used, then `load` parses and resolves the
+    tokens and sets it. The tokens are dropped once that succeeds, so only the
+    functions that are never called keep them.
+    """
+
+    def __init__(
+        self,
+        name: Token,
+        params: List[Token],
+        tokens: List[Token],
+        load: Callable[[LazyFunction], List[Stmt]],
+    ):
+        # No body yet, so Function.__init__ isn't used
+        self.name = name
+        self.params = params
+        self.tokens = tokens
+        self.load = load
+
+    @property
+    def loaded(self) -> bool:
+        return "body" in self.__dict__
+
+    def __getstate__(self):
+        # `load` belongs to the run that parsed it, a cached function gets a new one
+        state = dict(self.__dict__)
+        state.pop("load", None)
+        return state
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that aren't set, after loading `body` is
+        if name == "body":
+            return self.load(self)
+        raise AttributeError(name)
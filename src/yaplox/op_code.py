@@ -0,0 +1,49 @@
+import enum
+
+
+class OpCode(enum.IntEnum):
+    """
+    Instructions of the bytecode virtual machine. Operands follow the opcode in the
+    code array of a Chunk; the comment shows what every instruction reads from it.
+    """
+
+    CONSTANT = enum.auto()  # constant index
+    NIL = enum.auto()
+    TRUE = enum.auto()
+    FALSE = enum.auto()
+    POP = enum.auto()
+    GET_LOCAL = enum.auto()  # slot
+    SET_LOCAL = enum.auto()  # slot
+    GET_GLOBAL = enum.auto()  # constant index of the name
+    DEFINE_GLOBAL = enum.auto()  # constant index of the name
+    SET_GLOBAL = enum.auto()  # constant index of the name
+    GET_UPVALUE = enum.auto()  # upvalue index
+    SET_UPVALUE = enum.auto()  # upvalue index
+    GET_PROPERTY = enum.auto()  # constant index of the name
+    SET_PROPERTY = enum.auto()  # constant index of the name
+    GET_SUPER = enum.auto()  # constant index of the name
+    EQUAL = enum.auto()
+    NOT_EQUAL = enum.auto()
+    GREATER = enum.auto()
+    GREATER_EQUAL = enum.auto()
+    LESS = enum.auto()
+    LESS_EQUAL = enum.auto()
+    ADD = enum.auto()
+    SUBTRACT = enum.auto()
+    MULTIPLY = enum.auto()
+    DIVIDE = enum.auto()
+    NOT = enum.auto()
+    NEGATE = enum.auto()
+    PRINT = enum.auto()
+    JUMP = enum.auto()  # target
+    JUMP_IF_FALSE = enum.auto()  # target
+    LOOP = enum.auto()  # target
+    CALL = enum.auto()  # argument count
+    INVOKE = enum.auto()  # constant index of the name, argument count
+    SUPER_INVOKE = enum.auto()  # constant index of the name, argument count
+    CLOSURE = enum.auto()  # constant index, then (is_local, index) per upvalue
+    CLOSE_UPVALUE = enum.auto()
+    RETURN = enum.auto()
+    CLASS = enum.auto()  # constant index of the name
+    INHERIT = enum.auto()
+    METHOD = enum.auto()  # constant index of the name
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from operator import eq, ge, gt, le, lt, mul, ne, sub, truediv
+from typing import Any, Callable, Dict
+
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+# The operation of one Binary or Unary node. It gets the operator, to report errors,
+# and the values of the operands.
+BinaryOperation = Callable[[Token, Any, Any], Any]
+UnaryOperation = Callable[[Token, Any], Any]
+
+_NUMBER_OPERATIONS: Dict[TokenType, Callable[[float, float], Any]] = {
+    # Comparison operators
+    TokenType.GREATER: gt,
+    TokenType.GREATER_EQUAL: ge,
+    TokenType.LESS: lt,
+    TokenType.LESS_EQUAL: le,
+    # Arithmetic operators
+    TokenType.MINUS: sub,
+    TokenType.SLASH: truediv,
+    TokenType.STAR: mul,
+}
+
+
+def _checked(operation: Callable[[float, float], Any]) -> BinaryOperation:
+    """ The generic path of an operator on numbers, that works for any operands """
+
+    def checked(operator: Token, left: Any, right: Any) -> Any:
+        if isinstance(left, (float, int)) and isinstance(right, (float, int)):
+            return operation(float(left), float(right))
+        raise YaploxRuntimeError(operator, "Operands must be numbers.")
+
+    return checked
+
+
+def _on_floats(
+    operation: Callable[[float, float], Any], generic: BinaryOperation
+) -> BinaryOperation:
+    """ The fast path for two floats, other operands go to `generic` """
+
+    def on_floats(operator: Token, left: Any, right: Any) -> Any:
+        if type(left) is float and type(right) is float:
+            return operation(left, right)
+        return generic(operator, left, right)
+
+    return on_floats
+
+
+_CHECKED = {
+    token_type: _checked(operation)
+    for token_type, operation in _NUMBER_OPERATIONS.items()
+}
+_ON_FLOATS = {
+    token_type: _on_floats(operation, _CHECKED[token_type])
+    for token_type, operation in _NUMBER_OPERATIONS.items()
+}
+
+
+def _plus(operator: Token, left: Any, right: Any) -> Any:
+    if isinstance(left, (float, int)) and isinstance(right, (float, int)):
+        return left + right
+
+    if isinstance(left, str) and isinstance(right, str):
+        return str(left + right)
+
+    raise YaploxRuntimeError(operator, "Operands must be two numbers or two strings")
+
+
+def _plus_floats(operator: Token, left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left + right
+    return _plus(operator, left, right)
+
+
+def _plus_strings(operator: Token, left: Any, right: Any) -> Any:
+    if type(left) is str and type(right) is str:
+        return left + right
+    return _plus(operator, left, right)
+
+
+def _equality(operation: Callable[[Any, Any], bool]) -> BinaryOperation:
+    # nil is only equal to nil, which is what Python does for None as well
+    return lambda operator, left, right: operation(left, right)
+
+
+_EQUALITY = {
+    TokenType.EQUAL_EQUAL: _equality(eq),
+    TokenType.BANG_EQUAL: _equality(ne),
+}
+
+
+def specialize_binary(operator: Token, left: Any, right: Any) -> BinaryOperation:
+    """
+    Pick the operation for a Binary node, for the operands it got the first time it
+    ran. Most nodes always see the same types, and get an operation with a fast path
+    for those. Every operation falls back to the checked generic path when the
+    operands turn out to be something else.
+    """
+    token_type = operator.token_type
+
+    if token_type == TokenType.PLUS:
+        if type(left) is float and type(right) is float:
+            return _plus_floats
+        if type(left) is str and type(right) is str:
+            return _plus_strings
+        return _plus
+
+    if token_type in _EQUALITY:
+        return _EQUALITY[token_type]
+
+    if token_type not in _NUMBER_OPERATIONS:
+        raise YaploxRuntimeError(operator, f"Unknown operator {operator.lexeme}")
+
+    if type(left) is float and type(right) is float:
+        return _ON_FLOATS[token_type]
+    return _CHECKED[token_type]
+
+
+def _negate(operator: Token, operand: Any) -> Any:
+    if type(operand) is float:
+        return -operand
+    if isinstance(operand, (float, int)):
+        return -float(operand)
+    raise YaploxRuntimeError(operator, f"{operand} must be a number.")
+
+
+def _not(operator: Token, operand: Any) -> bool:
+    # Only nil and false are falsey
+    return operand is None or operand is False
+
+
+def specialize_unary(operator: Token) -> UnaryOperation:
+    """ Pick the operation for a Unary node """
+    if operator.token_type == TokenType.MINUS:
+        return _negate
+    if operator.token_type == TokenType.BANG:
+        return _not
+    return lambda operator, operand: None
@@ -0,0 +1,525 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, List, Optional
+from typing import Set as SetType
+from typing import Tuple
+
+from yaplox.backend import Backend, Resolution
+from yaplox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from yaplox.interpreter import Interpreter
+from yaplox.lazy_function import LazyFunction
+from yaplox.operators import specialize_binary, specialize_unary
+from yaplox.stmt import (
+    Block,
+    Class,
+    Expression,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+
+_EQUALITY = (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL)
+
+
+def _in_cycles(graph: Dict[str, SetType[str]]) -> SetType[str]:
+    """
+    The nodes of `graph` that can reach themselves, found with Tarjan's algorithm
+    for strongly connected components. The nodes lead only to nodes of `graph`. It
+    walks with a stack of its own, a chain of calls can be longer than the Python
+    stack is deep.
+    """
+    index: Dict[str, int] = dict()
+    low: Dict[str, int] = dict()
+    stack: List[str] = []
+    on_stack: SetType[str] = set()
+    cyclic: SetType[str] = set()
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        walk = [(root, iter(graph[root]))]
+        while walk:
+            node, successors = walk[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    walk.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                walk.pop()
+                if walk:
+                    parent = walk[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    start = stack.index(node)
+                    component = stack[start:]
+                    del stack[start:]
+                    on_stack.difference_update(component)
+                    if len(component) > 1 or node in graph[node]:
+                        cyclic.update(component)
+    return cyclic
+
+
+class Loop:
+    """
+    A `while` loop that is being optimized, with what its condition and body can
+    change, and the temporaries that are evaluated once before it.
+    """
+
+    def __init__(self):
+        # The names of the variables that are assigned in the loop
+        self.assigned: SetType[str] = set()
+        # Whether the loop calls anything, that may assign globals and closures
+        self.calls = False
+        self.temporaries: List[Var] = []
+
+    def hoist(self, expr: Expr, name: str, line: int) -> Variable:
+        """ Evaluate `expr` before the loop, and return the variable it is in """
+        token = Token(TokenType.IDENTIFIER, name, None, line)
+        self.temporaries.append(Var(token, expr))
+        return Variable(token)
+
+
+class Optimizer(Resolution, ExprVisitor, StmtVisitor):
+    """
+    Simplify statements before they run. The Resolver reports the local variables
+    to the Optimizer first, and the errors of the statements as they were written.
+    The optimized statements are resolved again for the backend.
+
+    Subexpressions of literals are folded into a Literal, groupings are dropped and
+    an `if` or `while` with a constant condition is decided ahead of time. Code
+    after a `return` and local variables that are never read are removed.
+
+    Calls of global functions that only return an expression are reported to the
+    backend, which can evaluate the expression in place of the call. That takes a
+    function that is declared once and never assigned to, and that can't reach
+    itself through the global functions it calls.
+
+    Parts of the condition of a `while` that are the same in every iteration are
+    evaluated once, before the loop.
+
+    Only operations that can't fail are folded or removed: a runtime error is still
+    raised by the node it comes from, in the same line.
+    """
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        # The nodes that use a local variable, by the key of its declaration
+        self.uses: Dict[Hashable, List[Hashable]] = dict()
+        self.captured: SetType[Hashable] = set()
+        # Every node that uses a local variable, the rest use globals
+        self.locals: SetType[Hashable] = set()
+        # Assignments to variables that were removed, only their value is left
+        self.removed: SetType[Hashable] = set()
+        # The globals that are assigned to, and the calls of globals with the
+        # outermost function they are in
+        self.assigned: SetType[str] = set()
+        self.calls: List[Tuple[Call, str, Optional[Function]]] = []
+        self.function: Optional[Function] = None
+        # The loops around the current node, and the temporaries given out
+        self.loops: List[Loop] = []
+        self.temporaries = 0
+        # The declarations of the locals, by the nodes that use them
+        self.declarations: Dict[Hashable, Hashable] = dict()
+
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        """ The uses of a variable are collected by `declare` """
+
+    def resolve_upvalue(self, expr: Hashable, index: int):
+        self.locals.add(expr)
+
+    def capture(self, declaration: Hashable):
+        self.captured.add(declaration)
+
+    def declare(self, declaration: Hashable, uses: List[Hashable]):
+        self.uses[declaration] = uses
+        self.locals.update(uses)
+        for use in uses:
+            self.declarations[use] = declaration
+
+    def optimize(self, statements: List[Stmt]) -> List[Stmt]:
+        optimized = self._statements(statements)
+        self._inline(optimized)
+        return optimized
+
+    def _inline(self, statements: List[Stmt]):
+        """ Report the calls of global functions that can be inlined """
+        functions: Dict[str, Optional[Function]] = dict()
+        for statement in statements:
+            if isinstance(statement, (Class, Function, Var)):
+                name = statement.name.lexeme
+                # A global that is declared twice is assigned as well
+                if isinstance(statement, Function) and name not in functions:
+                    functions[name] = statement
+                else:
+                    functions[name] = None
+
+        # The global functions each global function calls, those in a cycle would
+        # be inlined into each other without end
+        graph: Dict[str, SetType[str]] = {name: set() for name in functions}
+        for _, name, caller in self.calls:
+            if (
+                caller is not None
+                and functions.get(caller.name.lexeme) is caller
+                and name in graph
+            ):
+                graph[caller.name.lexeme].add(name)
+        recursive = _in_cycles(graph)
+
+        for call, name, _ in self.calls:
+            function = functions.get(name)
+            if (
+                function is None
+                or name in recursive
+                or name in self.assigned
+                or len(call.arguments) != len(function.params)
+            ):
+                continue
+            value = self._returned_value(function)
+            if value is not None:
+                self.backend.inline(call, function, value)
+
+    @staticmethod
+    def _returned_value(function: Function) -> Optional[Expr]:
+        """ The expression `function` returns, if that is its only statement """
+        if isinstance(function, LazyFunction) and not function.loaded:
+            return None
+        if len(function.body) == 1 and isinstance(function.body[0], Return):
+            return function.body[0].value
+        return None
+
+    def _statements(self, statements: List[Stmt]) -> List[Stmt]:
+        optimized = []
+        for statement in statements:
+            result = self._optimize(statement)
+            if result is None:
+                continue
+            optimized.append(result)
+            if self._returns(result):
+                # The statements after it never run
+                break
+        return optimized
+
+    @classmethod
+    def _returns(cls, stmt: Stmt) -> bool:
+        """ Whether `stmt` always runs into a `return` """
+        if isinstance(stmt, Block):
+            return bool(stmt.statements) and cls._returns(stmt.statements[-1])
+        return isinstance(stmt, Return)
+
+    def _optimize(self, stmt: Stmt) -> Optional[Stmt]:
+        """ Return the optimized statement, or None when it does nothing """
+        return stmt.accept(self)
+
+    def _branch(self, stmt: Stmt) -> Stmt:
+        """ Optimize the body of an `if` or a `while`, which can't be left out """
+        result = self._optimize(stmt)
+        return Block([]) if result is None else result
+
+    def _fold(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    # Statements
+
+    def visit_block_stmt(self, stmt: Block) -> Stmt:
+        stmt.statements = self._statements(stmt.statements)
+        return stmt
+
+    def visit_class_stmt(self, stmt: Class) -> Stmt:
+        for method in stmt.methods:
+            self.visit_function_stmt(method)
+        return stmt
+
+    def visit_expression_stmt(self, stmt: Expression) -> Stmt:
+        stmt.expression = self._fold(stmt.expression)
+        return stmt
+
+    def visit_function_stmt(self, stmt: Function) -> Stmt:
+        if isinstance(stmt, LazyFunction) and not stmt.loaded:
+            # Optimized when it is loaded
+            return stmt
+        enclosing = self.function
+        if enclosing is None:
+            # Calls in nested functions belong to the function around them
+            self.function = stmt
+        stmt.body = self._statements(stmt.body)
+        self.function = enclosing
+        return stmt
+
+    def visit_if_stmt(self, stmt: If) -> Optional[Stmt]:
+        # Walk `else if` chains in a loop, they can be longer than the stack is deep.
+        # `first` is the If the optimized chain starts with, `last` the one whose
+        # else branch comes next.
+        first: Optional[If] = None
+        last: Optional[If] = None
+        current: Optional[Stmt] = stmt
+        while isinstance(current, If):
+            current.condition = self._fold(current.condition)
+            if isinstance(current.condition, Literal):
+                if Interpreter._is_truthy(current.condition.value):
+                    current = current.then_branch
+                    break
+                # The branch never runs, the chain continues with the else branch
+                current = current.else_branch
+                continue
+
+            current.then_branch = self._branch(current.then_branch)
+            if last is None:
+                first = current
+            else:
+                last.else_branch = current
+            last = current
+            current = current.else_branch
+
+        rest = None if current is None else self._optimize(current)
+        if last is None:
+            return rest
+        last.else_branch = rest
+        return first
+
+    def visit_print_stmt(self, stmt: Print) -> Stmt:
+        stmt.expression = self._fold(stmt.expression)
+        return stmt
+
+    def visit_return_stmt(self, stmt: Return) -> Stmt:
+        if stmt.value is not None:
+            stmt.value = self._fold(stmt.value)
+        return stmt
+
+    def visit_var_stmt(self, stmt: Var) -> Optional[Stmt]:
+        if stmt.initializer is not None:
+            stmt.initializer = self._fold(stmt.initializer)
+
+        if self._is_unused(stmt):
+            self.removed.update(self.uses[stmt.name])
+            return None
+        return stmt
+
+    def _is_unused(self, stmt: Var) -> bool:
+        """
+        Whether `stmt` declares a local variable that is only ever assigned, with an
+        initializer that does nothing else. Globals are always kept.
+        """
+        uses = self.uses.get(stmt.name)
+        if uses is None or stmt.name in self.captured:
+            return False
+        if stmt.initializer is not None and not isinstance(stmt.initializer, Literal):
+            return False
+        return all(type(use) is Assign for use in uses)
+
+    def visit_while_stmt(self, stmt: While) -> Optional[Stmt]:
+        loop = Loop()
+        self.loops.append(loop)
+        stmt.condition = self._fold(stmt.condition)
+        if isinstance(stmt.condition, Literal) and not Interpreter._is_truthy(
+            stmt.condition.value
+        ):
+            self.loops.pop()
+            return None
+
+        stmt.body = self._branch(stmt.body)
+        self.loops.pop()
+
+        stmt.condition, _ = self._hoist(stmt.condition, loop, True)
+        if not loop.temporaries:
+            return stmt
+        # The temporaries get a scope of their own, around the loop
+        return Block([*loop.temporaries, stmt])
+
+    def _hoist(self, expr: Expr, loop: Loop, safe: bool) -> Tuple[Expr, bool]:
+        """
+        Move the invariant parts of `expr`, a part of the condition of `loop`, into
+        temporaries. Return the new expression, and whether it can fail.
+
+        The condition runs at least once, so a part that is evaluated before
+        anything that can fail or has side effects, which `safe` tells, runs before
+        the loop with the same result or error. Other parts are only moved when they
+        can't fail.
+        """
+        if isinstance(expr, (Binary, Logical, Unary)) and self._is_invariant(
+            expr, loop
+        ):
+            if safe or not self._can_fail(expr):
+                self.temporaries += 1
+                name = f"${self.temporaries}"
+                return loop.hoist(expr, name, expr.operator.line), False
+            return expr, True
+
+        if isinstance(expr, Binary):
+            expr.left, left_fails = self._hoist(expr.left, loop, safe)
+            expr.right, right_fails = self._hoist(
+                expr.right, loop, safe and not left_fails
+            )
+            operator_fails = expr.operator.token_type not in _EQUALITY
+            return expr, left_fails or right_fails or operator_fails
+        if isinstance(expr, Logical):
+            expr.left, left_fails = self._hoist(expr.left, loop, safe)
+            # The right operand doesn't always run
+            expr.right, right_fails = self._hoist(expr.right, loop, False)
+            return expr, left_fails or right_fails
+        if isinstance(expr, Unary):
+            expr.right, fails = self._hoist(expr.right, loop, safe)
+            return expr, fails or expr.operator.token_type == TokenType.MINUS
+        return expr, self._can_fail(expr)
+
+    def _is_invariant(self, expr: Expr, loop: Loop) -> bool:
+        """ Whether `expr` has the same value in every iteration of `loop` """
+        if isinstance(expr, (Literal, This)):
+            return True
+        if isinstance(expr, Variable):
+            if expr.name.lexeme in loop.assigned:
+                return False
+            # Only the function itself can assign a local that isn't captured
+            declaration = self.declarations.get(expr)
+            local = declaration is not None and declaration not in self.captured
+            return local or not loop.calls
+        if isinstance(expr, (Binary, Logical)):
+            return self._is_invariant(expr.left, loop) and self._is_invariant(
+                expr.right, loop
+            )
+        if isinstance(expr, Unary):
+            return self._is_invariant(expr.right, loop)
+        # Calls and properties are never moved
+        return False
+
+    def _can_fail(self, expr: Expr) -> bool:
+        """ Whether evaluating `expr` can raise an error, or has side effects """
+        if isinstance(expr, (Literal, This)):
+            return False
+        if isinstance(expr, Variable):
+            # A global may not be defined
+            return expr not in self.locals
+        if isinstance(expr, Binary):
+            return (
+                expr.operator.token_type not in _EQUALITY
+                or self._can_fail(expr.left)
+                or self._can_fail(expr.right)
+            )
+        if isinstance(expr, Logical):
+            return self._can_fail(expr.left) or self._can_fail(expr.right)
+        if isinstance(expr, Unary):
+            return expr.operator.token_type == TokenType.MINUS or self._can_fail(
+                expr.right
+            )
+        return True
+
+    # Expressions
+
+    def visit_assign_expr(self, expr: Assign) -> Expr:
+        expr.value = self._fold(expr.value)
+        if expr not in self.locals:
+            self.assigned.add(expr.name.lexeme)
+        for loop in self.loops:
+            loop.assigned.add(expr.name.lexeme)
+        if expr in self.removed:
+            return expr.value
+        return expr
+
+    def visit_binary_expr(self, expr: Binary) -> Expr:
+        expr.left = self._fold(expr.left)
+        expr.right = self._fold(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            left = expr.left.value
+            right = expr.right.value
+            if self._can_fold_binary(expr.operator, left, right):
+                operation = specialize_binary(expr.operator, left, right)
+                return Literal(operation(expr.operator, left, right))
+        return expr
+
+    @staticmethod
+    def _can_fold_binary(operator: Token, left: Any, right: Any) -> bool:
+        """
+        Only fold operands that are the same at runtime for every backend: two
+        numbers, two strings to add, or values to compare of the same type.
+        """
+        token_type = operator.token_type
+        if token_type in _EQUALITY:
+            return type(left) is type(right) or left is None or right is None
+        if token_type == TokenType.PLUS and type(left) is str:
+            return type(right) is str
+        if type(left) is not float or type(right) is not float:
+            return False
+        # Division by zero is left to fail when it runs
+        return token_type != TokenType.SLASH or right != 0.0
+
+    def visit_call_expr(self, expr: Call) -> Expr:
+        expr.callee = self._fold(expr.callee)
+        expr.arguments = [self._fold(argument) for argument in expr.arguments]
+        for loop in self.loops:
+            loop.calls = True
+        callee = expr.callee
+        if isinstance(callee, Variable) and callee not in self.locals:
+            self.calls.append((expr, callee.name.lexeme, self.function))
+        return expr
+
+    def visit_get_expr(self, expr: Get) -> Expr:
+        expr.obj = self._fold(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping) -> Expr:
+        # The tree already has the order the parentheses gave
+        return self._fold(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: Logical) -> Expr:
+        expr.left = self._fold(expr.left)
+        expr.right = self._fold(expr.right)
+        if isinstance(expr.left, Literal):
+            truthy = Interpreter._is_truthy(expr.left.value)
+            if truthy == (expr.operator.token_type == TokenType.OR):
+                return expr.left
+            return expr.right
+        return expr
+
+    def visit_set_expr(self, expr: Set) -> Expr:
+        expr.obj = self._fold(expr.obj)
+        expr.value = self._fold(expr.value)
+        return expr
+
+    def visit_super_expr(self, expr: Super) -> Expr:
+        return expr
+
+    def visit_this_expr(self, expr: This) -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: Unary) -> Expr:
+        expr.right = self._fold(expr.right)
+        if isinstance(expr.right, Literal):
+            operand = expr.right.value
+            if expr.operator.token_type == TokenType.BANG or type(operand) is float:
+                operation = specialize_unary(expr.operator)
+                return Literal(operation(expr.operator, operand))
+        return expr
+
+    def visit_variable_expr(self, expr: Variable) -> Expr:
+        return expr
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
 
 from yaplox.expr import (
     Assign,
@@ -15,6 +16,7 @@ from yaplox.expr import (
     Unary,
     Variable,
 )
+from yaplox.lazy_function import LazyFunction
 from yaplox.stmt import (
     Block,
     Class,
@@ -38,35 +40,134 @@ class ParseError(Exception):
         super().__init__(self.message)
 
 
+class NestingError(ParseError):
+    """ A declaration nests too deep, the parser skips the rest of it """
+
+
+# How many tokens the parser takes from the scanner at a time
+TOKENS_AHEAD = 256
+
+# How deep statements and expressions can nest. The parser, the resolver and the
+# backends recurse on the nodes, with a few Python calls for every level.
+MAX_NESTING = 150
+
+# How tight the operators bind, from loose to tight
+_ASSIGNMENT = 1
+_OR = 2
+_AND = 3
+_EQUALITY = 4
+_COMPARISON = 5
+_TERM = 6
+_FACTOR = 7
+_UNARY = 8
+_CALL = 9
+
+# The operators that can follow an operand, with how tight they bind. A call and a
+# property get are parsed as operators too.
+_INFIX = {
+    TokenType.EQUAL: _ASSIGNMENT,
+    TokenType.OR: _OR,
+    TokenType.AND: _AND,
+    TokenType.BANG_EQUAL: _EQUALITY,
+    TokenType.EQUAL_EQUAL: _EQUALITY,
+    TokenType.GREATER: _COMPARISON,
+    TokenType.GREATER_EQUAL: _COMPARISON,
+    TokenType.LESS: _COMPARISON,
+    TokenType.LESS_EQUAL: _COMPARISON,
+    TokenType.MINUS: _TERM,
+    TokenType.PLUS: _TERM,
+    TokenType.SLASH: _FACTOR,
+    TokenType.STAR: _FACTOR,
+    TokenType.LEFT_PAREN: _CALL,
+    TokenType.DOT: _CALL,
+}
+
+# How the brackets change the nesting, to skip a declaration that's too deep
+_BRACKETS = {
+    TokenType.LEFT_PAREN: 1,
+    TokenType.LEFT_BRACE: 1,
+    TokenType.RIGHT_PAREN: -1,
+    TokenType.RIGHT_BRACE: -1,
+}
+
+_CONSTANTS = {TokenType.FALSE: False, TokenType.TRUE: True, TokenType.NIL: None}
+_LITERALS = {TokenType.NUMBER, TokenType.STRING, *_CONSTANTS}
+
+
 class Parser:
-    def __init__(self, tokens: List[Token], on_token_error=None):
+    def __init__(
+        self,
+        tokens: Iterable[Token],
+        on_token_error=None,
+        load_body: Optional[Callable[[LazyFunction], List[Stmt]]] = None,
+    ):
         """
         Create a new parser that will parse the tokens in `tokens`
         'on_token_error' will be called when we encounter an error.
+
+        The tokens are taken as they are needed, so they can come from a scanner that
+        is still reading its source. Only the tokens of the current statement are
+        kept in `tokens`.
+
+        When `load_body` is given, the bodies of top level functions are skipped.
+        They become a LazyFunction, which calls `load_body` when it is first used.
         """
 
-        self.tokens = tokens
+        self.pending = iter(tokens)
+        self.tokens: List[Token] = list(islice(self.pending, TOKENS_AHEAD))
         self.on_token_error = on_token_error
+        self.load_body = load_body
         self.current = 0
+        # The nesting of the node that is being parsed
+        self.depth = 0
 
     def parse(self) -> List[Stmt]:
-        statements = []
-        while not self._is_at_end():
-            if declaration := self._declaration():
-                statements.append(declaration)
+        return list(self.iter_statements())
 
-        return statements
+    def iter_statements(self) -> Iterator[Stmt]:
+        """Parse and yield the top level statements one at a time"""
+        while not self._is_at_end():
+            start = self.current
+            try:
+                declaration = self._declaration(top_level=True)
+            except NestingError:
+                self.depth = 0
+                self._skip_nested(start)
+                declaration = None
+
+            # Drop the tokens that were parsed, except for the previous one
+            parsed = self.current - 1
+            if parsed > 0:
+                del self.tokens[:parsed]
+                self.current -= parsed
+
+            if declaration:
+                yield declaration
+
+    def parse_body(self) -> List[Stmt]:
+        """ Parse the tokens of a LazyFunction, the statements of its body """
+        # The body nests in the function, as in `_function`
+        self.depth = 1
+        try:
+            return self._block()
+        except NestingError:
+            return []
 
-    def _declaration(self) -> Optional[Stmt]:
+    def _declaration(self, top_level: bool = False) -> Optional[Stmt]:
+        depth = self.depth
         try:
             if self._match(TokenType.CLASS):
                 return self._class_declaration()
             if self._match(TokenType.FUN):
-                return self._function("function")
+                return self._function("function", top_level)
             if self._match(TokenType.VAR):
                 return self._var_declaration()
             return self._statement()
+        except NestingError:
+            # Only the outermost declaration recovers, see `_skip_nested`
+            raise
         except ParseError:
+            self.depth = depth
             self._synchronize()
             return None
 
@@ -87,7 +188,7 @@ class Parser:
         self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
         return Class(name=name, superclass=superclass, methods=methods)
 
-    def _function(self, kind: str) -> Function:
+    def _function(self, kind: str, top_level: bool = False) -> Function:
         name = self._consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
         self._consume(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name.")
 
@@ -109,9 +210,31 @@ class Parser:
 
         # Parse the body and wrap it in a function node
         self._consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
+        if top_level and self.load_body is not None:
+            return LazyFunction(name, parameters, self._skip_body(), self.load_body)
+        self._nest(name)
         body = self._block()
+        self.depth -= 1
         return Function(name=name, params=parameters, body=body)
 
+    def _skip_body(self) -> List[Token]:
+        """
+        Skip to the `}` that matches the `{` before the current token. Returns the
+        tokens up to and including it, with an EOF to end the body on its own.
+        """
+        start = self.current
+        depth = 1
+        while not self._is_at_end():
+            token = self._advance()
+            if token.token_type == TokenType.LEFT_BRACE:
+                depth += 1
+            elif token.token_type == TokenType.RIGHT_BRACE:
+                depth -= 1
+                if depth == 0:
+                    end = Token(TokenType.EOF, "", None, token.line)
+                    return [*self.tokens[start : self.current], end]
+        raise self._error(self._peek(), "Expect '}' after block.")
+
     def _var_declaration(self) -> Stmt:
         name = self._consume(TokenType.IDENTIFIER, "Expect variable name.")
 
@@ -124,25 +247,29 @@ class Parser:
         return Var(name=name, initializer=initializer)
 
     def _statement(self) -> Stmt:
-        if self._match(TokenType.FOR):
-            return self._for_statement()
+        self._nest(self._peek())
+        try:
+            if self._match(TokenType.FOR):
+                return self._for_statement()
 
-        if self._match(TokenType.IF):
-            return self._if_statement()
+            if self._match(TokenType.IF):
+                return self._if_statement()
 
-        if self._match(TokenType.PRINT):
-            return self._print_statement()
+            if self._match(TokenType.PRINT):
+                return self._print_statement()
 
-        if self._match(TokenType.RETURN):
-            return self._return_statement()
+            if self._match(TokenType.RETURN):
+                return self._return_statement()
 
-        if self._match(TokenType.WHILE):
-            return self._while_statement()
+            if self._match(TokenType.WHILE):
+                return self._while_statement()
 
-        if self._match(TokenType.LEFT_BRACE):
-            return Block(self._block())
+            if self._match(TokenType.LEFT_BRACE):
+                return Block(self._block())
 
-        return self._expression_statement()
+            return self._expression_statement()
+        finally:
+            self.depth -= 1
 
     def _block(self) -> List[Stmt]:
         statements = []
@@ -175,9 +302,13 @@ class Parser:
         increment = None
         if not self._check(TokenType.RIGHT_PAREN):
             increment = self._expression()
-        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+        paren = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
 
+        # The body nests in the While and the Block it's desugared to
+        self._nest(paren)
+        self._nest(paren)
         body = self._statement()
+        self.depth -= 2
 
         # If the increment exists, execute it after every 'body' call
         if increment:
@@ -194,17 +325,27 @@ class Parser:
         return body
 
     def _if_statement(self) -> Stmt:
-        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
-        condition: Expr = self._expression()
-        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
-
-        then_branch = self._statement()
+        # An `else if` chain is parsed in a loop, so it can be longer than the
+        # Python stack is deep. It still becomes nested If statements.
+        branches = []
+        else_branch: Optional[Stmt] = None
+        while True:
+            self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
+            condition: Expr = self._expression()
+            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
+            branches.append((condition, self._statement()))
 
-        else_branch = None
-        if self._match(TokenType.ELSE):
-            else_branch = self._statement()
+            if not self._match(TokenType.ELSE):
+                break
+            if not self._match(TokenType.IF):
+                else_branch = self._statement()
+                break
 
-        return If(condition=condition, then_branch=then_branch, else_branch=else_branch)
+        for condition, then_branch in reversed(branches):
+            else_branch = If(
+                condition=condition, then_branch=then_branch, else_branch=else_branch
+            )
+        return else_branch  # type: ignore
 
     def _print_statement(self) -> Stmt:
         value = self._expression()
@@ -238,95 +379,100 @@ class Parser:
         return Expression(expr)
 
     def _expression(self) -> Expr:
-        return self._assignment()
+        return self._parse_precedence(_ASSIGNMENT)
 
-    def _assignment(self) -> Expr:
-        expr = self._or()
-
-        if self._match(TokenType.EQUAL):
-            equals = self._previous()
-            value = self._assignment()
-
-            if isinstance(expr, Variable):
-                name = expr.name
-                return Assign(name=name, value=value)
-            elif isinstance(expr, Get):
-                return Set(expr.obj, expr.name, value)
-            self._error(equals, "Invalid assignment target.")
-        return expr
-
-    def _or(self) -> Expr:
-        expr = self._and()
-
-        while self._match(TokenType.OR):
-            operator = self._previous()
-            right = self._and()
-            expr = Logical(left=expr, operator=operator, right=right)
-
-        return expr
-
-    def _and(self) -> Expr:
-        expr = self._equality()
-
-        while self._match(TokenType.AND):
-            operator = self._previous()
-            right = self._equality()
-            expr = Logical(left=expr, operator=operator, right=right)
-
-        return expr
+    def _parse_precedence(self, precedence: int) -> Expr:
+        """
+        Parse an expression of operators that bind at least as tight as
+        `precedence`. The token after an operand picks the operator from the
+        `_INFIX` table, instead of descending through a method for every level.
+        """
+        depth = self.depth
+        self._nest(self._peek())
+        try:
+            expr = self._prefix()
 
-    def _equality(self) -> Expr:
-        expr = self._comparison()
+            while True:
+                operator = self._peek()
+                binding = _INFIX.get(operator.token_type)
+                if binding is None or binding < precedence:
+                    return expr
+                self._advance()
+                # The operators of a chain nest the operands before them
+                self._nest(operator)
+                expr = self._infix(expr, operator, binding)
+        finally:
+            self.depth = depth
+
+    def _prefix(self) -> Expr:
+        """Parse the operand an expression starts with, or a unary operator"""
+        token = self._peek()
+        token_type = token.token_type
+
+        if token_type == TokenType.IDENTIFIER:
+            self._advance()
+            return Variable(token)
 
-        while self._match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator = self._previous()
-            right = self._comparison()
-            expr = Binary(expr, operator, right)
+        if token_type in _LITERALS:
+            self._advance()
+            if token_type in _CONSTANTS:
+                return Literal(_CONSTANTS[token_type])
+            return Literal(token.literal)
 
-        return expr
+        if token_type == TokenType.BANG or token_type == TokenType.MINUS:
+            self._advance()
+            right = self._parse_precedence(_UNARY)
+            return Unary(token, right)
 
-    def _comparison(self) -> Expr:
-        expr = self._addition()
+        if token_type == TokenType.LEFT_PAREN:
+            self._advance()
+            expr = self._expression()
+            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+            return Grouping(expr)
 
-        while self._match(
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-        ):
-            operator = self._previous()
-            right = self._addition()
-            expr = Binary(expr, operator, right)
+        if token_type == TokenType.THIS:
+            self._advance()
+            return This(token)
 
-        return expr
+        if token_type == TokenType.SUPER:
+            self._advance()
+            self._consume(TokenType.DOT, "Expect '.' after 'super'.")
+            method = self._consume(
+                TokenType.IDENTIFIER, "Expect superclass method name."
+            )
 
-    def _addition(self) -> Expr:
-        expr = self._multiplication()
+            return Super(token, method)
 
-        while self._match(TokenType.MINUS, TokenType.PLUS):
-            operator = self._previous()
-            right = self._multiplication()
-            expr = Binary(expr, operator, right)
+        raise self._error(token, "Expect expression")
 
-        return expr
+    def _infix(self, left: Expr, operator: Token, binding: int) -> Expr:
+        """Parse the rest of the expression `operator` continues `left` with"""
+        token_type = operator.token_type
 
-    def _multiplication(self) -> Expr:
-        expr = self._unary()
+        if token_type == TokenType.LEFT_PAREN:
+            return self._finish_call(left)
 
-        while self._match(TokenType.SLASH, TokenType.STAR):
-            operator = self._previous()
-            right = self._unary()
-            expr = Binary(expr, operator, right)
+        if token_type == TokenType.DOT:
+            name = self._consume(
+                TokenType.IDENTIFIER, "Expect property name after '.'."
+            )
+            return Get(left, name)
 
-        return expr
+        if token_type == TokenType.EQUAL:
+            # Assignment is right associative
+            value = self._parse_precedence(_ASSIGNMENT)
 
-    def _unary(self) -> Expr:
-        if self._match(TokenType.BANG, TokenType.MINUS):
-            operator = self._previous()
-            right = self._unary()
-            return Unary(operator, right)
+            if isinstance(left, Variable):
+                return Assign(name=left.name, value=value)
+            elif isinstance(left, Get):
+                return Set(left.obj, left.name, value)
+            raise self._error(operator, "Invalid assignment target.")
 
-        return self._call()
+        # The other operators are left associative
+        right = self._parse_precedence(binding + 1)
+        if token_type == TokenType.OR or token_type == TokenType.AND:
+            return Logical(left=left, operator=operator, right=right)
+        return Binary(left, operator, right)
 
     def _finish_call(self, callee: Expr) -> Expr:
         arguments = []
@@ -344,55 +490,30 @@ class Parser:
         paren = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
         return Call(callee=callee, paren=paren, arguments=arguments)
 
-    def _call(self) -> Expr:
-        expr = self._primary()
-
-        while True:
-            if self._match(TokenType.LEFT_PAREN):
-                expr = self._finish_call(expr)
-            elif self._match(TokenType.DOT):
-                name = self._consume(
-                    TokenType.IDENTIFIER, "Expect property name after '.'."
-                )
-                expr = Get(expr, name)
-            else:
-                break
-        return expr
-
-    def _primary(self) -> Expr:
-        if self._match(TokenType.FALSE):
-            return Literal(False)
-
-        if self._match(TokenType.TRUE):
-            return Literal(True)
-
-        if self._match(TokenType.NIL):
-            return Literal(None)
+    def _nest(self, token: Token):
+        """ Go a level deeper at `token`, which is reported when that's too deep """
+        self.depth += 1
+        if self.depth > MAX_NESTING:
+            self.on_token_error(token, "Too much nesting.")
+            raise NestingError(token, "Too much nesting.")
 
-        if self._match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self._previous().literal)
-
-        if self._match(TokenType.SUPER):
-            keyword = self._previous()
-            self._consume(TokenType.DOT, "Expect '.' after 'super'.")
-            method = self._consume(
-                TokenType.IDENTIFIER, "Expect superclass method name."
-            )
-
-            return Super(keyword, method)
-
-        if self._match(TokenType.THIS):
-            return This(self._previous())
-
-        if self._match(TokenType.IDENTIFIER):
-            return Variable(self._previous())
-
-        if self._match(TokenType.LEFT_PAREN):
-            expr = self._expression()
-            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return Grouping(expr)
-
-        raise self._error(self._peek(), "Expect expression")
+    def _skip_nested(self, start: int):
+        """
+        Skip the rest of a declaration that nests too deep, so the brackets that
+        close it aren't reported as errors. It ends at the first `;` or `}` outside
+        the brackets that were opened since the token at `start`.
+        """
+        opened = 0
+        for token in self.tokens[start : self.current]:
+            opened += _BRACKETS.get(token.token_type, 0)
+        while not self._is_at_end():
+            token = self._advance()
+            opened += _BRACKETS.get(token.token_type, 0)
+            if opened <= 0 and token.token_type in (
+                TokenType.SEMICOLON,
+                TokenType.RIGHT_BRACE,
+            ):
+                return
 
     def _match(self, *args: TokenType) -> bool:
         for tokentype in args:
@@ -414,6 +535,8 @@ class Parser:
     def _advance(self) -> Token:
         if not self._is_at_end():
             self.current += 1
+            if self.current == len(self.tokens):
+                self.tokens.extend(islice(self.pending, TOKENS_AHEAD))
         return self._previous()
 
     def _peek(self) -> Token:
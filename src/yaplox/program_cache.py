@@ -0,0 +1,124 @@
+import gc
+import hashlib
+import os
+import pickle
+from contextlib import suppress
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+from structlog import get_logger
+
+from yaplox import (
+    expr,
+    lazy_function,
+    parser,
+    regex_scanner,
+    scanner,
+    stmt,
+    token,
+    token_type,
+)
+from yaplox.__version__ import __version__
+from yaplox.scanner import Source
+from yaplox.stmt import Stmt
+
+logger = get_logger()
+
+CHECKS = ("hash", "timestamp")
+
+# The modules of the classes that are pickled, and those that make the statements
+FRONT_END_MODULES = (
+    expr,
+    lazy_function,
+    stmt,
+    token,
+    token_type,
+    parser,
+    regex_scanner,
+    scanner,
+)
+
+
+@lru_cache(maxsize=None)
+def cache_format() -> str:
+    """ A hash of the front end modules, an entry is only used with the same ones """
+    digest = hashlib.sha256()
+    for module in FRONT_END_MODULES:
+        with open(module.__file__, "rb") as f:  # type: ignore
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ProgramCache:
+    """
+    Keeps the statements that were parsed from a script in `directory`, like
+    __pycache__ does for Python. A script has one entry, which is used while the
+    yaplox version, the scanner and parser, the `scanner` that was chosen and the
+    check of the source are the same. The check is a hash of the source, or the
+    modification time and size of the file with `check="timestamp"`.
+
+    Only scanning and parsing are skipped. What the Resolver finds out is kept by
+    the backend, for nodes it knows by identity, so the loaded statements are
+    resolved as usual. The entries are pickles, so `directory` must be trusted.
+    """
+
+    def __init__(self, directory: str, check: str = "hash", scanner: str = "regex"):
+        if check not in CHECKS:
+            raise ValueError(f"Unknown cache check '{check}'.")
+        self.directory = directory
+        self.check = check
+        self.scanner = scanner
+
+    def load(self, file: str, source: Source, lazy: bool) -> Optional[List[Stmt]]:
+        """ The statements of `file`, or None when they're not cached or changed """
+        try:
+            with open(self._path(file), "rb") as f:
+                if pickle.load(f) != self._header(file, source, lazy):
+                    return None
+                # The garbage collector would run many times while the nodes are
+                # created, which takes longer than creating them
+                enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    return pickle.load(f)
+                finally:
+                    if enabled:
+                        gc.enable()
+        except Exception:
+            # Any entry that can't be loaded is parsed again, like a changed one
+            logger.debug("Not loaded from the cache", file=file)
+            return None
+
+    def store(self, file: str, source: Source, lazy: bool, statements: List[Stmt]):
+        """ Cache the statements parsed from `file`, if it can be written """
+        header = self._header(file, source, lazy)
+        path = self._path(file)
+        written = f"{path}.{os.getpid()}"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(written, "wb") as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(statements, f, pickle.HIGHEST_PROTOCOL)
+            # Another run never reads a half written entry
+            os.replace(written, path)
+        except (OSError, RecursionError, pickle.PicklingError):
+            # Deeply nested statements can't be pickled, they are parsed every run
+            logger.debug("Not cached", file=file)
+            with suppress(OSError):
+                os.remove(written)
+
+    def _path(self, file: str) -> str:
+        name = hashlib.sha256(os.path.abspath(file).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{os.path.basename(file)}.{name}.pickle")
+
+    def _header(self, file: str, source: Source, lazy: bool) -> Tuple[Any, ...]:
+        """ What the entry of `file` was made from, it is used when this is equal """
+        if self.check == "timestamp":
+            stat = os.stat(file)
+            key: Any = (stat.st_mtime_ns, stat.st_size)
+        else:
+            data = source.encode() if isinstance(source, str) else source
+            key = hashlib.sha256(data).hexdigest()  # type: ignore
+        # Lazy parsing skips the bodies of functions, and another scanner may not
+        # make the same tokens
+        return __version__, cache_format(), self.scanner, lazy, self.check, key
@@ -0,0 +1,116 @@
+import re
+import sys
+from typing import Iterator, List
+
+from yaplox.scanner import Scanner
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+
+# One alternative for every kind of lexeme. Comments come before the operators, so
+# `//` is not scanned as two slashes, and two character operators before one
+# character ones.
+_LEXEME = re.compile(
+    r"""
+    (?P<skip>[ \r\t]+|//[^\n]*)
+    | (?P<newline>\n)
+    | (?P<identifier>[A-Za-z_]\w*)
+    | (?P<number>[0-9]+(?:\.[0-9]+)?)
+    | (?P<string>"[^"]*")
+    | (?P<operator>[!=<>]=?|[(){},.\-+;*/])
+    """,
+    re.VERBOSE,
+)
+
+_OPERATORS = {
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    ",": TokenType.COMMA,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "*": TokenType.STAR,
+    "/": TokenType.SLASH,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+}
+
+
+class RegexScanner(Scanner):
+    """
+    A Scanner that matches whole lexemes with one precompiled regular expression,
+    instead of looking at every character on its own. It produces the same tokens.
+
+    Whatever the expression doesn't match, like an unterminated string, an
+    unexpected character or an identifier that doesn't start with an ASCII letter,
+    is scanned by the character based Scanner, so errors are reported the same way.
+
+    A file is scanned a piece at a time, while the tokens are taken.
+    """
+
+    def scan_tokens(self) -> List[Token]:
+        self.tokens = list(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self) -> Iterator[Token]:  # noqa: C901
+        match = _LEXEME.match
+        keywords = self.keywords
+        # Names and operators are repeated a lot, equal lexemes share one string
+        intern = sys.intern
+        line = self.line
+        # The tokens the Scanner adds for what the expression doesn't match
+        fallback = self.tokens
+
+        while True:
+            source = self.source
+            position = 0
+            end = len(source)
+            following = next(self.pieces, None)
+
+            while position < end:
+                lexeme = match(source, position)
+                if lexeme is None:
+                    if following is not None and source[position] == '"':
+                        # The string ends in the next piece
+                        break
+                    self.start = self.current = position
+                    self.line = line
+                    self._scan_token()
+                    position = self.current
+                    line = self.line
+                    yield from fallback
+                    fallback.clear()
+                    continue
+
+                kind = lexeme.lastgroup
+                text = lexeme.group()
+                position = lexeme.end()
+                if kind == "identifier":
+                    token_type = keywords.get(text, TokenType.IDENTIFIER)
+                    yield Token(token_type, intern(text), None, line)
+                elif kind == "operator":
+                    yield Token(_OPERATORS[text], intern(text), None, line)
+                elif kind == "newline":
+                    line += 1
+                elif kind == "number":
+                    yield Token(TokenType.NUMBER, text, float(text), line)
+                elif kind == "string":
+                    # Like in the Scanner, the token gets the line the string ends on
+                    line += text.count("\n")
+                    yield Token(TokenType.STRING, text, text[1:-1], line)
+
+            if following is None:
+                break
+            self.source = source[position:] + following
+
+        self.start = self.current = position
+        self.line = line
+        yield Token(token_type=TokenType.EOF, lexeme="", literal=None, line=self.line)
@@ -1,8 +1,11 @@
+from __future__ import annotations
+
 from collections import deque
-from typing import Deque, List
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
 
 from structlog import get_logger
 
+from yaplox.backend import Resolution, Upvalue
 from yaplox.class_type import ClassType
 from yaplox.expr import (
     Assign,
@@ -21,7 +24,7 @@ from yaplox.expr import (
     Variable,
 )
 from yaplox.function_type import FunctionType
-from yaplox.interpreter import Interpreter
+from yaplox.lazy_function import LazyFunction
 from yaplox.stmt import (
     Block,
     Class,
@@ -40,13 +43,41 @@ from yaplox.token import Token
 logger = get_logger()
 
 
+class Declaration:
+    """
+    A local variable. Its uses are collected and only reported when its scope ends,
+    because by then we know if a closure captured it.
+    """
+
+    def __init__(self, key: Hashable, slot: int):
+        self.key = key
+        # Variables get a slot in the order they are declared in their scope
+        self.slot = slot
+        # Whether its initializer was resolved, so it can be read
+        self.defined = False
+        self.captured = False
+        self.uses: List[Tuple[Hashable, int]] = []
+
+
+class FunctionState:
+    """ A function that is being resolved, and the variables it captures """
+
+    def __init__(self, enclosing: Optional[FunctionState], scope_base: int):
+        self.enclosing = enclosing
+        # The index of the first scope that belongs to this function
+        self.scope_base = scope_base
+        self.upvalues: List[Upvalue] = []
+
+
 class Resolver(ExprVisitor, StmtVisitor):
-    def __init__(self, interpreter: Interpreter, on_error=None):
+    def __init__(self, interpreter: Resolution, on_error=None):
         self.interpreter = interpreter
-        self.scopes: Deque = deque()
+        # The declarations of every scope by their name, in slot order
+        self.scopes: Deque[Dict[str, Declaration]] = deque()
         self.on_error = on_error
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
+        self.function_state = FunctionState(enclosing=None, scope_base=0)
 
     def resolve(self, statements: List[Stmt]):
         self._resolve_statements(statements)
@@ -61,18 +92,48 @@ class Resolver(ExprVisitor, StmtVisitor):
     def _resolve_expression(self, expression: Expr):
         expression.accept(self)
 
-    def _resolve_local(self, expr: Expr, name: Token):
+    def _resolve_local(self, expr: Hashable, name: str):
         for idx, scope in enumerate(reversed(self.scopes)):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, idx)
+            declaration = scope.get(name)
+            if declaration is not None:
+                index = len(self.scopes) - 1 - idx
+                if index >= self.function_state.scope_base:
+                    declaration.uses.append((expr, idx))
+                else:
+                    upvalue = self._resolve_upvalue(
+                        self.function_state, index, declaration
+                    )
+                    self.interpreter.resolve_upvalue(expr, upvalue)
                 return
         # Not found. Assume it is global.
 
+    def _resolve_upvalue(
+        self, function: FunctionState, index: int, declaration: Declaration
+    ) -> int:
+        """
+        Capture the variable `declaration` in scope `index` in `function`, and in
+        all functions between that function and the one that declares the variable.
+        """
+        enclosing: FunctionState = function.enclosing  # type: ignore
+        if index >= enclosing.scope_base:
+            declaration.captured = True
+            upvalue = (True, function.scope_base - 1 - index, declaration.slot)
+        else:
+            upvalue = (False, self._resolve_upvalue(enclosing, index, declaration), 0)
+
+        if upvalue not in function.upvalues:
+            function.upvalues.append(upvalue)
+        return function.upvalues.index(upvalue)
+
     def _resolve_function(self, function: Function, type: FunctionType):
         enclosing_function = self.current_function
         self.current_function = type
+        self.function_state = FunctionState(self.function_state, len(self.scopes))
 
         self._begin_scope()
+        if type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            # Like in clox, `this` is the first variable of a method
+            self._add_local("this", function)
         for param in function.params:
             self._declare(param)
             self._define(param)
@@ -81,11 +142,32 @@ class Resolver(ExprVisitor, StmtVisitor):
         self._end_scope()
         self.current_function = enclosing_function
 
+        function_state = self.function_state
+        self.function_state = function_state.enclosing  # type: ignore
+        self.interpreter.resolve_function(function, function_state.upvalues)
+
     def _begin_scope(self):
         self.scopes.append({})
 
     def _end_scope(self):
-        self.scopes.pop()
+        for declaration in self.scopes.pop().values():
+            slot = declaration.slot
+            if declaration.captured:
+                self.interpreter.capture(declaration.key)
+                for expr, depth in declaration.uses:
+                    self.interpreter.resolve_cell(expr, depth, slot)
+            else:
+                for expr, depth in declaration.uses:
+                    self.interpreter.resolve(expr, depth, slot)
+            self.interpreter.declare(
+                declaration.key, [expr for expr, _ in declaration.uses]
+            )
+
+    def _add_local(self, name: str, key: Hashable):
+        """ Add a variable without a name token, like `this` and `super` """
+        declaration = Declaration(key, len(self.scopes[-1]))
+        declaration.defined = True
+        self.scopes[-1][name] = declaration
 
     def _declare(self, name: Token):
         """
@@ -97,10 +179,12 @@ class Resolver(ExprVisitor, StmtVisitor):
 
         # Look at the last scope
         scope = self.scopes[-1]
-        if name.lexeme in scope:
+        declaration = scope.get(name.lexeme)
+        if declaration is not None:
             self.on_error(name, "Already variable with this name in this scope.")
-
-        scope[name.lexeme] = False
+            declaration.defined = False
+        else:
+            scope[name.lexeme] = Declaration(name, len(scope))
 
     def _define(self, name: Token):
         """
@@ -111,12 +195,11 @@ class Resolver(ExprVisitor, StmtVisitor):
         if len(self.scopes) == 0:
             return
 
-        scope = self.scopes[-1]
-        scope[name.lexeme] = True
+        self.scopes[-1][name.lexeme].defined = True
 
     def visit_assign_expr(self, expr: Assign):
         self._resolve_expression(expr.value)
-        self._resolve_local(expr, expr.name)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_binary_expr(self, expr: Binary):
         self._resolve_expression(expr.left)
@@ -149,7 +232,7 @@ class Resolver(ExprVisitor, StmtVisitor):
         if self.current_class == ClassType.NONE:
             self.on_error(expr.keyword, "Can't use 'this' outside of a class.")
 
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, "this")
 
     def visit_set_expr(self, expr: Set):
         self._resolve_expression(expr.value)
@@ -163,19 +246,31 @@ class Resolver(ExprVisitor, StmtVisitor):
                 expr.keyword, "Can't use 'super' in a class with no superclass."
             )
 
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, "super")
+        # The instance the method is bound to, resolved with the `super` token as key
+        self._resolve_local(expr.keyword, "this")
 
     def visit_unary_expr(self, expr: Unary):
         self._resolve_expression(expr.right)
 
     def visit_variable_expr(self, expr: Variable):
-        if len(self.scopes) != 0 and self.scopes[-1].get(expr.name.lexeme) is False:
+        declaration = self.scopes[-1].get(expr.name.lexeme) if self.scopes else None
+        if declaration is not None and not declaration.defined:
             self.on_error(
                 expr.name, "Cannot read local variable in its own initializer."
             )
-        self._resolve_local(expr, expr.name)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_block_stmt(self, stmt: Block):
+        if not any(
+            isinstance(statement, (Var, Function, Class))
+            for statement in stmt.statements
+        ):
+            # Nothing to store, so the block runs in the scope around it
+            self.interpreter.elide_scope(stmt)
+            self._resolve_statements(stmt.statements)
+            return
+
         self._begin_scope()
         self._resolve_statements(stmt.statements)
         self._end_scope()
@@ -196,10 +291,7 @@ class Resolver(ExprVisitor, StmtVisitor):
 
         if stmt.superclass is not None:
             self._begin_scope()
-            self.scopes[-1]["super"] = True
-
-        self._begin_scope()
-        self.scopes[-1]["this"] = True
+            self._add_local("super", stmt)
 
         for method in stmt.methods:
             declaration = FunctionType.METHOD
@@ -208,8 +300,6 @@ class Resolver(ExprVisitor, StmtVisitor):
 
             self._resolve_function(method, declaration)
 
-        self._end_scope()
-
         if stmt.superclass is not None:
             self._end_scope()
 
@@ -222,13 +312,22 @@ class Resolver(ExprVisitor, StmtVisitor):
         self._declare(stmt.name)
         self._define(stmt.name)
 
+        if isinstance(stmt, LazyFunction) and not stmt.loaded:
+            # A top level function captures nothing, the body is resolved on its own
+            # when it is loaded.
+            self.interpreter.resolve_function(stmt, [])
+            return
         self._resolve_function(stmt, FunctionType.FUNCTION)
 
     def visit_if_stmt(self, stmt: If):
-        self._resolve_expression(stmt.condition)
-        self._resolve_statement(stmt.then_branch)
-        if stmt.else_branch:
-            self._resolve_statement(stmt.else_branch)
+        # Walk `else if` chains in a loop, they can be longer than the stack is deep
+        else_branch: Optional[Stmt] = stmt
+        while isinstance(else_branch, If):
+            self._resolve_expression(else_branch.condition)
+            self._resolve_statement(else_branch.then_branch)
+            else_branch = else_branch.else_branch
+        if else_branch:
+            self._resolve_statement(else_branch)
 
     def visit_print_stmt(self, stmt: Print):
         self._resolve_expression(stmt.expression)
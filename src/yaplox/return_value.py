@@ -0,0 +1,32 @@
+from typing import Any, List
+
+
+class ReturnValue:
+    """
+    The completion of a return statement. Executing a statement gives None, unless
+    it ran into a return, then this is passed on to the function that is called.
+
+    jlox raises an exception instead, but that is a lot slower than checking the
+    result of every statement.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class TailCall(ReturnValue):
+    """
+    The completion of `return f(...)` where `f` is a Lox function. The call isn't
+    made yet: the function that returns runs `f` in its own loop, so a chain of
+    tail calls doesn't nest Python frames.
+    """
+
+    __slots__ = ("function", "receiver", "arguments")
+
+    def __init__(self, function: Any, receiver: Any, arguments: List[Any]):
+        super().__init__(None)
+        self.function = function
+        self.receiver = receiver
+        self.arguments = arguments
@@ -1,8 +1,35 @@
-from typing import Any, Callable, Dict, List
+import mmap
+from typing import Any, Callable, Dict, Iterator, List, TextIO, Union
 
 from yaplox.token import Token
 from yaplox.token_type import TokenType
 
+# What a scanner reads from: the text itself, a text file or a memory mapped file
+Source = Union[str, TextIO, mmap.mmap]
+
+# Roughly how many characters of a file are read at a time
+CHUNK_SIZE = 1 << 16
+
+
+def chunks(source: Source, size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Read `source` in pieces of about `size` characters that end at the end of a
+    line, only a string can continue on the next one. Text is one piece.
+    """
+    if isinstance(source, str):
+        yield source
+    elif isinstance(source, mmap.mmap):
+        position = 0
+        end = len(source)
+        while position < end:
+            newline = source.find(b"\n", position + size)
+            stop = end if newline == -1 else newline + 1
+            yield source[position:stop].decode()
+            position = stop
+    else:
+        while lines := source.readlines(size):
+            yield "".join(lines)
+
 
 class Scanner:
     tokens: List
@@ -28,16 +55,27 @@ class Scanner:
         "while": TokenType.WHILE,
     }
 
-    def __init__(self, source: str, on_error=None):
+    def __init__(self, source: Source, on_error=None):
         """
         Create a new scanner that will scan the variable 'source'.
         'on_error' will be called when we encounter an error.
         """
-        self.source = source
+        # The text that is scanned. A file is read in pieces, the first one here
+        self.pieces = chunks(source)
+        self.source = next(self.pieces, "")
         self.on_error = on_error
         self.tokens = []
 
+    def iter_tokens(self) -> Iterator[Token]:
+        """
+        Yield the tokens one at a time. This scanner looks at the whole source, so
+        it reads all of it first.
+        """
+        yield from self.scan_tokens()
+
     def scan_tokens(self) -> List[Token]:
+        self.source += "".join(self.pieces)
+
         while not self._is_at_end():
             # We are at the beginning of the next lexeme.
             self.start = self.current
@@ -79,15 +117,15 @@ class Scanner:
         self._add_token(TokenType.STRING, string_value)
 
     def _number(self):
-        while self._peek().isdigit():
+        while self._is_digit(self._peek()):
             self._advance()
 
         # Look for a fractional part
-        if self._peek() == "." and self._peek_next().isdigit():
+        if self._peek() == "." and self._is_digit(self._peek_next()):
             # Consume the '.'
             self._advance()
             # Consume the fraction
-            while self._peek().isdigit():
+            while self._is_digit(self._peek()):
                 self._advance()
 
         number_value = self.source[self.start : self.current]
@@ -150,7 +188,7 @@ class Scanner:
             option()
         except KeyError:
             # This is the 'default' case in the Java switch statement
-            if c.isdigit():
+            if self._is_digit(c):
                 # An digit encountered, consume the number
                 self._number()
             elif c.isalpha() or c == "_":
@@ -163,6 +201,11 @@ class Scanner:
             else:
                 raise
 
+    @staticmethod
+    def _is_digit(c: str) -> bool:
+        """ Only ASCII digits, like in the RegexScanner, `isdigit` accepts '٣' """
+        return "0" <= c <= "9"
+
     def _is_at_end(self):
         return self.current >= len(self.source)
 
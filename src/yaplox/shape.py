@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+
+class Shape:
+    """
+    The layout of the fields of an instance: the slot of every field in its list of
+    values. Instances that got the same fields in the same order share their Shape,
+    adding a field moves an instance to the next Shape.
+
+    Every class starts with an empty Shape of its own, so a Shape also tells the
+    class of the instance.
+    """
+
+    __slots__ = ("slots", "transitions")
+
+    def __init__(self, slots: Optional[Dict[str, int]] = None):
+        self.slots: Dict[str, int] = slots if slots is not None else {}
+        self.transitions: Dict[str, Shape] = {}
+
+    def with_field(self, name: str) -> Shape:
+        """ Return the Shape after adding the field `name` """
+        shape = self.transitions.get(name)
+        if shape is None:
+            shape = Shape({**self.slots, name: len(self.slots)})
+            self.transitions[name] = shape
+        return shape
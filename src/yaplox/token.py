@@ -8,6 +8,9 @@ class Token:
     Store parsed tokens
     """
 
+    # Programs have a lot of tokens, without a __dict__ every one is a lot smaller
+    __slots__ = ("token_type", "lexeme", "literal", "line")
+
     def __init__(self, token_type: TokenType, lexeme: str, literal: Any, line: int):
         """
         Create a new Token. In the Lox documentation `token_type` is called `type`.
@@ -18,5 +21,9 @@ class Token:
         self.literal = literal
         self.line = line
 
+    def __reduce__(self):
+        # Pickled as the arguments to create it, which is smaller than the slots
+        return Token, (self.token_type, self.lexeme, self.literal, self.line)
+
     def __repr__(self):
         return f"{self.token_type} {self.lexeme} {self.literal}"
@@ -0,0 +1,831 @@
+from __future__ import annotations
+
+import ast
+import re
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from yaplox.backend import Backend
+from yaplox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from yaplox.stmt import (
+    Block,
+    Class,
+    Expression,
+    Function,
+    If,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.transpiler_runtime import namespace, runtime_error
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+# Operators with a fast path for two floats, and the helper that handles the rest
+_ARITHMETIC: Dict[TokenType, Tuple[ast.operator, str]] = {
+    TokenType.PLUS: (ast.Add(), "rt_add"),
+    TokenType.MINUS: (ast.Sub(), "rt_subtract"),
+    TokenType.STAR: (ast.Mult(), "rt_multiply"),
+    TokenType.SLASH: (ast.Div(), "rt_divide"),
+}
+
+_COMPARISON: Dict[TokenType, Tuple[ast.cmpop, str]] = {
+    TokenType.GREATER: (ast.Gt(), "rt_greater"),
+    TokenType.GREATER_EQUAL: (ast.GtE(), "rt_greater_equal"),
+    TokenType.LESS: (ast.Lt(), "rt_less"),
+    TokenType.LESS_EQUAL: (ast.LtE(), "rt_less_equal"),
+}
+
+_EQUALITY: Dict[TokenType, ast.cmpop] = {
+    TokenType.EQUAL_EQUAL: ast.Eq(),
+    TokenType.BANG_EQUAL: ast.NotEq(),
+}
+
+_UNDEFINED_NAME = re.compile(r"name 'g_(.*)' is not defined")
+
+
+class Binding:
+    """ The Python name of a Lox local, and the generated function it belongs to """
+
+    def __init__(self, name: str, owner: Optional[FunctionContext]):
+        self.name = name
+        self.owner = owner
+
+
+class FunctionContext:
+    """
+    A Python function that is being generated. Besides the body, it collects the
+    names that have to be declared `global` or `nonlocal` in it.
+    """
+
+    def __init__(
+        self, enclosing: Optional[FunctionContext], this: Optional[str] = None
+    ):
+        self.enclosing = enclosing
+        # The name of `this` when the function is an initializer
+        self.this = this
+        self.body: List[ast.stmt] = []
+        self.globals: List[str] = []
+        self.nonlocals: List[str] = []
+
+
+def _children(statement: Stmt) -> List[Stmt]:
+    if isinstance(statement, Block):
+        return statement.statements
+    if isinstance(statement, If):
+        return [statement.then_branch] + (
+            [statement.else_branch] if statement.else_branch else []
+        )
+    if isinstance(statement, While):
+        return [statement.body]
+    return []
+
+
+def _contains(statement: Stmt, kinds: Tuple[type, ...]) -> bool:
+    """
+    Whether `statement` is or contains one of `kinds`. The statements are walked
+    with a list, `else if` chains can be longer than the stack is deep.
+    """
+    pending = [statement]
+    while pending:
+        statement = pending.pop()
+        if isinstance(statement, kinds):
+            return True
+        pending.extend(_children(statement))
+    return False
+
+
+def _declares_function(statement: Stmt) -> bool:
+    return _contains(statement, (Function, Class))
+
+
+def _returns(statement: Stmt) -> bool:
+    return _contains(statement, (Return,))
+
+
+class Transpiler(Backend, ExprVisitor, StmtVisitor):
+    """
+    Execute statements by translating them into a Python module, which is compiled
+    by CPython into its own bytecode.
+
+    Lox functions become Python functions and Lox locals become Python locals, or
+    cells when a closure captures them. The top level code is wrapped into the
+    function `rt_script`, Lox globals are globals of the module. Everything Python
+    doesn't do the Lox way is left to the helpers in `transpiler_runtime`, and the
+    fast path for floats and plain function calls is inlined.
+    """
+
+    filename = "<lox>"
+
+    def __init__(self):
+        self.namespace: Dict[str, Any] = namespace(self)
+
+        self.scopes: List[Dict[str, Binding]] = []
+        self.context = FunctionContext(enclosing=None)
+        self.line = 0
+        self._counter = 0
+
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        """ Python closures capture variables by name, so locals are found by name """
+
+    def interpret(self, statements: List[Stmt], on_error=None) -> Any:
+        module = self.transpile(statements)
+        try:
+            code = compile(module, self.filename, "exec")
+        except (SyntaxError, RecursionError) as excp:
+            # CPython limits how deep blocks and expressions can nest, Lox doesn't
+            on_error(self._too_nested(excp))
+            return None
+        exec(code, self.namespace)
+        try:
+            # Just like the Interpreter, return the last value to ease testing
+            return self.namespace["rt_script"]()
+        except YaploxRuntimeError as excp:
+            on_error(excp)
+        except NameError as excp:
+            on_error(self._undefined_variable(excp))
+        except RecursionError as excp:
+            on_error(self._stack_overflow(excp))
+
+    def transpile(self, statements: List[Stmt]) -> ast.Module:
+        """ Translate top level statements into a module that defines `rt_script` """
+        self.context = FunctionContext(enclosing=None)
+        for statement in statements:
+            self._execute(statement)
+
+        body = self.context.body
+        if statements and isinstance(statements[-1], Expression):
+            body[-1] = self._located(ast.Return(value=body[-1].value))  # type: ignore
+
+        module = ast.Module(
+            body=[self._function_def("rt_script", [], self.context)], type_ignores=[]
+        )
+        return ast.fix_missing_locations(module)
+
+    def _undefined_variable(self, error: NameError) -> YaploxRuntimeError:
+        """ Reading an undefined global raises a NameError in the generated code """
+        match = _UNDEFINED_NAME.match(str(error))
+        traceback = error.__traceback__
+        while traceback is not None and traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        if (
+            match is None
+            or traceback is None
+            or traceback.tb_frame.f_code.co_filename != self.filename
+        ):
+            raise error
+        return runtime_error(
+            traceback.tb_lineno, f"Undefined variable '{match.group(1)}'."
+        )
+
+    @staticmethod
+    def _too_nested(error: Exception) -> YaploxRuntimeError:
+        """ The generated module nests deeper than CPython can compile """
+        line = error.lineno if isinstance(error, SyntaxError) else None
+        return runtime_error(line or 0, "Too much nesting for the 'python' backend.")
+
+    def _stack_overflow(self, error: RecursionError) -> YaploxRuntimeError:
+        """ Lox calls are Python calls, report the innermost one in the Lox code """
+        line = 0
+        traceback = error.__traceback__
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == self.filename:
+                line = traceback.tb_lineno
+            traceback = traceback.tb_next
+        return runtime_error(line, "Stack overflow.")
+
+    # Helpers to build the Python tree
+
+    def _unique(self, name: str, prefix: str = "l") -> str:
+        """
+        Return a fresh Python name. Lox allows shadowing, and every declaration
+        gets its own name so it can be a local of the Python function it's in.
+        """
+        self._counter += 1
+        return f"{prefix}{self._counter}_{name}"
+
+    def _temp(self) -> str:
+        self._counter += 1
+        return f"t{self._counter}"
+
+    def _located(self, node: Any, line: Optional[int] = None) -> Any:
+        node.lineno = node.end_lineno = self.line if line is None else line
+        node.col_offset = node.end_col_offset = 0
+        return node
+
+    @staticmethod
+    def _load(name: str) -> ast.Name:
+        return ast.Name(id=name, ctx=ast.Load())
+
+    @staticmethod
+    def _store(name: str) -> ast.Name:
+        return ast.Name(id=name, ctx=ast.Store())
+
+    def _helper(self, name: str, *arguments: ast.expr) -> ast.Call:
+        return ast.Call(func=self._load(name), args=list(arguments), keywords=[])
+
+    def _assign(self, name: str, value: ast.expr) -> ast.Assign:
+        return self._located(ast.Assign(targets=[self._store(name)], value=value))
+
+    def _emit(self, statement: ast.stmt):
+        self.context.body.append(self._located(statement))
+
+    def _statements(self, statements: List[Stmt]) -> List[ast.stmt]:
+        """ Translate statements into a new list, for the body of an if or a while """
+        body = self.context.body
+        self.context.body = []
+        for statement in statements:
+            self._execute(statement)
+        translated, self.context.body = self.context.body, body
+        return translated or [self._located(ast.Pass())]
+
+    def _function_def(
+        self, name: str, params: List[str], context: FunctionContext
+    ) -> ast.FunctionDef:
+        body: List[ast.stmt] = []
+        if context.globals:
+            body.append(self._located(ast.Global(names=context.globals)))
+        if context.nonlocals:
+            body.append(self._located(ast.Nonlocal(names=context.nonlocals)))
+        body.extend(context.body or [self._located(ast.Pass())])
+
+        arguments = ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg=param) for param in params],
+            vararg=None,
+            kwonlyargs=[],
+            kw_defaults=[],
+            kwarg=None,
+            defaults=[],
+        )
+        function = ast.FunctionDef(
+            name=name, args=arguments, body=body, decorator_list=[], returns=None
+        )
+        if "type_params" in ast.FunctionDef._fields:  # pragma: no cover
+            function.type_params = []  # type: ignore
+        return self._located(function)
+
+    def _truthy(self, value: ast.expr) -> ast.expr:
+        """ `value is not None and value is not False`, evaluating value once """
+        temp = self._temp()
+        return ast.BoolOp(
+            op=ast.And(),
+            values=[
+                ast.Compare(
+                    left=ast.NamedExpr(target=self._store(temp), value=value),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Constant(value=None)],
+                ),
+                ast.Compare(
+                    left=self._load(temp),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Constant(value=False)],
+                ),
+            ],
+        )
+
+    def _condition(self, expr: Expr) -> ast.expr:
+        """ Translate the condition of an if or while, to a Python bool """
+        while isinstance(expr, Grouping):
+            expr = expr.expression
+
+        operator = getattr(expr, "operator", None)
+        if (
+            isinstance(expr, (Binary, Unary))
+            and operator is not None
+            and (
+                operator.token_type in _COMPARISON
+                or operator.token_type in _EQUALITY
+                or operator.token_type == TokenType.BANG
+            )
+        ):
+            # These are a bool already
+            return self._evaluate(expr)
+        return self._truthy(self._evaluate(expr))
+
+    def _is_float(self, temp: str, value: ast.expr) -> ast.expr:
+        """ `type(temp := value) is float` """
+        return ast.Compare(
+            left=self._helper(
+                "type", ast.NamedExpr(target=self._store(temp), value=value)
+            ),
+            ops=[ast.Is()],
+            comparators=[self._load("float")],
+        )
+
+    def _binding(self, name: str) -> Optional[Binding]:
+        """
+        Find a local by name. The scopes are entered in the same order as in the
+        Resolver, so this finds the same variable. None means it's a global.
+        """
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _declare(self, name: Token) -> str:
+        """ Declare a variable in the current scope, and return its Python name """
+        if not self.scopes:
+            python_name = f"g_{name.lexeme}"
+            if python_name not in self.context.globals:
+                self.context.globals.append(python_name)
+            return python_name
+
+        binding = Binding(self._unique(name.lexeme), self.context)
+        self.scopes[-1][name.lexeme] = binding
+        return binding.name
+
+    def _evaluate(self, expr: Expr) -> ast.expr:
+        return expr.accept(self)
+
+    def _execute(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def _function(
+        self, stmt: Function, this: Optional[str] = None, is_initializer=False
+    ) -> str:
+        """
+        Emit the Python function for a Lox function or method, and return its name.
+        Methods get the instance as first argument, named `this`.
+        """
+        enclosing = self.context
+        self.context = FunctionContext(enclosing, this if is_initializer else None)
+        self.scopes.append({})
+
+        params = [self._declare(param) for param in stmt.params]
+        for statement in stmt.body:
+            self._execute(statement)
+        if is_initializer:
+            self._emit(ast.Return(value=self._load(this)))  # type: ignore
+
+        self.scopes.pop()
+        context, self.context = self.context, enclosing
+
+        name = self._unique(stmt.name.lexeme, prefix="f")
+        self._emit(self._function_def(name, ([this] if this else []) + params, context))
+        return name
+
+    def _new_function(
+        self, name: Token, function: str, arity: int, is_initializer=False
+    ) -> ast.Call:
+        return self._helper(
+            "rt_Function",
+            ast.Constant(value=name.lexeme),
+            ast.Constant(value=arity),
+            self._load(function),
+            ast.Constant(value=is_initializer),
+        )
+
+    # Expressions
+
+    def visit_assign_expr(self, expr: Assign) -> ast.expr:
+        value = self._evaluate(expr.value)
+        binding = self._binding(expr.name.lexeme)
+        if binding is None:
+            return self._helper(
+                "rt_set_global",
+                ast.Constant(value=f"g_{expr.name.lexeme}"),
+                value,
+                ast.Constant(value=expr.name.line),
+            )
+
+        if binding.owner is not self.context and binding.name not in (
+            self.context.nonlocals
+        ):
+            self.context.nonlocals.append(binding.name)
+        return ast.NamedExpr(target=self._store(binding.name), value=value)
+
+    def visit_binary_expr(self, expr: Binary) -> ast.expr:
+        left = self._evaluate(expr.left)
+        right = self._evaluate(expr.right)
+        token_type = expr.operator.token_type
+        line = ast.Constant(value=expr.operator.line)
+
+        if token_type in _EQUALITY:
+            return ast.Compare(
+                left=left, ops=[_EQUALITY[token_type]], comparators=[right]
+            )
+
+        # Both operands are always evaluated, so check them with `&` instead of `and`
+        left_name, right_name = self._temp(), self._temp()
+        is_float = ast.BinOp(
+            left=self._is_float(left_name, left),
+            op=ast.BitAnd(),
+            right=self._is_float(right_name, right),
+        )
+
+        fast: ast.expr
+        if token_type in _COMPARISON:
+            operator, helper = _COMPARISON[token_type]
+            fast = ast.Compare(
+                left=self._load(left_name),
+                ops=[operator],
+                comparators=[self._load(right_name)],
+            )
+        else:
+            binary_operator, helper = _ARITHMETIC[token_type]
+            fast = ast.BinOp(
+                left=self._load(left_name),
+                op=binary_operator,
+                right=self._load(right_name),
+            )
+
+        slow = self._helper(helper, self._load(left_name), self._load(right_name), line)
+        return self._located(
+            ast.IfExp(test=is_float, body=fast, orelse=slow), expr.operator.line
+        )
+
+    def visit_call_expr(self, expr: Call) -> ast.expr:
+        if type(expr.callee) is Get:
+            return self._invoke(expr, expr.callee)
+
+        callee_name = self._temp()
+        callee = self._evaluate(expr.callee)
+        arguments = [self._evaluate(argument) for argument in expr.arguments]
+
+        # A function with the right number of arguments is called directly
+        is_function = ast.BoolOp(
+            op=ast.And(),
+            values=[
+                ast.Compare(
+                    left=self._helper(
+                        "type",
+                        ast.NamedExpr(target=self._store(callee_name), value=callee),
+                    ),
+                    ops=[ast.Is()],
+                    comparators=[self._load("rt_Function")],
+                ),
+                ast.Compare(
+                    left=ast.Attribute(
+                        value=self._load(callee_name), attr="arity", ctx=ast.Load()
+                    ),
+                    ops=[ast.Eq()],
+                    comparators=[ast.Constant(value=len(arguments))],
+                ),
+            ],
+        )
+        fast = ast.Attribute(
+            value=self._load(callee_name), attr="function", ctx=ast.Load()
+        )
+        slow = self._helper(
+            "rt_caller", self._load(callee_name), ast.Constant(value=expr.paren.line)
+        )
+        # The arguments are emitted once, after choosing what they're passed to.
+        # In both branches they'd double the code for every call nested in them.
+        function = ast.IfExp(test=is_function, body=fast, orelse=slow)
+        return self._located(
+            ast.Call(func=function, args=arguments, keywords=[]), expr.paren.line
+        )
+
+    def _invoke(self, expr: Call, callee: Get) -> ast.expr:
+        """
+        Call a property, like `object.method()`. A method is called with the
+        instance as its first argument, without creating a bound method first.
+        """
+        obj_name = self._temp()
+        method_name = self._temp()
+        arguments = [self._evaluate(argument) for argument in expr.arguments]
+
+        # The object is evaluated and the method looked up before the arguments
+        lookup = self._helper(
+            "rt_lookup",
+            ast.NamedExpr(
+                target=self._store(obj_name), value=self._evaluate(callee.obj)
+            ),
+            ast.Constant(value=callee.name.lexeme),
+            ast.Constant(value=callee.name.line),
+        )
+        is_method = ast.BoolOp(
+            op=ast.And(),
+            values=[
+                ast.Compare(
+                    left=self._helper(
+                        "type",
+                        ast.NamedExpr(target=self._store(method_name), value=lookup),
+                    ),
+                    ops=[ast.Is()],
+                    comparators=[self._load("rt_Function")],
+                ),
+                ast.Compare(
+                    left=ast.Attribute(
+                        value=self._load(method_name), attr="arity", ctx=ast.Load()
+                    ),
+                    ops=[ast.Eq()],
+                    comparators=[ast.Constant(value=len(arguments))],
+                ),
+            ],
+        )
+        fast = ast.Attribute(
+            value=self._load(method_name), attr="function", ctx=ast.Load()
+        )
+        slow = self._helper(
+            "rt_invoker",
+            self._load(method_name),
+            ast.Constant(value=callee.name.lexeme),
+            ast.Constant(value=expr.paren.line),
+        )
+        method = ast.IfExp(test=is_method, body=fast, orelse=slow)
+        return self._located(
+            ast.Call(func=method, args=[self._load(obj_name), *arguments], keywords=[]),
+            expr.paren.line,
+        )
+
+    def visit_get_expr(self, expr: Get) -> ast.expr:
+        return self._helper(
+            "rt_get",
+            self._evaluate(expr.obj),
+            ast.Constant(value=expr.name.lexeme),
+            ast.Constant(value=expr.name.line),
+        )
+
+    def visit_grouping_expr(self, expr: Grouping) -> ast.expr:
+        return self._evaluate(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> ast.expr:
+        return ast.Constant(value=expr.value)
+
+    def visit_logical_expr(self, expr: Logical) -> ast.expr:
+        temp = self._temp()
+        left = self._evaluate(expr.left)
+        right = self._evaluate(expr.right)
+        truthy = ast.BoolOp(
+            op=ast.And(),
+            values=[
+                ast.Compare(
+                    left=ast.NamedExpr(target=self._store(temp), value=left),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Constant(value=None)],
+                ),
+                ast.Compare(
+                    left=self._load(temp),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Constant(value=False)],
+                ),
+            ],
+        )
+        if expr.operator.token_type == TokenType.OR:
+            return ast.IfExp(test=truthy, body=self._load(temp), orelse=right)
+        return ast.IfExp(test=truthy, body=right, orelse=self._load(temp))
+
+    def visit_set_expr(self, expr: Set) -> ast.expr:
+        fields = self._helper(
+            "rt_fields",
+            self._evaluate(expr.obj),
+            ast.Constant(value=expr.name.line),
+        )
+        return self._helper(
+            "rt_store",
+            fields,
+            ast.Constant(value=expr.name.lexeme),
+            self._evaluate(expr.value),
+        )
+
+    def visit_super_expr(self, expr: Super) -> ast.expr:
+        superclass: Binding = self._binding("super")  # type: ignore
+        this: Binding = self._binding("this")  # type: ignore
+        return self._helper(
+            "rt_get_super",
+            self._load(superclass.name),
+            self._load(this.name),
+            ast.Constant(value=expr.method.lexeme),
+            ast.Constant(value=expr.method.line),
+        )
+
+    def visit_this_expr(self, expr: This) -> ast.expr:
+        return self._load(self._binding("this").name)  # type: ignore
+
+    def visit_unary_expr(self, expr: Unary) -> ast.expr:
+        right = self._evaluate(expr.right)
+        temp = self._temp()
+
+        if expr.operator.token_type == TokenType.MINUS:
+            return self._located(
+                ast.IfExp(
+                    test=self._is_float(temp, right),
+                    body=ast.UnaryOp(op=ast.USub(), operand=self._load(temp)),
+                    orelse=self._helper(
+                        "rt_negate",
+                        self._load(temp),
+                        ast.Constant(value=expr.operator.line),
+                    ),
+                ),
+                expr.operator.line,
+            )
+
+        # `!right`, so `right is None or right is False`
+        return ast.BoolOp(
+            op=ast.Or(),
+            values=[
+                ast.Compare(
+                    left=ast.NamedExpr(target=self._store(temp), value=right),
+                    ops=[ast.Is()],
+                    comparators=[ast.Constant(value=None)],
+                ),
+                ast.Compare(
+                    left=self._load(temp),
+                    ops=[ast.Is()],
+                    comparators=[ast.Constant(value=False)],
+                ),
+            ],
+        )
+
+    def visit_variable_expr(self, expr: Variable) -> ast.expr:
+        binding = self._binding(expr.name.lexeme)
+        if binding is None:
+            # The line is used when the global turns out to be undefined
+            return self._located(self._load(f"g_{expr.name.lexeme}"), expr.name.line)
+        return self._load(binding.name)
+
+    # Statements
+
+    def visit_block_stmt(self, stmt: Block):
+        self.scopes.append({})
+        for statement in stmt.statements:
+            self._execute(statement)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt: Class):
+        superclass: Optional[str] = None
+        if stmt.superclass is not None:
+            superclass = self._unique("super")
+            self.line = stmt.superclass.name.line
+            self._emit(
+                self._assign(
+                    superclass,
+                    self._helper(
+                        "rt_superclass",
+                        self._evaluate(stmt.superclass),
+                        ast.Constant(value=self.line),
+                    ),
+                )
+            )
+
+        name = self._declare(stmt.name)
+        if superclass is not None:
+            self.scopes.append({"super": Binding(superclass, self.context)})
+        self.scopes.append({})
+
+        methods: Dict[str, ast.expr] = {}
+        for method in stmt.methods:
+            this = self._unique("this")
+            self.scopes[-1]["this"] = Binding(this, None)
+            is_initializer = method.name.lexeme == "init"
+            function = self._function(method, this, is_initializer)
+            methods[method.name.lexeme] = self._new_function(
+                method.name, function, len(method.params), is_initializer
+            )
+
+        self.scopes.pop()
+        if superclass is not None:
+            self.scopes.pop()
+
+        self.line = stmt.name.line
+        klass = self._helper(
+            "rt_Class",
+            ast.Constant(value=stmt.name.lexeme),
+            self._load(superclass) if superclass else ast.Constant(value=None),
+            ast.Dict(
+                keys=[ast.Constant(value=key) for key in methods],
+                values=list(methods.values()),
+            ),
+        )
+        self._emit(self._assign(name, klass))
+
+    def visit_expression_stmt(self, stmt: Expression):
+        self._emit(ast.Expr(value=self._evaluate(stmt.expression)))
+
+    def visit_function_stmt(self, stmt: Function):
+        self.line = stmt.name.line
+        name = self._declare(stmt.name)
+        function = self._function(stmt)
+        self.line = stmt.name.line
+        self._emit(
+            self._assign(
+                name, self._new_function(stmt.name, function, len(stmt.params))
+            )
+        )
+
+    def visit_if_stmt(self, stmt: If):
+        if type(stmt.else_branch) is If:
+            self._else_if_chain(stmt)
+            return
+
+        condition = self._condition(stmt.condition)
+        then_branch = self._statements([stmt.then_branch])
+        else_branch = []
+        if stmt.else_branch is not None:
+            else_branch = self._statements([stmt.else_branch])
+        self._emit(ast.If(test=condition, body=then_branch, orelse=else_branch))
+
+    def _else_if_chain(self, stmt: If):
+        """
+        Emit an `else if` chain as a flat list of `if` statements, nested `elif`s
+        are limited by how deep CPython can compile. A flag tells the later
+        branches that one already ran.
+        """
+        taken = self._temp()
+        self._emit(ast.Assign(targets=[self._store(taken)], value=ast.Constant(False)))
+        else_branch: Optional[Stmt] = stmt
+        while isinstance(else_branch, If):
+            condition = ast.BoolOp(
+                op=ast.And(),
+                values=[
+                    ast.UnaryOp(op=ast.Not(), operand=self._load(taken)),
+                    self._condition(else_branch.condition),
+                ],
+            )
+            body = self._statements([else_branch.then_branch])
+            body.insert(
+                0,
+                self._located(
+                    ast.Assign(targets=[self._store(taken)], value=ast.Constant(True))
+                ),
+            )
+            self._emit(ast.If(test=condition, body=body, orelse=[]))
+            else_branch = else_branch.else_branch
+
+        if else_branch is not None:
+            self._emit(
+                ast.If(
+                    test=ast.UnaryOp(op=ast.Not(), operand=self._load(taken)),
+                    body=self._statements([else_branch]),
+                    orelse=[],
+                )
+            )
+
+    def visit_print_stmt(self, stmt: Print):
+        self._emit(
+            ast.Expr(value=self._helper("rt_print", self._evaluate(stmt.expression)))
+        )
+
+    def visit_return_stmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if self.context.this is not None:
+            value: ast.expr = self._load(self.context.this)
+        elif stmt.value is not None:
+            value = self._evaluate(stmt.value)
+        else:
+            value = ast.Constant(value=None)
+        self._emit(ast.Return(value=value))
+
+    def visit_var_stmt(self, stmt: Var):
+        self.line = stmt.name.line
+        value: ast.expr = ast.Constant(value=None)
+        if stmt.initializer is not None:
+            value = self._evaluate(stmt.initializer)
+        self._emit(self._assign(self._declare(stmt.name), value))
+
+    def visit_while_stmt(self, stmt: While):
+        condition = self._condition(stmt.condition)
+        if not _declares_function(stmt.body):
+            self._emit(
+                ast.While(test=condition, body=self._statements([stmt.body]), orelse=[])
+            )
+            return
+
+        # Every iteration gets new variables, closures created in the body must not
+        # share them. Move the body into a function of its own, which is called for
+        # every iteration.
+        enclosing = self.context
+        self.context = FunctionContext(enclosing, enclosing.this)
+        self._execute(stmt.body)
+        returns = _returns(stmt.body)
+        if returns:
+            self._emit(ast.Return(value=self._load("rt_no_return")))
+        context, self.context = self.context, enclosing
+
+        name = self._unique("loop", prefix="f")
+        self._emit(self._function_def(name, [], context))
+        call = self._helper(name)
+        body: ast.stmt = ast.Expr(value=call)
+        if returns:
+            # Pass on the value of a return statement in the body
+            temp = self._temp()
+            body = ast.If(
+                test=ast.Compare(
+                    left=ast.NamedExpr(target=self._store(temp), value=call),
+                    ops=[ast.IsNot()],
+                    comparators=[self._load("rt_no_return")],
+                ),
+                body=[ast.Return(value=self._load(temp))],
+                orelse=[],
+            )
+        self._emit(ast.While(test=condition, body=[self._located(body)], orelse=[]))
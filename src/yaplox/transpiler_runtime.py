@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+from functools import partial
+from operator import ge, gt, le, lt, mul, sub, truediv
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from yaplox.clock import Clock
+from yaplox.interpreter import Interpreter
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.yaplox_callable import YaploxCallable
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+if TYPE_CHECKING:
+    from yaplox.backend import Backend
+
+# Returned by the function a loop body is moved into, when the body finished without
+# running into a `return` statement.
+NO_RETURN = object()
+
+
+class TranspiledFunction:
+    """
+    A Lox function. `function` is the generated Python function, methods take the
+    instance as their first argument.
+    """
+
+    __slots__ = ("name", "arity", "function", "is_initializer")
+
+    def __init__(self, name: str, arity: int, function: Callable, is_initializer: bool):
+        self.name = name
+        self.arity = arity
+        self.function = function
+        self.is_initializer = is_initializer
+
+    def __str__(self):
+        return f"<fn {self.name}>"
+
+
+class TranspiledBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: TranspiledInstance, method: TranspiledFunction):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
+
+
+class TranspiledClass:
+    """
+    A Lox class. The methods of the superclass are copied in when the class is
+    created, a class can't change afterwards.
+    """
+
+    __slots__ = ("name", "methods", "initializer")
+
+    def __init__(
+        self,
+        name: str,
+        superclass: Optional[TranspiledClass],
+        methods: Dict[str, TranspiledFunction],
+    ):
+        self.name = name
+        self.methods: Dict[str, TranspiledFunction] = {}
+        if superclass is not None:
+            self.methods.update(superclass.methods)
+        self.methods.update(methods)
+        self.initializer = self.methods.get("init")
+
+    def __repr__(self):
+        return self.name
+
+
+class TranspiledInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: TranspiledClass):
+        self.klass = klass
+        self.fields: Dict[str, Any] = {}
+
+    def __repr__(self):
+        return f"{self.klass.name} instance"
+
+
+def runtime_error(line: int, message: str) -> YaploxRuntimeError:
+    """ The generated code only knows line numbers, not the tokens """
+    return YaploxRuntimeError(Token(TokenType.EOF, "", None, line), message)
+
+
+def _check_arity(arity: int, arguments: List[Any], line: int):
+    if len(arguments) != arity:
+        raise runtime_error(
+            line, f"Expected {arity} arguments but got {len(arguments)}."
+        )
+
+
+def call(backend: Backend, callee: Any, arguments: List[Any], line: int) -> Any:
+    """
+    Call any Lox value. The generated code calls functions with the right number of
+    arguments directly, everything else ends up here.
+    """
+    if isinstance(callee, TranspiledFunction):
+        _check_arity(callee.arity, arguments, line)
+        return callee.function(*arguments)
+
+    if isinstance(callee, TranspiledBoundMethod):
+        _check_arity(callee.method.arity, arguments, line)
+        return callee.method.function(callee.receiver, *arguments)
+
+    if isinstance(callee, TranspiledClass):
+        instance = TranspiledInstance(callee)
+        initializer = callee.initializer
+        if initializer is None:
+            _check_arity(0, arguments, line)
+        else:
+            _check_arity(initializer.arity, arguments, line)
+            initializer.function(instance, *arguments)
+        return instance
+
+    if isinstance(callee, YaploxCallable):
+        _check_arity(callee.arity(), arguments, line)
+        return callee.call(backend, arguments)
+
+    raise runtime_error(line, "Can only call functions and classes.")
+
+
+def caller(backend: Backend, callee: Any, line: int) -> Callable[..., Any]:
+    """
+    What the generated code calls with the arguments, when it can't call `callee`
+    directly. The arguments are only emitted once, after the choice.
+    """
+    return lambda *arguments: call(backend, callee, list(arguments), line)
+
+
+def get_property(obj: Any, name: str, line: int) -> Any:
+    if not isinstance(obj, TranspiledInstance):
+        raise runtime_error(line, "Only instances have properties.")
+
+    try:
+        return obj.fields[name]
+    except KeyError:
+        pass
+
+    method = obj.klass.methods.get(name)
+    if method is None:
+        raise runtime_error(line, f"Undefined property '{name}'.")
+    return TranspiledBoundMethod(obj, method)
+
+
+def lookup(obj: Any, name: str, line: int) -> Optional[TranspiledFunction]:
+    """
+    The method `obj.name()` calls, or None when `name` is a field of `obj`. The
+    method is called by the generated code or `invoke`, without binding it.
+    """
+    if not isinstance(obj, TranspiledInstance):
+        raise runtime_error(line, "Only instances have properties.")
+
+    if name in obj.fields:
+        return None
+
+    method = obj.klass.methods.get(name)
+    if method is None:
+        raise runtime_error(line, f"Undefined property '{name}'.")
+    return method
+
+
+def invoke(
+    backend: Backend,
+    obj: TranspiledInstance,
+    method: Optional[TranspiledFunction],
+    arguments: List[Any],
+    name: str,
+    line: int,
+) -> Any:
+    """ Call the method or field `lookup` found, when the generated code can't """
+    if method is None:
+        return call(backend, obj.fields[name], arguments, line)
+
+    _check_arity(method.arity, arguments, line)
+    return method.function(obj, *arguments)
+
+
+def invoker(
+    backend: Backend, method: Optional[TranspiledFunction], name: str, line: int
+) -> Callable[..., Any]:
+    """ Like `caller`, for the method or field `lookup` found """
+    return lambda obj, *arguments: invoke(
+        backend, obj, method, list(arguments), name, line
+    )
+
+
+def fields(obj: Any, line: int) -> Dict[str, Any]:
+    """ The fields of `obj`, called before the value of a set expression is known """
+    if not isinstance(obj, TranspiledInstance):
+        raise runtime_error(line, "Only instances have fields.")
+    return obj.fields
+
+
+def store(fields: Dict[str, Any], name: str, value: Any) -> Any:
+    fields[name] = value
+    return value
+
+
+def get_super(
+    superclass: TranspiledClass, receiver: TranspiledInstance, name: str, line: int
+) -> TranspiledBoundMethod:
+    method = superclass.methods.get(name)
+    if method is None:
+        raise runtime_error(line, f"Undefined property '{name}'.")
+    return TranspiledBoundMethod(receiver, method)
+
+
+def check_superclass(superclass: Any, line: int) -> TranspiledClass:
+    if not isinstance(superclass, TranspiledClass):
+        raise runtime_error(line, "Superclass must be a class.")
+    return superclass
+
+
+def set_global(namespace: Dict[str, Any], name: str, value: Any, line: int) -> Any:
+    """ Assign to an existing global, `name` is the name in the generated code """
+    if name not in namespace:
+        raise runtime_error(line, f"Undefined variable '{name[2:]}'.")
+    namespace[name] = value
+    return value
+
+
+def add(left: Any, right: Any, line: int) -> Any:
+    if isinstance(left, (float, int)) and isinstance(right, (float, int)):
+        return left + right
+
+    if isinstance(left, str) and isinstance(right, str):
+        return left + right
+
+    raise runtime_error(line, "Operands must be two numbers or two strings")
+
+
+def _number_operation(operation: Callable[[float, float], Any]):
+    """ The slow path of an operator that only works on numbers """
+
+    def checked(left: Any, right: Any, line: int) -> Any:
+        if isinstance(left, (float, int)) and isinstance(right, (float, int)):
+            return operation(float(left), float(right))
+        raise runtime_error(line, "Operands must be numbers.")
+
+    return checked
+
+
+def negate(operand: Any, line: int) -> float:
+    if isinstance(operand, (float, int)):
+        return -float(operand)
+    raise runtime_error(line, f"{operand} must be a number.")
+
+
+def print_value(value: Any):
+    print(Interpreter._stringify(value))
+
+
+def namespace(backend: Backend) -> Dict[str, Any]:
+    """
+    Return the globals the generated code runs in. Lox globals are stored with a
+    `g_` prefix, so they can't collide with the `rt_` helpers.
+    """
+    globals_: Dict[str, Any] = {
+        "rt_Function": TranspiledFunction,
+        "rt_Class": TranspiledClass,
+        "rt_no_return": NO_RETURN,
+        "rt_caller": partial(caller, backend),
+        "rt_get": get_property,
+        "rt_lookup": lookup,
+        "rt_invoker": partial(invoker, backend),
+        "rt_fields": fields,
+        "rt_store": store,
+        "rt_get_super": get_super,
+        "rt_superclass": check_superclass,
+        "rt_add": add,
+        "rt_subtract": _number_operation(sub),
+        "rt_multiply": _number_operation(mul),
+        "rt_divide": _number_operation(truediv),
+        "rt_greater": _number_operation(gt),
+        "rt_greater_equal": _number_operation(ge),
+        "rt_less": _number_operation(lt),
+        "rt_less_equal": _number_operation(le),
+        "rt_negate": negate,
+        "rt_print": print_value,
+        "g_clock": Clock(),
+    }
+    globals_["rt_set_global"] = partial(set_global, globals_)
+    return globals_
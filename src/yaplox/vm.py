@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, List, Optional
+
+from yaplox.backend import Backend
+from yaplox.bytecode_compiler import BytecodeCompiler
+from yaplox.clock import Clock
+from yaplox.config import config
+from yaplox.interpreter import Interpreter
+from yaplox.op_code import OpCode
+from yaplox.stmt import Stmt
+from yaplox.token import Token
+from yaplox.token_type import TokenType
+from yaplox.vm_objects import (
+    VMBoundMethod,
+    VMClass,
+    VMClosure,
+    VMFunction,
+    VMInstance,
+    VMUpvalue,
+)
+from yaplox.yaplox_callable import YaploxCallable
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+# The dispatch loop compares every instruction against these plain ints. Reading a
+# module global is a lot cheaper than an attribute lookup on the OpCode enum.
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+GET_SUPER = OpCode.GET_SUPER.value
+EQUAL = OpCode.EQUAL.value
+NOT_EQUAL = OpCode.NOT_EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+LOOP = OpCode.LOOP.value
+CALL = OpCode.CALL.value
+INVOKE = OpCode.INVOKE.value
+SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+CLOSURE = OpCode.CLOSURE.value
+CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+RETURN = OpCode.RETURN.value
+CLASS = OpCode.CLASS.value
+INHERIT = OpCode.INHERIT.value
+METHOD = OpCode.METHOD.value
+
+NUMBER = (float, int)
+CALLS = frozenset((CALL, INVOKE, SUPER_INVOKE))
+NUMBER_OPERATORS = frozenset((GREATER, GREATER_EQUAL, LESS_EQUAL, MULTIPLY, DIVIDE))
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "slots")
+
+    def __init__(self, closure: VMClosure, slots: int):
+        self.closure = closure
+        self.ip = 0
+        # Index in the VM stack of the first slot of this frame
+        self.slots = slots
+
+
+class VM(Backend):
+    """
+    A stack based virtual machine that runs the bytecode of the BytecodeCompiler.
+
+    It follows clox: values live on a single stack, every call pushes a CallFrame
+    and closures reach the variables of enclosing functions through upvalues. A Lox
+    call doesn't nest a Python call, so recursion is only limited by `max_frames`.
+    """
+
+    def __init__(self, max_frames: Optional[int] = None):
+        """
+        `max_frames` is the number of nested calls before the VM reports a stack
+        overflow, the configuration is used when it's not given.
+        """
+        self.stack: List[Any] = []
+        self.frames: List[CallFrame] = []
+        self.max_frames: int = config.MAX_FRAMES if max_frames is None else max_frames
+        self.globals: Dict[str, Any] = {"clock": Clock()}
+        self.open_upvalues: Dict[int, VMUpvalue] = {}
+
+    def resolve(self, expr: Hashable, depth: int, slot: int):
+        """
+        The compiler resolves variables itself, the depths of the Resolver are not
+        needed.
+        """
+
+    def interpret(self, statements: List[Stmt], on_error=None) -> Any:
+        function = BytecodeCompiler().compile(statements)
+        closure = VMClosure(function, [])
+        self.stack.append(closure)
+        self._call(closure, 0)
+        try:
+            return self._run()
+        except YaploxRuntimeError as excp:
+            self._reset_stack()
+            on_error(excp)
+
+    def _reset_stack(self):
+        # Closures that survive the error must keep their values
+        self._close_upvalues(0)
+        self.stack.clear()
+        self.frames.clear()
+        self.open_upvalues.clear()
+
+    def _error(self, message: str) -> YaploxRuntimeError:
+        """ Create a runtime error for the instruction that is being executed """
+        frame = self.frames[-1]
+        line = frame.closure.function.chunk.lines[frame.ip - 1]
+        return YaploxRuntimeError(Token(TokenType.EOF, "", None, line), message)
+
+    def _call(self, closure: VMClosure, arg_count: int):
+        function = closure.function
+        if arg_count != function.arity:
+            raise self._error(
+                f"Expected {function.arity} arguments but got {arg_count}."
+            )
+
+        # The frame of the script isn't a call
+        if len(self.frames) > self.max_frames:
+            raise self._error("Stack overflow.")
+
+        self.frames.append(CallFrame(closure, len(self.stack) - arg_count - 1))
+
+    def _call_value(self, callee: Any, arg_count: int):
+        """
+        Call `callee`. Functions get a new frame that _run continues with, classes
+        and native functions are completed right away.
+        """
+        if isinstance(callee, VMClosure):
+            self._call(callee, arg_count)
+        elif isinstance(callee, VMBoundMethod):
+            self.stack[-arg_count - 1] = callee.receiver
+            self._call(callee.method, arg_count)
+        elif isinstance(callee, VMClass):
+            self.stack[-arg_count - 1] = VMInstance(callee)
+            initializer = callee.methods.get("init")
+            if initializer is not None:
+                self._call(initializer, arg_count)
+            elif arg_count != 0:
+                raise self._error(f"Expected 0 arguments but got {arg_count}.")
+        elif isinstance(callee, YaploxCallable):
+            if arg_count != callee.arity():
+                raise self._error(
+                    f"Expected {callee.arity()} arguments but got {arg_count}."
+                )
+            arguments = self.stack[len(self.stack) - arg_count :]
+            del self.stack[-arg_count - 1 :]
+            self.stack.append(callee.call(self, arguments))
+        else:
+            raise self._error("Can only call functions and classes.")
+
+    def _invoke(self, name: str, arg_count: int):
+        receiver = self.stack[-arg_count - 1]
+        if not isinstance(receiver, VMInstance):
+            raise self._error("Only instances have properties.")
+
+        if name in receiver.fields:
+            value = receiver.fields[name]
+            self.stack[-arg_count - 1] = value
+            self._call_value(value, arg_count)
+            return
+
+        self._invoke_from_class(receiver.klass, name, arg_count)
+
+    def _invoke_from_class(self, klass: VMClass, name: str, arg_count: int):
+        method = klass.methods.get(name)
+        if method is None:
+            raise self._error(f"Undefined property '{name}'.")
+        self._call(method, arg_count)
+
+    def _bind_method(self, klass: VMClass, name: str, receiver: Any):
+        method = klass.methods.get(name)
+        if method is None:
+            raise self._error(f"Undefined property '{name}'.")
+        return VMBoundMethod(receiver, method)
+
+    def _capture_upvalue(self, index: int) -> VMUpvalue:
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = VMUpvalue(self.stack, index)
+            self.open_upvalues[index] = upvalue
+        return upvalue
+
+    def _close_upvalues(self, last: int):
+        """ Close every open upvalue that points at stack slot `last` or above """
+        for index in [index for index in self.open_upvalues if index >= last]:
+            self.open_upvalues.pop(index).close()
+
+    def _run(self) -> Any:  # noqa: C901
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals_ = self.globals
+        stringify = Interpreter._stringify
+
+        frame = self.frames[-1]
+        closure = frame.closure
+        code = closure.function.chunk.code
+        constants = closure.function.chunk.constants
+        base = frame.slots
+        ip = frame.ip
+
+        while True:
+            instruction = code[ip]
+            ip += 1
+
+            if instruction == GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif instruction == CONSTANT:
+                push(constants[code[ip]])
+                ip += 1
+            elif instruction == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif instruction == POP:
+                pop()
+            elif instruction == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                try:
+                    push(globals_[name])
+                except KeyError:
+                    frame.ip = ip
+                    raise self._error(f"Undefined variable '{name}'.")
+            elif instruction == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif instruction == LESS:
+                b = pop()
+                a = stack[-1]
+                if isinstance(a, NUMBER) and isinstance(b, NUMBER):
+                    stack[-1] = a < b
+                else:
+                    frame.ip = ip
+                    raise self._error("Operands must be numbers.")
+            elif instruction == ADD:
+                b = pop()
+                a = stack[-1]
+                if isinstance(a, NUMBER) and isinstance(b, NUMBER):
+                    stack[-1] = a + b
+                elif isinstance(a, str) and isinstance(b, str):
+                    stack[-1] = a + b
+                else:
+                    frame.ip = ip
+                    raise self._error("Operands must be two numbers or two strings")
+            elif instruction == SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if isinstance(a, NUMBER) and isinstance(b, NUMBER):
+                    stack[-1] = a - b
+                else:
+                    frame.ip = ip
+                    raise self._error("Operands must be numbers.")
+            elif instruction == LOOP or instruction == JUMP:
+                ip = code[ip]
+            elif instruction == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                push(upvalue.values[upvalue.index])
+                ip += 1
+            elif instruction == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                upvalue.values[upvalue.index] = stack[-1]
+                ip += 1
+            elif instruction == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name not in globals_:
+                    frame.ip = ip
+                    raise self._error(f"Undefined variable '{name}'.")
+                globals_[name] = stack[-1]
+            elif instruction == GET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                frame.ip = ip
+                instance = stack[-1]
+                if not isinstance(instance, VMInstance):
+                    raise self._error("Only instances have properties.")
+                try:
+                    stack[-1] = instance.fields[name]
+                except KeyError:
+                    stack[-1] = self._bind_method(instance.klass, name, instance)
+            elif instruction == SET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                value = pop()
+                instance = stack[-1]
+                if not isinstance(instance, VMInstance):
+                    frame.ip = ip
+                    raise self._error("Only instances have fields.")
+                instance.fields[name] = value
+                stack[-1] = value
+            elif instruction in CALLS:
+                if instruction == CALL:
+                    arg_count = code[ip]
+                    ip += 1
+                    frame.ip = ip
+                    self._call_value(stack[-arg_count - 1], arg_count)
+                elif instruction == INVOKE:
+                    arg_count = code[ip + 1]
+                    frame.ip = ip = ip + 2
+                    self._invoke(constants[code[ip - 2]], arg_count)
+                else:
+                    arg_count = code[ip + 1]
+                    frame.ip = ip = ip + 2
+                    superclass = pop()
+                    self._invoke_from_class(
+                        superclass, constants[code[ip - 2]], arg_count
+                    )
+
+                # Continue with the frame that is on top now. For native functions
+                # and classes without an initializer this is still the same frame.
+                frame = self.frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                base = frame.slots
+                ip = frame.ip
+            elif instruction == RETURN:
+                result = pop()
+                self._close_upvalues(base)
+                self.frames.pop()
+                del stack[base:]
+                if not self.frames:
+                    return result
+
+                push(result)
+                frame = self.frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                base = frame.slots
+                ip = frame.ip
+            elif instruction == NIL:
+                push(None)
+            elif instruction == TRUE:
+                push(True)
+            elif instruction == FALSE:
+                push(False)
+            elif instruction == DEFINE_GLOBAL:
+                globals_[constants[code[ip]]] = pop()
+                ip += 1
+            elif instruction == EQUAL:
+                b = pop()
+                stack[-1] = stack[-1] == b
+            elif instruction == NOT_EQUAL:
+                b = pop()
+                stack[-1] = stack[-1] != b
+            elif instruction in NUMBER_OPERATORS:
+                b = pop()
+                a = stack[-1]
+                if not (isinstance(a, NUMBER) and isinstance(b, NUMBER)):
+                    frame.ip = ip
+                    raise self._error("Operands must be numbers.")
+                if instruction == GREATER:
+                    stack[-1] = a > b
+                elif instruction == GREATER_EQUAL:
+                    stack[-1] = a >= b
+                elif instruction == LESS_EQUAL:
+                    stack[-1] = a <= b
+                elif instruction == MULTIPLY:
+                    stack[-1] = a * b
+                else:
+                    stack[-1] = a / b
+            elif instruction == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif instruction == NEGATE:
+                value = stack[-1]
+                if not isinstance(value, NUMBER):
+                    frame.ip = ip
+                    raise self._error(f"{value} must be a number.")
+                stack[-1] = -value
+            elif instruction == PRINT:
+                print(stringify(pop()))
+            elif instruction == CLOSURE:
+                function: VMFunction = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for _ in range(function.upvalue_count):
+                    is_local = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if is_local:
+                        upvalues.append(self._capture_upvalue(base + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                push(VMClosure(function, upvalues))
+            elif instruction == CLOSE_UPVALUE:
+                self._close_upvalues(len(stack) - 1)
+                pop()
+            elif instruction == GET_SUPER:
+                name = constants[code[ip]]
+                ip += 1
+                frame.ip = ip
+                superclass = pop()
+                stack[-1] = self._bind_method(superclass, name, stack[-1])
+            elif instruction == CLASS:
+                push(VMClass(constants[code[ip]]))
+                ip += 1
+            elif instruction == INHERIT:
+                superclass = stack[-2]
+                if not isinstance(superclass, VMClass):
+                    frame.ip = ip
+                    raise self._error("Superclass must be a class.")
+                subclass: VMClass = pop()
+                subclass.methods.update(superclass.methods)
+            elif instruction == METHOD:
+                method = pop()
+                stack[-1].methods[constants[code[ip]]] = method
+                ip += 1
+            else:  # pragma: no cover
+                raise self._error(f"Unknown opcode {instruction}.")
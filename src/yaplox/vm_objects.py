@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from yaplox.chunk import Chunk
+
+
+class VMFunction:
+    """ A compiled function: its bytecode and what the VM needs to call it """
+
+    def __init__(self, name: Optional[str] = None, arity: int = 0):
+        self.name = name
+        self.arity = arity
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __str__(self):
+        if self.name is None:
+            return "<script>"
+        return f"<fn {self.name}>"
+
+
+class VMUpvalue:
+    """
+    A reference to a variable captured by a closure.
+
+    While the variable still lives on the VM stack, `values` is that stack and `index`
+    the slot of the variable. Closing the upvalue moves the value into a list of its
+    own, so reading and writing is `values[index]` in both cases.
+    """
+
+    __slots__ = ("values", "index")
+
+    def __init__(self, stack: List[Any], index: int):
+        self.values = stack
+        self.index = index
+
+    def close(self):
+        self.values = [self.values[self.index]]
+        self.index = 0
+
+
+class VMClosure:
+    __slots__ = ("function", "upvalues")
+
+    def __init__(self, function: VMFunction, upvalues: List[VMUpvalue]):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class VMClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.methods: Dict[str, VMClosure] = {}
+
+    def __repr__(self):
+        return self.name
+
+
+class VMInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: VMClass):
+        self.klass = klass
+        self.fields: Dict[str, Any] = {}
+
+    def __repr__(self):
+        return f"{self.klass.name} instance"
+
+
+class VMBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Any, method: VMClosure):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
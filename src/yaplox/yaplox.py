@@ -1,50 +1,183 @@
+import mmap
+import os
 import sys
+from typing import Dict, List, Optional, Type
 
 from structlog import get_logger
 
 from yaplox.__version__ import __version__
-from yaplox.config import config  # noqa: F401
+from yaplox.backend import Backend
+from yaplox.closure_compiler import ClosureCompiler
+from yaplox.config import config
 from yaplox.interpreter import Interpreter
+from yaplox.lazy_function import LazyFunction
+from yaplox.optimizer import Optimizer
 from yaplox.parser import Parser
+from yaplox.program_cache import ProgramCache
+from yaplox.regex_scanner import RegexScanner
 from yaplox.resolver import Resolver
-from yaplox.scanner import Scanner
+from yaplox.scanner import Scanner, Source
+from yaplox.stmt import Stmt
 from yaplox.token import Token
 from yaplox.token_type import TokenType
+from yaplox.transpiler import Transpiler
+from yaplox.vm import VM
 from yaplox.yaplox_runtime_error import YaploxRuntimeError
 
 logger = get_logger()
 
 
 class Yaplox:
-    def __init__(self):
+    backends: Dict[str, Type[Backend]] = {
+        "interpreter": Interpreter,
+        "closure": ClosureCompiler,
+        "vm": VM,
+        "python": Transpiler,
+    }
+    scanners: Dict[str, Type[Scanner]] = {
+        "classic": Scanner,
+        "regex": RegexScanner,
+    }
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        scanner: Optional[str] = None,
+        optimize: Optional[bool] = None,
+        lazy: Optional[bool] = None,
+        lazy_check: Optional[bool] = None,
+    ):
+        """
+        Create a new Yaplox runner. `backend` selects the execution engine,
+        `scanner` the scanner, `optimize` whether the Optimizer runs and `lazy`
+        whether function bodies are parsed when they're first called. With
+        `lazy_check` the bodies that weren't called are parsed at the end of a run,
+        to report their syntax errors. When they're not given the configuration is
+        used. The parsed statements of files are cached in `config.CACHE_DIR`, if
+        it is set.
+        """
         self.had_error: bool = False
         self.had_runtime_error: bool = False
-        self.interpreter: Interpreter = Interpreter()
 
-    def run(self, source: str):
-        logger.debug("Running line", source=source)
+        backend = backend or config.BACKEND
+        try:
+            self.interpreter: Backend = self.backends[backend]()
+        except KeyError:
+            raise ValueError(f"Unknown backend '{backend}'.")
 
-        scanner = Scanner(source, on_error=self.error)
-        tokens = scanner.scan_tokens()
+        scanner = scanner or config.SCANNER
+        try:
+            self.scanner: Type[Scanner] = self.scanners[scanner]
+        except KeyError:
+            raise ValueError(f"Unknown scanner '{scanner}'.")
 
-        for token in tokens:
-            logger.debug("Running token", token=token)
+        self.optimize: bool = config.OPTIMIZE if optimize is None else optimize
 
-        parser = Parser(tokens, on_token_error=self.token_error)
-        statements = parser.parse()
+        lazy = config.LAZY if lazy is None else lazy
+        # Backends that compile a function when it is declared need its body
+        self.lazy: bool = lazy and self.interpreter.lazy_functions
+        lazy_check = config.LAZY_CHECK if lazy_check is None else lazy_check
+        self.lazy_check: bool = self.lazy and lazy_check
+
+        self.cache: Optional[ProgramCache] = None
+        if config.CACHE_DIR:
+            self.cache = ProgramCache(config.CACHE_DIR, config.CACHE_CHECK, scanner)
+
+    def run(self, source: Source, file: Optional[str] = None):
+        """
+        Run `source`, which is the text of the program or a (memory mapped) file it
+        is read from. The parser takes the tokens while the scanner reads the file.
+        When the source is the contents of `file`, its statements are cached.
+        """
+        logger.debug("Running line", source=source)
+
+        statements = self._parse(source, file)
 
         if self.had_error:
             logger.debug("Error after parsing")
             return
 
+        resolved = self._resolve(statements)
+        if resolved is None:
+            return
+
+        self.interpreter.interpret(resolved, on_error=self.runtime_error)
+
+        if self.lazy_check:
+            self._check_bodies(statements)
+
+    def _parse(self, source: Source, file: Optional[str]) -> List[Stmt]:
+        """ Scan and parse `source`, unless the statements of `file` are cached """
+        if self.cache is not None and file is not None:
+            cached = self.cache.load(file, source, self.lazy)
+            if cached is not None:
+                logger.debug("Loaded from cache", file=file)
+                for statement in cached:
+                    if isinstance(statement, LazyFunction):
+                        statement.load = self._load_body
+                return cached
+
+        scanner = self.scanner(source, on_error=self.error)
+        parser = Parser(
+            scanner.iter_tokens(),
+            on_token_error=self.token_error,
+            load_body=self._load_body if self.lazy else None,
+        )
+        statements = parser.parse()
+
+        if self.cache is not None and file is not None and not self.had_error:
+            self.cache.store(file, source, self.lazy, statements)
+        return statements
+
+    def _resolve(self, statements: List[Stmt]) -> Optional[List[Stmt]]:
+        """
+        Resolve the parsed statements for the backend, after optimizing them.
+        Returns the statements to run, or None if there was an error.
+        """
+        if self.optimize:
+            # The Optimizer learns about the variables from the Resolver, which
+            # reports the errors in the statements as they were written.
+            optimizer = Optimizer(self.interpreter)
+            resolver = Resolver(interpreter=optimizer, on_error=self.token_error)
+            resolver.resolve(statements)
+            if self.had_error:
+                logger.debug("Error after resolving")
+                return None
+            statements = optimizer.optimize(statements)
+
         resolver = Resolver(interpreter=self.interpreter, on_error=self.token_error)
         resolver.resolve(statements)
         # Stop if there was a resolution error.
         if self.had_error:
             logger.debug("Error after resolving")
-            return
+            return None
+        return statements
 
-        self.interpreter.interpret(statements, on_error=self.runtime_error)
+    def _load_body(self, function: LazyFunction) -> List[Stmt]:
+        """
+        Parse and resolve the body of `function` when it is first called. Errors in
+        it are reported like those in the rest of the program, and stop the call.
+        """
+        parser = Parser(function.tokens, on_token_error=self.token_error)
+        function.body = parser.parse_body()
+        if self.had_error or self._resolve([function]) is None:
+            # The next call reports the errors again
+            del function.body
+            raise YaploxRuntimeError(
+                function.name, f"Function '{function.name.lexeme}' has errors."
+            )
+        # Only a body that has errors is parsed again
+        function.tokens = []
+        return function.body
+
+    def _check_bodies(self, statements: List[Stmt]):
+        """
+        Parse the bodies of the lazy functions in `statements` that weren't called,
+        which reports their syntax errors. They're still loaded when they're called.
+        """
+        for statement in statements:
+            if isinstance(statement, LazyFunction) and not statement.loaded:
+                Parser(statement.tokens, on_token_error=self.token_error).parse_body()
 
     def error(self, line: int, message: str):
         self.report(line, "", message)
@@ -68,18 +201,24 @@ class Yaplox:
         self.had_error = True
 
     @staticmethod
-    def _load_file(file: str) -> str:  # pragma: no cover
-        with open(file) as f:
-            content = f.readlines()
-            lines = "\n".join(content)
-            return lines
+    def _load_file(file: str) -> Source:  # pragma: no cover
+        """ Map `file` into memory, the scanner decodes it a piece at a time """
+        with open(file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # An empty file can't be mapped
+                return ""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
     def run_file(self, file: str):  # pragma: no cover
         """
         Run yaplox with `file` as filename for the source input
         """
-        lines = self._load_file(file)
-        self.run(lines)
+        source = self._load_file(file)
+        try:
+            self.run(source, file)
+        finally:
+            if isinstance(source, mmap.mmap):
+                source.close()
 
         # Indicate an error in the exit code
         if self.had_error:
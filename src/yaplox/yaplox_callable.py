@@ -3,15 +3,15 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Any, List
 
-# This is a hack to prevent circular imports; since Interpreter imports from this file,
+# This is a hack to prevent circular imports; since the backends import from this file,
 # we will only import it during the type_checking run from mypy
 if TYPE_CHECKING:
-    from yaplox.interpreter import Interpreter
+    from yaplox.backend import Backend
 
 
 class YaploxCallable(ABC):
     @abstractmethod
-    def call(self, interpreter: Interpreter, arguments: List[Any]):
+    def call(self, interpreter: Backend, arguments: List[Any]):
         raise NotImplementedError
 
     @abstractmethod
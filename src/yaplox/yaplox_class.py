@@ -2,30 +2,24 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from yaplox.shape import Shape
 from yaplox.yaplox_callable import YaploxCallable
 from yaplox.yaplox_function import YaploxFunction
 from yaplox.yaplox_instance import YaploxInstance
 
 if TYPE_CHECKING:
-    from yaplox.interpreter import Interpreter
+    from yaplox.backend import Backend
 
 
 class YaploxClass(YaploxCallable):
-    def call(self, interpreter: Interpreter, arguments: List[Any]):
+    def call(self, interpreter: Backend, arguments: List[Any]):
         instance = YaploxInstance(klass=self)
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance=instance).call(
-                interpreter=interpreter, arguments=arguments
-            )
+        if self.initializer is not None:
+            self.initializer.invoke(interpreter, instance, arguments)
         return instance
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer is not None:
-            return initializer.arity()
-        else:
-            return 0
+        return self._arity
 
     def __init__(
         self,
@@ -35,18 +29,20 @@ class YaploxClass(YaploxCallable):
     ):
         self.name = name
         self.superclass = superclass
-        self.methods = methods
+        # Classes can't change once they are created, so the inherited methods are
+        # copied in, and finding a method takes one lookup at any depth.
+        self.methods: Dict[str, YaploxFunction] = {}
+        if superclass is not None:
+            self.methods.update(superclass.methods)
+        self.methods.update(methods)
+        # Every call of the class needs the initializer, so it is looked up once
+        self.initializer = self.methods.get("init")
+        self._arity = 0 if self.initializer is None else self.initializer.arity()
+        # The Shape of new instances
+        self.shape = Shape()
 
     def __repr__(self):
         return self.name
 
     def find_method(self, name: str) -> Optional[YaploxFunction]:
-        try:
-            return self.methods[name]
-        except KeyError:
-            pass
-
-        if self.superclass:
-            return self.superclass.find_method(name)
-
-        return None
+        return self.methods.get(name)
@@ -1,45 +1,81 @@
 from __future__ import annotations
 
+from typing import Any, List, Optional
+
+from yaplox.cell import Cell
 from yaplox.environment import Environment
+from yaplox.return_value import TailCall
 from yaplox.stmt import Function
 from yaplox.yaplox_callable import YaploxCallable
 from yaplox.yaplox_instance import YaploxInstance
-from yaplox.yaplox_return_exception import YaploxReturnException
 
 
 class YaploxFunction(YaploxCallable):
+    """
+    A Lox function. Instead of the whole environment it was declared in, it only
+    keeps the Cells of the variables it captured.
+    """
+
     def __init__(
         self,
         declaration: Function,
-        closure: Environment,
+        upvalues: List[Cell],
         is_initializer: bool,
+        receiver: Optional[YaploxInstance] = None,
     ):
         super().__init__()
-        self.closure = closure
+        self.upvalues = upvalues
         self.declaration = declaration
         self.is_initializer = is_initializer
+        self.receiver = receiver
 
     def bind(self, instance: YaploxInstance) -> YaploxFunction:
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return YaploxFunction(self.declaration, environment, self.is_initializer)
-
-    def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
-
-        for declared_token, argument in zip(self.declaration.params, arguments):
-            environment.define(declared_token.lexeme, argument)
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except YaploxReturnException as yaplox_return:
-            if self.is_initializer:
-                # When we're in init(), return this as an early return
-                return self.closure.get_at(0, "this")
-            return yaplox_return.value
-
-        if self.is_initializer:
-            # When init() is called directly on a class
-            return self.closure.get_at(0, "this")
+        return YaploxFunction(
+            self.declaration, self.upvalues, self.is_initializer, receiver=instance
+        )
+
+    def call(self, interpreter, arguments: List[Any]):
+        return self.invoke(interpreter, self.receiver, arguments)
+
+    def invoke(
+        self,
+        interpreter,
+        receiver: Optional[YaploxInstance],
+        arguments: List[Any],
+    ):
+        """
+        Call the function as a method of `receiver`, without binding it first. When
+        the body ends in a tail call, the called function runs next in this loop.
+        """
+        function = self
+        while True:
+            declaration = function.declaration
+            # A lazy body is loaded first, that resolves which variables are captured
+            body = declaration.body
+            environment = Environment(upvalues=function.upvalues)
+
+            if receiver is not None:
+                # `this` is the first variable of a method
+                environment.define(
+                    "this", interpreter.box_captured(declaration, receiver)
+                )
+            for declared_token, argument in zip(declaration.params, arguments):
+                environment.define(
+                    declared_token.lexeme,
+                    interpreter.box_captured(declared_token, argument),
+                )
+            completion = interpreter.execute_block(body, environment)
+
+            if function.is_initializer:
+                # An init() always returns this, also after an early return
+                return receiver
+            if completion is None:
+                return None
+            if type(completion) is not TailCall:
+                return completion.value
+            function = completion.function
+            receiver = completion.receiver
+            arguments = completion.arguments
 
     def arity(self) -> int:
         return len(self.declaration.params)
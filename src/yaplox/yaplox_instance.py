@@ -1,33 +1,61 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, List, Tuple, Union
 
 from yaplox.token import Token
 from yaplox.yaplox_runtime_error import YaploxRuntimeError
 
 if TYPE_CHECKING:
+    from yaplox.shape import Shape
     from yaplox.yaplox_class import YaploxClass
+    from yaplox.yaplox_function import YaploxFunction
 
 
 class YaploxInstance:
+    """
+    An instance of a Lox class. The values of the fields are kept in a list, the
+    Shape of the instance knows which field is in which slot.
+    """
+
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass: YaploxClass):
         self.klass = klass
-        self.fields: Dict[str, Any] = {}
+        self.shape: Shape = klass.shape
+        self.values: List[Any] = []
 
     def __repr__(self) -> str:
         return f"{self.klass.name} instance"
 
-    def get(self, name: Token) -> Any:
-        try:
-            return self.fields[name.lexeme]
-        except KeyError:
-            pass
+    def lookup(self, name: Token) -> Union[int, YaploxFunction]:
+        """ Find a property: the slot of a field, or else the method """
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return slot
 
         method = self.klass.find_method(name.lexeme)
         if method is not None:
-            return method.bind(self)
+            return method
 
         raise YaploxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
 
+    def get(self, name: Token) -> Any:
+        found = self.lookup(name)
+        if isinstance(found, int):
+            return self.values[found]
+        return found.bind(self)
+
+    def transition(self, name: str) -> Tuple[int, Shape]:
+        """ The slot of the field `name`, and the Shape once the field is set """
+        slot = self.shape.slots.get(name)
+        if slot is not None:
+            return slot, self.shape
+        return len(self.values), self.shape.with_field(name)
+
     def set(self, name: Token, value: Any):
-        self.fields[name.lexeme] = value
+        slot, shape = self.transition(name.lexeme)
+        if shape is self.shape:
+            self.values[slot] = value
+        else:
+            self.values.append(value)
+            self.shape = shape
@@ -45,10 +45,10 @@ def create_token_factory():
 
 @pytest.fixture
 def run_code_lines(capsys):
-    def code_lines(lines: List[str]) -> capsys:
+    def code_lines(lines: List[str], backend: Optional[str] = None) -> capsys:
 
         lines = "\n".join(lines)
-        Yaplox().run(lines)
+        Yaplox(backend=backend).run(lines)
         captured = capsys.readouterr()
 
         return captured
@@ -58,9 +58,9 @@ def run_code_lines(capsys):
 
 @pytest.fixture
 def run_code_block(capsys):
-    def code_block(block: str) -> capsys:
+    def code_block(block: str, backend: Optional[str] = None) -> capsys:
 
-        Yaplox().run(block)
+        Yaplox(backend=backend).run(block)
         captured = capsys.readouterr()
 
         return captured
@@ -0,0 +1,74 @@
+from yaplox.bytecode_compiler import BytecodeCompiler
+from yaplox.chunk import Chunk
+from yaplox.op_code import OpCode
+from yaplox.parser import Parser
+from yaplox.scanner import Scanner
+
+
+class TestChunk:
+    def test_write(self):
+        chunk = Chunk()
+
+        assert chunk.write(OpCode.NIL, 3) == 0
+        assert chunk.write(OpCode.RETURN, 4) == 1
+        assert chunk.code == [OpCode.NIL, OpCode.RETURN]
+        assert chunk.lines == [3, 4]
+
+    def test_add_constant(self):
+        chunk = Chunk()
+
+        assert chunk.add_constant("name") == 0
+        assert chunk.add_constant(1.0) == 1
+        # Strings and numbers are only stored once
+        assert chunk.add_constant("name") == 0
+        assert chunk.add_constant(1.0) == 1
+        # But other values are always added
+        assert chunk.add_constant(True) == 2
+        assert chunk.constants == ["name", 1.0, True]
+
+    def test_negative_zero_constant(self):
+        chunk = Chunk()
+
+        assert chunk.add_constant(-0.0) == 0
+        assert chunk.add_constant(0.0) == 1
+
+    def test_print_negative_zero(self, run_code_block):
+        assert run_code_block("print -0;\nprint 0;", backend="vm").out == "-0\n0\n"
+
+    def test_disassemble(self, mocker):
+        source = """
+        var a = 1;
+        {
+          var b = a + 2;
+          fun f() {
+            return b;
+          }
+          print f();
+        }
+        """
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        function = BytecodeCompiler().compile(statements)
+
+        assert function.chunk.disassemble() == [
+            "0000    2 CONSTANT 0 '1.0'",
+            "0002    2 DEFINE_GLOBAL 1 'a'",
+            "0004    4 GET_GLOBAL 1 'a'",
+            "0006    4 CONSTANT 2 '2.0'",
+            "0008    4 ADD",
+            "0009    5 CLOSURE 3 1 1 '<fn f>'",
+            "0013    8 GET_LOCAL 2",
+            "0015    8 CALL 0",
+            "0017    8 PRINT",
+            "0018    8 POP",
+            "0019    8 CLOSE_UPVALUE",
+            "0020    8 NIL",
+            "0021    8 RETURN",
+        ]
+        inner = function.chunk.constants[3]
+        assert inner.chunk.disassemble() == [
+            "0000    6 GET_UPVALUE 0",
+            "0002    6 RETURN",
+            "0003    6 NIL",
+            "0004    6 RETURN",
+        ]
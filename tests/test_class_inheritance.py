@@ -1,3 +1,6 @@
+from yaplox.yaplox_class import YaploxClass
+
+
 class TestClassesInheretance:
     def test_class_circular(self, run_code_block):
         line = "class Oops < Oops {}"
@@ -116,3 +119,36 @@ class TestClassesInheretance:
             == "[line 1] Error  at 'super' : Can't use 'super' outside of a class.\n"
         )
         assert captured.out == ""
+
+    def test_deep_inheritance(self, run_code_block):
+        lines = """
+        class A {
+          name() { return "A"; }
+          greet() { return "Hello from " + this.name(); }
+        }
+        class B < A {}
+        class C < B {
+          name() { return "C, not " + super.name(); }
+        }
+        class D < C {}
+        class E < D {}
+        print E().greet();
+        print B().greet();
+        """
+        assert run_code_block(lines).out == "Hello from C, not A\nHello from A\n"
+
+    def test_flattened_methods(self, mocker):
+        inherited = mocker.MagicMock()
+        overridden = mocker.MagicMock()
+        override = mocker.MagicMock()
+        base = YaploxClass(
+            "Base", superclass=None, methods={"a": inherited, "b": overridden}
+        )
+        middle = YaploxClass("Middle", superclass=base, methods={})
+
+        leaf = YaploxClass("Leaf", superclass=middle, methods={"b": override})
+
+        assert leaf.methods == {"a": inherited, "b": override}
+        assert leaf.find_method("b") is override
+        assert base.find_method("b") is overridden
+        assert leaf.find_method("c") is None
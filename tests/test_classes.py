@@ -1,3 +1,9 @@
+import pytest
+
+from yaplox.yaplox_class import YaploxClass
+from yaplox.yaplox_function import YaploxFunction
+
+
 class TestClasses:
     def test_class(self, run_code_block):
         lines = """
@@ -219,3 +225,159 @@ class TestClasses:
         """
         assert run_code_block(lines).err == ""
         assert run_code_block(lines).out == "Foo instance\n"
+
+    def test_closure_captures_this(self, run_code_block):
+        lines = """
+        class Counter {
+          init() {
+            this.count = 0;
+          }
+          incrementer() {
+            fun increment() {
+              this.count = this.count + 1;
+              return this.count;
+            }
+            return increment;
+          }
+        }
+        var increment = Counter().incrementer();
+        increment();
+        print increment();
+        """
+        assert run_code_block(lines).out == "2\n"
+
+    def test_field_shadows_method(self, run_code_block):
+        lines = """
+        class A {
+          name() {
+            return "method";
+          }
+        }
+        fun show(a) {
+          print a.name;
+        }
+        var a = A();
+        show(a);
+        a.name = "field";
+        show(a);
+        """
+        assert run_code_block(lines).out == "<fn name>\nfield\n"
+
+    def test_invoke_without_binding(self, run_code_block, mocker):
+        bind = mocker.spy(YaploxFunction, "bind")
+        lines = """
+        class A {
+          init(value) {
+            this.value = value;
+          }
+          get() {
+            return this.value;
+          }
+        }
+        var a = A(1);
+        print a.get();
+        var get = a.get;
+        print get();
+        """
+        assert run_code_block(lines, backend="interpreter").out == "1\n1\n"
+        # Only `a.get` used as a value creates a bound method
+        assert bind.call_count == 1
+
+    def test_invoke_field(self, run_code_block):
+        lines = """
+        fun double(x) {
+          return x * 2;
+        }
+        class A {
+          double(x) {
+            return x;
+          }
+        }
+        var a = A();
+        a.double = double;
+        print a.double(21);
+        a.double = nil;
+        a.double(1);
+        """
+        captured = run_code_block(lines)
+        assert captured.out == "42\n"
+        assert captured.err == "Can only call functions and classes. in line [line14]\n"
+
+    def test_invoke_errors(self, run_code_block):
+        lines = """
+        class A {
+          method(a) {}
+        }
+        A().method(1, 2);
+        """
+        assert (
+            run_code_block(lines).err
+            == "Expected 1 arguments but got 2. in line [line5]\n"
+        )
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "python"])
+    def test_invoke_looks_up_method_first(self, run_code_block, backend):
+        # Unlike the VM, the tree walkers look up the method before the arguments
+        lines = """
+        fun argument() {
+          print "argument";
+        }
+        class A {}
+        A().nope(argument());
+        """
+        captured = run_code_block(lines, backend=backend)
+        assert captured.out == ""
+        assert captured.err == "Undefined property 'nope'. in line [line6]\n"
+
+    def test_initializer_looked_up_once(self, run_code_block, mocker):
+        find_method = mocker.spy(YaploxClass, "find_method")
+        lines = """
+        class Node {
+          init(left, right) {
+            this.left = left;
+            this.right = right;
+          }
+        }
+        var tree = Node(Node(nil, nil), Node(nil, nil));
+        print tree.left.right;
+        """
+        assert run_code_block(lines).out == "nil\n"
+        assert find_method.call_count == 0
+
+    def test_constructor_arity(self, run_code_block):
+        lines = """
+        class A {
+          init(a, b) {}
+        }
+        A(1);
+        """
+        assert (
+            run_code_block(lines).err
+            == "Expected 2 arguments but got 1. in line [line5]\n"
+        )
+
+        lines = """
+        class A {}
+        A(1);
+        """
+        assert (
+            run_code_block(lines).err
+            == "Expected 0 arguments but got 1. in line [line3]\n"
+        )
+
+    def test_initializer_captures_this(self, run_code_block):
+        lines = """
+        class Counter {
+          init(start) {
+            this.count = start;
+            fun increment() {
+              this.count = this.count + 1;
+            }
+            this.increment = increment;
+          }
+        }
+        var counter = Counter(41);
+        counter.increment();
+        print counter.count;
+        """
+        assert run_code_block(lines).out == "42\n"
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from yaplox.closure_compiler import ClosureCompiler
+from yaplox.parser import Parser
+from yaplox.scanner import Scanner
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+class TestClosureCompiler:
+    @pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: path.stem)
+    def test_same_output_as_interpreter(self, run_code_block, program):
+        source = program.read_text()
+
+        expected = run_code_block(source, backend="interpreter")
+        captured = run_code_block(source, backend="closure")
+
+        assert captured.out == expected.out
+        assert captured.err == expected.err
+
+    def test_selected_backend(self):
+        assert isinstance(Yaplox(backend="closure").interpreter, ClosureCompiler)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError) as excinfo:
+            Yaplox(backend="quantum")
+
+        assert "Unknown backend 'quantum'." in str(excinfo.value)
+
+    def test_interpret_returns_last_value(self, mocker):
+        tokens = Scanner("var a = 3; a * 6 / 2;").scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+
+        result = ClosureCompiler().interpret(statements)
+
+        assert result == 9
+
+    def test_runtime_error(self, run_code_block):
+        code = """
+        var a = "Foo";
+        print -a;
+        """
+        captured = run_code_block(code, backend="closure")
+
+        assert captured.out == ""
+        assert captured.err == "Foo must be a number. in line [line3]\n"
+
+    def test_assign_local(self, run_code_block):
+        code = """
+        {
+          var a = 1;
+          a = a + 1;
+          print a;
+        }
+        """
+
+        assert run_code_block(code, backend="closure").out == "2\n"
+        assert run_code_block(code, backend="interpreter").out == "2\n"
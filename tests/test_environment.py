@@ -1,94 +1,54 @@
 import pytest
 
 from yaplox.environment import Environment
-from yaplox.token_type import TokenType
-from yaplox.yaplox_runtime_error import YaploxRuntimeError
+from yaplox.global_environment import GlobalEnvironment
 
 
 class TestEnvironment:
-    def test_environment(self, create_token_factory):
+    def test_environment(self):
         env = Environment()
-        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
-        bar_token = create_token_factory(token_type=TokenType.VAR, lexeme="Bar")
 
+        # Variables get a slot in the order they are defined
         env.define("Foo", "Bar")
+        env.define("Baz", "Qux")
 
-        assert env.get(foo_token) == "Bar"
+        assert env.get_at(0, 0) == "Bar"
+        assert env.get_at(0, 1) == "Qux"
 
-        # This token isn't present
-        with pytest.raises(YaploxRuntimeError):
-            env.get(bar_token)
+        env.assign_at(0, 1, "New_value")
 
-        # Test assign
-        # Assign a new value to an existing key
-        env.assign(foo_token, "New_value")
-
-        assert env.get(foo_token) == "New_value"
-
-        # Assigning to a new value is not possible
-        with pytest.raises(YaploxRuntimeError):
-            env.assign(bar_token, "Foo")
+        assert env.get_at(0, 1) == "New_value"
+        assert env.values == ["Bar", "New_value"]
 
     @pytest.mark.parametrize("falsy_values", [0.0, 0, False, None])
-    def test_falsy_values(self, create_token_factory, falsy_values):
-        # Set a key with the value 0.0.
-        # In python this is evaluated as false, but we want this value back!
+    def test_falsy_values(self, falsy_values):
         env = Environment()
-        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
 
         env.define("Foo", falsy_values)
 
         if isinstance(falsy_values, bool):
-            assert env.get(foo_token) is falsy_values
+            assert env.get_at(0, 0) is falsy_values
         else:
-            assert env.get(foo_token) == falsy_values
-
-    def test_environment_enclosure(self, create_token_factory):
-        global_env = Environment()
-        local_env = Environment(enclosing=global_env)
-
-        # Set a value to the global, that is available in local
-        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
-        global_env.define("Foo", "42")
-
-        # And retrieve it in the local env:
-        assert local_env.get(foo_token) == "42"
+            assert env.get_at(0, 0) == falsy_values
 
-        # Assign it a new value in the local env should also work:
-        local_env.assign(foo_token, "New value")
-
-        # And retrieve it in the local env:
-        assert global_env.get(foo_token) == "New value"
-        assert local_env.get(foo_token) == "New value"
-
-        # Override the value in the local env:
-        local_env.define("Foo", "Local variable")
-
-        # This must override the local env, but keep global env the same.
-        assert global_env.get(foo_token) == "New value"
-        assert local_env.get(foo_token) == "Local variable"
-
-    def test_environment_distance(self, create_token_factory):
+    def test_environment_distance(self):
         # Setup a few linked Environments
-        global_env = Environment()
+        global_env = GlobalEnvironment()
         local_1 = Environment(enclosing=global_env)
         local_2 = Environment(enclosing=local_1)
         local_3 = Environment(enclosing=local_2)
 
-        # Set some variables:
-        # Set a value to the global, that is available in local
-        create_token_factory(token_type=TokenType.VAR, lexeme="global_token")
-        global_env.define("global_token", "global_token")
-
-        # Set a variable on the 1st level:
-        create_token_factory(token_type=TokenType.VAR, lexeme="level_1")
         local_1.define("level_1", "level_1")
+        local_3.define("level_3", "level_3")
 
         # Get at a distance:
-        assert local_3.get_at(2, "level_1") == "level_1"
+        assert local_3.get_at(2, 0) == "level_1"
+        assert local_3.get_at(0, 0) == "level_3"
 
-        # It shouldn't be able to find this, level too shallow
-        assert local_3.get_at(1, "level_1") is None
+        # Assigning at a distance changes the enclosing environment
+        local_3.assign_at(2, 0, "New value")
+        assert local_1.get_at(0, 0) == "New value"
 
-        # And try to find a global var
-        assert local_3.get_at(3, "global_token") == "global_token"
+        # Variables in an enclosing environment don't take a slot in this one
+        with pytest.raises(IndexError):
+            local_2.get_at(0, 0)
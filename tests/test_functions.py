@@ -1,4 +1,7 @@
+import pytest
+
 from yaplox.yaplox import Yaplox
+from yaplox.yaplox_function import YaploxFunction
 
 
 class TestFunctions:
@@ -357,3 +360,178 @@ class TestFunctions:
 
         captured = capsys.readouterr()
         assert captured.out == "1\n2\n"
+
+    def test_closures_share_captured_variable(self, capsys):
+        """
+        Closures capture the variable itself, not its value. Here it is captured by
+        two functions, and by a function two levels down.
+        """
+        statement = [
+            "fun make(start) {",
+            "  var i = start;",
+            "  fun increment() {",
+            "    i = i + 1;",
+            "  }",
+            "  fun getter() {",
+            "    fun get() {",
+            "      return i;",
+            "    }",
+            "    return get;",
+            "  }",
+            "  increment();",
+            "  return getter;",
+            "}",
+            "",
+            "print make(10)()();",
+        ]
+        source = "\n".join(statement)
+        yaplox = Yaplox()
+        yaplox.run(source)
+
+        assert not yaplox.had_error
+        assert not yaplox.had_runtime_error
+
+        captured = capsys.readouterr()
+        assert captured.out == "11\n"
+
+    def test_return_from_loop(self, run_code_block):
+        code = """
+        fun first_over(limit) {
+          for (var i = 0; i < 100; i = i + 1) {
+            if (i * i > limit) {
+              return i;
+            }
+          }
+          print "not reached";
+        }
+        print first_over(50);
+        """
+
+        assert run_code_block(code).out == "8\n"
+
+    def test_operands_change_type(self, run_code_block):
+        code = """
+        fun add(a, b) {
+          return a + b;
+        }
+        print add(1, 2);
+        print add("a", "b");
+        print add(1, "b");
+        """
+        captured = run_code_block(code)
+
+        assert captured.out == "3\nab\n"
+        error = "Operands must be two numbers or two strings in line [line3]\n"
+        assert captured.err == error
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure"])
+    def test_tail_calls(self, run_code_block, backend):
+        code = """
+        fun count(n, total) {
+          if (n == 0) return total;
+          return count(n - 1, total + 1);
+        }
+        fun even(n) {
+          if (n == 0) return true;
+          return odd(n - 1);
+        }
+        fun odd(n) {
+          if (n == 0) return false;
+          return even(n - 1);
+        }
+        class Counter {
+          down(n) {
+            if (n == 0) return this;
+            return this.down(n - 1);
+          }
+        }
+        print count(20000, 0);
+        print even(20001);
+        print Counter().down(20000);
+        """
+
+        assert run_code_block(code, backend).out == "20000\nFalse\nCounter instance\n"
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure"])
+    def test_tail_call_other_callables(self, run_code_block, backend):
+        code = """
+        class Point {
+          init(x) {
+            this.x = x;
+          }
+        }
+        class Holder {
+          init(f) {
+            this.f = f;
+          }
+          call(x) {
+            return this.f(x);
+          }
+        }
+        fun make(x) {
+          return Point(x);
+        }
+        fun double(x) {
+          return x * 2;
+        }
+        fun time() {
+          return clock();
+        }
+        print make(3).x;
+        print Holder(double).call(4);
+        print time() > 0;
+        """
+
+        assert run_code_block(code, backend).out == "3\n8\nTrue\n"
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure"])
+    def test_tail_call_errors(self, run_code_block, backend):
+        code = """
+        fun f(a) {
+          return a;
+        }
+        fun g() {
+          return f(
+            1, 2);
+        }
+        g();
+        """
+
+        assert (
+            run_code_block(code, backend).err
+            == "Expected 1 arguments but got 2. in line [line7]\n"
+        )
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "vm", "python"])
+    def test_stack_overflow(self, run_code_block, backend):
+        code = """
+        fun sum(n) {
+          return n +
+            sum(n - 1);
+        }
+        print sum(1);
+        """
+
+        assert run_code_block(code, backend).err == "Stack overflow. in line [line4]\n"
+
+    def test_lox_function_called_directly(self, run_code_block, mocker):
+        call = mocker.spy(YaploxFunction, "call")
+        code = """
+        class A {
+          m(x) { print x; }
+        }
+        fun f(x) {
+          print x;
+        }
+        f(1);
+        var m = A().m;
+        m(2);
+        f(1, 2);
+        """
+
+        captured = run_code_block(code, "interpreter")
+
+        assert captured.out == "1\n2\n"
+        assert captured.err == "Expected 1 arguments but got 2. in line [line11]\n"
+        # Bound methods are called directly as well
+        call.assert_not_called()
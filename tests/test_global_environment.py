@@ -0,0 +1,86 @@
+import pytest
+
+from yaplox.global_environment import GlobalEnvironment
+from yaplox.token_type import TokenType
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+
+class TestGlobalEnvironment:
+    def test_environment(self, create_token_factory):
+        env = GlobalEnvironment()
+        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
+        bar_token = create_token_factory(token_type=TokenType.VAR, lexeme="Bar")
+
+        env.define("Foo", "Bar")
+
+        assert env.get(foo_token) == "Bar"
+
+        # This token isn't present
+        with pytest.raises(YaploxRuntimeError):
+            env.get(bar_token)
+
+        # Test assign
+        # Assign a new value to an existing key
+        env.assign(foo_token, "New_value")
+
+        assert env.get(foo_token) == "New_value"
+
+        # Assigning to a new value is not possible
+        with pytest.raises(YaploxRuntimeError):
+            env.assign(bar_token, "Foo")
+
+    @pytest.mark.parametrize("falsy_values", [0.0, 0, False, None])
+    def test_falsy_values(self, create_token_factory, falsy_values):
+        # Set a key with the value 0.0.
+        # In python this is evaluated as false, but we want this value back!
+        env = GlobalEnvironment()
+        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
+
+        env.define("Foo", falsy_values)
+
+        if isinstance(falsy_values, bool):
+            assert env.get(foo_token) is falsy_values
+        else:
+            assert env.get(foo_token) == falsy_values
+
+    def test_slots(self, create_token_factory):
+        env = GlobalEnvironment()
+        foo_token = create_token_factory(token_type=TokenType.VAR, lexeme="Foo")
+
+        # A global gets its slot when it is first used, before it is defined
+        slot = env.slot("Foo")
+        with pytest.raises(YaploxRuntimeError):
+            env.get_slot(slot, foo_token)
+
+        env.define("Foo", "Bar")
+        assert env.slot("Foo") == slot
+        assert env.get_slot(slot, foo_token) == "Bar"
+
+        env.assign_slot(slot, foo_token, "New_value")
+        assert env.get(foo_token) == "New_value"
+        assert env.slot("Bar") != slot
+
+    def test_used_before_defined(self, run_code_block):
+        lines = """
+        fun show() {
+          print later;
+        }
+        for (var i = 0; i < 2; i = i + 1) {
+          show();
+          var later = "local";
+        }
+        """
+        assert (
+            run_code_block(lines).err == "Undefined variable 'later'. in line [line3]\n"
+        )
+
+        lines = """
+        fun show() {
+          print later;
+        }
+        var later = "defined";
+        show();
+        later = "assigned";
+        show();
+        """
+        assert run_code_block(lines).out == "defined\nassigned\n"
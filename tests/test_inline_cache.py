@@ -0,0 +1,77 @@
+from yaplox.inline_cache import POLYMORPHIC_LIMIT, GetCache, SetCache
+from yaplox.token_type import TokenType
+from yaplox.yaplox_class import YaploxClass
+from yaplox.yaplox_instance import YaploxInstance
+
+
+class TestInlineCache:
+    def test_shape_is_shared(self, create_token_factory):
+        klass = YaploxClass("A", superclass=None, methods={})
+        x = create_token_factory(token_type=TokenType.IDENTIFIER, lexeme="x")
+        y = create_token_factory(token_type=TokenType.IDENTIFIER, lexeme="y")
+
+        first = YaploxInstance(klass)
+        second = YaploxInstance(klass)
+        other_order = YaploxInstance(klass)
+        for instance, names in (
+            (first, (x, y)),
+            (second, (x, y)),
+            (other_order, (y, x)),
+        ):
+            for value, name in enumerate(names):
+                instance.set(name, value)
+
+        assert first.shape is second.shape
+        assert first.shape is not other_order.shape
+        assert first.values == [0, 1]
+        assert first.shape.slots == {"x": 0, "y": 1}
+
+    def test_caches(self, create_token_factory):
+        klass = YaploxClass("A", superclass=None, methods={})
+        x = create_token_factory(token_type=TokenType.IDENTIFIER, lexeme="x")
+        get_cache = GetCache()
+        set_cache = SetCache()
+
+        instance = YaploxInstance(klass)
+        empty = instance.shape
+        assert set_cache.miss(instance, x) == (0, empty.with_field("x"))
+        instance.set(x, 1)
+
+        assert set_cache.miss(instance, x) == (0, instance.shape)
+        assert get_cache.miss(instance, x) == 0
+        assert set_cache == {
+            empty: (0, instance.shape),
+            instance.shape: (0, instance.shape),
+        }
+        assert get_cache == {instance.shape: 0}
+
+    def test_megamorphic(self, create_token_factory):
+        x = create_token_factory(token_type=TokenType.IDENTIFIER, lexeme="x")
+        cache = GetCache()
+
+        for value in range(POLYMORPHIC_LIMIT + 2):
+            instance = YaploxInstance(YaploxClass("A", superclass=None, methods={}))
+            instance.set(x, value)
+
+            assert cache.miss(instance, x) == 0
+
+        assert len(cache) == POLYMORPHIC_LIMIT
+
+    def test_polymorphic_site(self, run_code_block):
+        code = """
+        class A {}
+        class B {}
+        fun get(object) {
+          return object.value;
+        }
+        var a = A();
+        a.value = "a";
+        var b = B();
+        b.other = 1;
+        b.value = "b";
+        print get(a);
+        print get(b);
+        print get(a);
+        """
+
+        assert run_code_block(code).out == "a\nb\na\n"
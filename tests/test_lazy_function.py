@@ -0,0 +1,155 @@
+from pathlib import Path
+
+import pytest
+
+from yaplox.lazy_function import LazyFunction
+from yaplox.parser import Parser
+from yaplox.scanner import Scanner
+from yaplox.stmt import Class, Function, Print
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+class TestLazyFunction:
+    def test_body_is_skipped(self, mocker):
+        load = mocker.MagicMock(return_value=[])
+        code = """
+        fun f(a) {
+          if (a) { print a; }
+        }
+        class A { m() { print 1; } }
+        """
+        tokens = Scanner(code).scan_tokens()
+        function, klass = Parser(tokens, load_body=load).parse()
+
+        assert isinstance(function, LazyFunction)
+        assert not function.loaded
+        assert [token.lexeme for token in function.tokens] == (
+            ["if", "(", "a", ")", "{", "print", "a", ";", "}", "}", ""]
+        )
+        # Only top level functions are skipped
+        assert isinstance(klass, Class)
+        assert type(klass.methods[0]) is Function
+        load.assert_not_called()
+
+        assert function.body == []
+        load.assert_called_once_with(function)
+
+    def test_parse_body(self, mocker):
+        tokens = Scanner("fun f() { print 1; }").scan_tokens()
+        function = Parser(tokens, load_body=mocker.MagicMock()).parse()[0]
+
+        body = Parser(function.tokens).parse_body()
+
+        assert len(body) == 1
+        assert isinstance(body[0], Print)
+
+    def test_unbalanced_braces(self, mocker):
+        on_error = mocker.MagicMock()
+        tokens = Scanner("fun f() { if (true) { print 1; }").scan_tokens()
+
+        Parser(tokens, on_token_error=on_error, load_body=mocker.MagicMock()).parse()
+
+        on_error.assert_called_once()
+        assert on_error.call_args[0][1] == "Expect '}' after block."
+
+    @pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: path.stem)
+    def test_same_output_as_not_lazy(self, capsys, program):
+        source = program.read_text()
+
+        Yaplox(backend="interpreter", lazy=False).run(source)
+        expected = capsys.readouterr()
+        Yaplox(backend="interpreter", lazy=True).run(source)
+        captured = capsys.readouterr()
+
+        assert captured.out == expected.out
+        assert captured.err == expected.err
+
+    def test_loaded_once(self, capsys, mocker):
+        yaplox = Yaplox(backend="interpreter", lazy=True)
+        load = mocker.spy(yaplox, "_load_body")
+        yaplox.run("fun f(n) {\n  return n + 1;\n}\nprint f(1);\nprint f(f(2));")
+
+        assert capsys.readouterr().out == "2\n4\n"
+        load.assert_called_once()
+        function = next(iter(yaplox.interpreter.functions))
+        assert function.loaded
+        assert function.tokens == []
+
+    def test_errors_on_first_call(self, capsys):
+        yaplox = Yaplox(backend="interpreter", lazy=True)
+        yaplox.run('fun f() {\n  print this;\n}\nfun g() { var = ; }\nprint "a";\nf();')
+
+        captured = capsys.readouterr()
+        assert captured.out == "a\n"
+        assert captured.err == (
+            "[line 2] Error  at 'this' : Can't use 'this' outside of a class.\n"
+            "Function 'f' has errors. in line [line1]\n"
+        )
+        assert yaplox.had_error
+        assert yaplox.had_runtime_error
+        # Kept to report the errors again
+        assert all(function.tokens for function in yaplox.interpreter.functions)
+
+    @pytest.mark.parametrize("lazy_check", [False, True])
+    def test_check_bodies_not_called(self, capsys, lazy_check):
+        yaplox = Yaplox(backend="interpreter", lazy=True, lazy_check=lazy_check)
+        yaplox.run("fun f() { print 1; }\nfun g() {\n  var = 1;\n}\nf();")
+
+        captured = capsys.readouterr()
+        assert captured.out == "1\n"
+        if lazy_check:
+            # Reported after the program ran
+            assert captured.err == "[line 3] Error  at '=' : Expect variable name.\n"
+        else:
+            assert captured.err == ""
+        assert yaplox.had_error == lazy_check
+        f, g = yaplox.interpreter.functions
+        assert f.loaded
+        assert not g.loaded
+
+    def test_only_interpreter(self):
+        assert Yaplox(backend="interpreter", lazy=True).lazy
+        assert not Yaplox(backend="vm", lazy=True).lazy
+
+    def test_called_in_later_run(self, capsys):
+        yaplox = Yaplox(backend="interpreter", lazy=True)
+        yaplox.run("var a = 1;\nfun f() {\n  return a + 1;\n}")
+        yaplox.run("a = 10;\nprint f();")
+
+        assert capsys.readouterr().out == "11\n"
+
+    def test_captured_parameter(self, capsys):
+        yaplox = Yaplox(backend="interpreter", lazy=True)
+        yaplox.run(
+            """
+            fun makeAdder(n) {
+              fun add(x) { return x + n; }
+              return add;
+            }
+            print makeAdder(10)(5);
+            """
+        )
+
+        assert capsys.readouterr() == ("15\n", "")
+
+    def test_captured_this(self, capsys):
+        yaplox = Yaplox(backend="interpreter", lazy=True)
+        yaplox.run(
+            """
+            fun makeGetter(value) {
+              class Box {
+                init(value) { this.value = value; }
+                getter() {
+                  fun get() { return this.value; }
+                  return get;
+                }
+              }
+              return Box(value).getter();
+            }
+            print makeGetter("boxed")();
+            """
+        )
+
+        assert capsys.readouterr() == ("boxed\n", "")
@@ -0,0 +1,51 @@
+import pytest
+
+from yaplox.operators import specialize_binary, specialize_unary
+from yaplox.token_type import TokenType
+from yaplox.yaplox_runtime_error import YaploxRuntimeError
+
+
+class TestOperators:
+    def test_specialized_for_first_operands(self, create_token_factory):
+        operator = create_token_factory(token_type=TokenType.PLUS)
+
+        on_floats = specialize_binary(operator, 1.0, 2.0)
+        on_strings = specialize_binary(operator, "a", "b")
+
+        assert on_floats is not on_strings
+        assert on_floats(operator, 1.0, 2.0) == 3.0
+        assert on_strings(operator, "a", "b") == "ab"
+
+    def test_falls_back_to_generic_path(self, create_token_factory):
+        operator = create_token_factory(token_type=TokenType.LESS)
+        operation = specialize_binary(operator, 1.0, 2.0)
+
+        # Booleans are numbers to the generic path
+        assert operation(operator, True, 2.0) is True
+        with pytest.raises(YaploxRuntimeError) as excinfo:
+            operation(operator, 1.0, "a")
+
+        assert "Operands must be numbers." in str(excinfo.value)
+
+    def test_plus_falls_back_to_generic_path(self, create_token_factory):
+        operator = create_token_factory(token_type=TokenType.PLUS)
+        operation = specialize_binary(operator, "a", "b")
+
+        assert operation(operator, 1.0, 2.0) == 3.0
+        with pytest.raises(YaploxRuntimeError):
+            operation(operator, "a", 2.0)
+
+    def test_unknown_operator(self, create_token_factory):
+        operator = create_token_factory(token_type=TokenType.EOF)
+
+        with pytest.raises(YaploxRuntimeError):
+            specialize_binary(operator, 1.0, 2.0)
+
+    def test_negate(self, create_token_factory):
+        operator = create_token_factory(token_type=TokenType.MINUS)
+        operation = specialize_unary(operator)
+
+        assert operation(operator, 2.0) == -2.0
+        assert operation(operator, 2) == -2.0
+        with pytest.raises(YaploxRuntimeError):
+            operation(operator, "a")
@@ -0,0 +1,355 @@
+from pathlib import Path
+
+import pytest
+
+from yaplox.expr import Binary, Call, Literal, Logical, Unary, Variable
+from yaplox.interpreter import Interpreter
+from yaplox.optimizer import Optimizer
+from yaplox.parser import Parser
+from yaplox.resolver import Resolver
+from yaplox.scanner import Scanner
+from yaplox.stmt import Block, Expression, Function, If, Print, Return, Var, While
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+@pytest.fixture
+def optimize(mocker):
+    def optimize_source(source: str, backend=None):
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        optimizer = Optimizer(backend or Interpreter())
+        Resolver(interpreter=optimizer, on_error=mocker.MagicMock()).resolve(statements)
+        return optimizer.optimize(statements)
+
+    return optimize_source
+
+
+class TestOptimizer:
+    @pytest.mark.parametrize(
+        "code,value",
+        [
+            ("print (1 + 2) * 3;", 9.0),
+            ('print "a" + "b" + "c";', "abc"),
+            ("print -(2 - 4);", 2.0),
+            ("print !nil;", True),
+            ("print 1 < 2 == true;", True),
+            ('print "a" != nil;', True),
+            ('print nil or "b";', "b"),
+            ('print "a" and 2 > 3;', False),
+        ],
+    )
+    def test_fold(self, optimize, code, value):
+        statement = optimize(code)[0]
+
+        assert isinstance(statement, Print)
+        assert isinstance(statement.expression, Literal)
+        assert statement.expression.value == value
+
+    @pytest.mark.parametrize(
+        "code,node",
+        [
+            ('print 1 + "a";', Binary),
+            ("print 1 / 0;", Binary),
+            ("print 1 == true;", Binary),
+            ("print true + 1;", Binary),
+            ('print -"a";', Unary),
+        ],
+    )
+    def test_errors_are_not_folded(self, optimize, code, node):
+        statement = optimize(code)[0]
+
+        assert isinstance(statement.expression, node)
+
+    def test_keeps_variables(self, optimize):
+        statement = optimize("var a = 1;\nprint (a + 2) * (3 + 4);")[1]
+
+        expression = statement.expression
+        assert isinstance(expression.left, Binary)
+        assert isinstance(expression.right, Literal)
+        assert expression.right.value == 7.0
+
+    def test_constant_conditions(self, optimize):
+        code = """
+        if (1 < 2) print "then"; else print "else";
+        if (nil) print "then";
+        while (false) print "body";
+        while (true) if (false) print "body";
+        """
+        statements = optimize(code)
+
+        assert len(statements) == 2
+        assert isinstance(statements[0], Print)
+        assert statements[0].expression.value == "then"
+        assert isinstance(statements[1], While)
+        assert isinstance(statements[1].body, Block)
+        assert statements[1].body.statements == []
+
+    def test_keeps_branches(self, optimize):
+        statement = optimize("var a;\nif (a) print (1 + 1);")[1]
+
+        assert isinstance(statement, If)
+        assert statement.then_branch.expression.value == 2.0
+
+    def test_code_after_return(self, optimize):
+        code = """
+        fun f(a) {
+          if (a) {
+            return 1;
+            print "dead";
+          }
+          {
+            return 2;
+          }
+          print "dead";
+        }
+        """
+        function = optimize(code)[0]
+
+        assert len(function.body) == 2
+        assert len(function.body[0].then_branch.statements) == 1
+
+    def test_unused_locals(self, optimize):
+        code = """
+        var kept = 1;
+        fun f() {
+          var unused = 1;
+          var a;
+          var b = 2;
+          a = b;
+          unused = b;
+          return b;
+        }
+        """
+        statements = optimize(code)
+        body = statements[1].body
+
+        assert isinstance(statements[0], Var)
+        assert [type(statement) for statement in body] == [
+            Var,
+            Expression,
+            Expression,
+            Return,
+        ]
+        assert body[0].name.lexeme == "b"
+        # The assignments only leave their value
+        assert body[1].expression.name.lexeme == "b"
+
+    def test_keeps_locals_that_can_be_read(self, optimize):
+        code = """
+        fun f() {
+          var captured = 1;
+          var called = f();
+          fun get() {
+            return captured;
+          }
+        }
+        """
+        body = optimize(code)[0].body
+
+        assert len(body) == 3
+        assert isinstance(body[1].initializer, Call)
+
+    def test_removed_local_shifts_slots(self, run_code_block):
+        code = """
+        fun f() {
+          var unused;
+          var a = "a";
+          unused = a + "b";
+          {
+            var b = "b";
+            var c = nil;
+            print a + b;
+          }
+          return a;
+        }
+        print f();
+        """
+
+        assert run_code_block(code).out == "ab\na\n"
+
+    def test_errors_in_dead_code(self, run_code_block):
+        code = """
+        fun f() {
+          return;
+          print this;
+        }
+        """
+
+        assert (
+            run_code_block(code).err
+            == "[line 4] Error  at 'this' : Can't use 'this' outside of a class.\n"
+        )
+
+    def test_inline(self, optimize, mocker):
+        backend = mocker.MagicMock()
+        code = """
+        fun square(x) {
+          return x * x;
+        }
+        fun show(x) {
+          print square(x + 1);
+        }
+        """
+        statements = optimize(code, backend)
+        square = statements[0]
+        call = statements[1].body[0].expression
+
+        backend.inline.assert_called_once_with(call, square, square.body[0].value)
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "fun f(x) { return x; }\nf = nil;\nf(1);",
+            "fun f(x) { return x; }\nfun f(x) { return -x; }\nf(1);",
+            "fun f(x) { return x; }\nvar f = 1;\nf(1);",
+            "fun f(x) { return f(x); }\nf(1);",
+            "fun f(x) { return g(x); }\nfun g(x) { return f(x); }\nf(1);",
+            "fun f(x) { return g(x); }\nfun g(x) { print x; return f(x); }\ng(1);",
+            "fun f(x) { return g(x); }\nfun g(x) {\n  fun h() { f(x); }\n}\ng(1);",
+            "fun f(x) { print x; return x; }\nf(1);",
+            "fun f(x) { return x; }\nf(1, 2);",
+            "fun f(x) { return x; }\n{\n  fun f(x) { return -x; }\n  f(1);\n}",
+        ],
+    )
+    def test_not_inlined(self, optimize, mocker, code):
+        backend = mocker.MagicMock()
+        optimize(code, backend)
+
+        backend.inline.assert_not_called()
+
+    def test_inlined_function_redefined(self, capsys):
+        code = """
+        fun f(x) { return x + 1; }
+        fun g(x) { return f(x); }
+        print g(1);
+        """
+        yaplox = Yaplox()
+        yaplox.run(code)
+        # A later run declares a new `f`, which the inlined call has to notice
+        yaplox.run("fun f(x) { return x * 10; }\nprint g(2);")
+
+        assert capsys.readouterr().out == "2\n20\n"
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure"])
+    def test_mutually_recursive_not_inlined(self, run_code_block, backend):
+        code = """
+        fun even(n) { return n == 0 or odd(n - 1); }
+        fun odd(n) { return n != 0 and even(n - 1); }
+        fun never(x) { return never2(x); }
+        fun never2(x) { return never(x); }
+        print even(10);
+        """
+
+        assert run_code_block(code, backend) == ("True\n", "")
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure"])
+    def test_nested_inlined_helpers(self, run_code_block, backend):
+        # Every helper calls the one before it twice, inlined bodies that were
+        # compiled again for every call would take 2 ** 30 compilations
+        helpers = "".join(
+            f"fun f{n}(x) {{ return f{n - 1}(x) + f{n - 1}(x); }}\n"
+            for n in range(1, 31)
+        )
+        code = f"fun f0(x) {{ return x; }}\n{helpers}print f3(1);"
+
+        assert run_code_block(code, backend) == ("8\n", "")
+
+    def test_inlined_runtime_error(self, run_code_block):
+        code = """
+        fun add(a, b) {
+          return a +
+            b;
+        }
+        print add(1, 2);
+        print add(1, "b");
+        """
+        captured = run_code_block(code)
+
+        assert captured.out == "3\n"
+        assert (
+            captured.err
+            == "Operands must be two numbers or two strings in line [line3]\n"
+        )
+
+    def test_hoist_loop_invariant(self, optimize):
+        code = """
+        fun f(n) {
+          for (var i = 0; i < n * 2; i = i + 1) print i;
+        }
+        """
+        loop = optimize(code)[0].body[0].statements[1]
+
+        assert isinstance(loop, Block)
+        temporary, stmt = loop.statements
+        assert isinstance(temporary, Var)
+        assert temporary.name.lexeme == "$1"
+        assert isinstance(temporary.initializer, Binary)
+        assert isinstance(stmt, While)
+        assert isinstance(stmt.condition.right, Variable)
+        assert stmt.condition.right.name.lexeme == "$1"
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "var n = 1;\nwhile (n < 10 * 2) n = n + 1;",
+            "var n = 1;\nwhile (n * 2 < 10) n = n + 1;",
+            "fun g() {}\nvar n = 1;\nwhile (0 < n * 2) g();",
+            "fun f() {\n  var n = 1;\n  fun g() { n = 2; }\n"
+            "  while (0 < n * 2) g();\n}",
+            "var i = 0;\nvar n = 1;\nwhile (i < 3 and -n < 0) i = i + 1;",
+        ],
+    )
+    def test_not_hoisted(self, optimize, code):
+        statement = optimize(code)[-1]
+        if isinstance(statement, Function):
+            statement = statement.body[-1]
+
+        assert isinstance(statement, While)
+
+    def test_hoist_right_of_logical_that_cant_fail(self, optimize):
+        code = """
+        fun f(a, b) {
+          var i = 0;
+          while (i < 3 and a == b) i = i + 1;
+        }
+        """
+        loop = optimize(code)[0].body[1]
+
+        assert isinstance(loop, Block)
+        assert isinstance(loop.statements[1].condition, Logical)
+        assert loop.statements[1].condition.right.name.lexeme == "$1"
+
+    def test_hoisted_runtime_error(self, run_code_block):
+        code = """
+        var n = "a";
+        for (var i = 0; i < n
+          * 2; i = i + 1) print i;
+        """
+
+        assert run_code_block(code).err == "Operands must be numbers. in line [line4]\n"
+
+    @pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: path.stem)
+    def test_same_output_as_not_optimized(self, capsys, program):
+        source = program.read_text()
+
+        Yaplox(optimize=False).run(source)
+        expected = capsys.readouterr()
+        Yaplox(optimize=True).run(source)
+        captured = capsys.readouterr()
+
+        assert captured.out == expected.out
+        assert captured.err == expected.err
+
+    def test_same_runtime_error(self, run_code_block):
+        code = """
+        var a = 1;
+        print (1 + 2) *
+          (a + "b");
+        """
+
+        assert (
+            run_code_block(code).err
+            == "Operands must be two numbers or two strings in line [line4]\n"
+        )
@@ -1,7 +1,7 @@
 import pytest
 
 from yaplox.ast_printer import AstPrinter
-from yaplox.expr import Binary
+from yaplox.expr import Assign, Binary, Call, Get, Logical, Set, Variable
 from yaplox.parser import Parser
 from yaplox.scanner import Scanner
 from yaplox.stmt import Expression
@@ -156,3 +156,125 @@ class TestParser:
         assert on_parser_error_mock.called
 
         on_parser_error_mock.assert_called_once_with(tokens[1], "Expect variable name.")
+
+    def test_too_much_nesting(self, mocker):
+        on_parser_error_mock = mocker.MagicMock()
+
+        source = "print " + "(" * 2000 + "1" + ")" * 2000 + ";\nprint 2;"
+        tokens = Scanner(source).scan_tokens()
+        parser = Parser(tokens, on_token_error=on_parser_error_mock)
+        statements = parser.parse()
+
+        # The parser reports the error once, and continues after the statement
+        on_parser_error_mock.assert_called_once_with(tokens[150], "Too much nesting.")
+        assert len(statements) == 1
+        assert statements[0].expression.value == 2.0
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "{" * 300 + "print 1;" + "}" * 300,
+            "if (true) " * 300 + "print 1;",
+            "for (;;) " * 100 + "print 1;",
+            "fun f() { " * 300 + "print 1;" + " }" * 300,
+            "print 1" + " + 1" * 300 + ";",
+        ],
+    )
+    def test_too_much_nesting_skips_declaration(self, mocker, source):
+        on_parser_error_mock = mocker.MagicMock()
+
+        source = f"print 0;\n{source}\nprint 2;"
+        statements = Parser(
+            Scanner(source).scan_tokens(), on_token_error=on_parser_error_mock
+        ).parse()
+
+        on_parser_error_mock.assert_called_once()
+        token, message = on_parser_error_mock.call_args[0]
+        assert (token.line, message) == (2, "Too much nesting.")
+        assert [statement.expression.value for statement in statements] == [0.0, 2.0]
+
+    def test_nesting_at_limit(self, mocker):
+        on_parser_error_mock = mocker.MagicMock()
+
+        source = "{" * 148 + "print 1;" + "}" * 148
+        statements = Parser(
+            Scanner(source).scan_tokens(), on_token_error=on_parser_error_mock
+        ).parse()
+
+        assert not on_parser_error_mock.called
+        assert len(statements) == 1
+
+    def test_tokens_are_taken_lazily(self, mocker):
+        tokens = Scanner("print 1;\n" * 1000).scan_tokens()
+        taken = []
+
+        def stream():
+            for token in tokens:
+                taken.append(token)
+                yield token
+
+        parser = Parser(stream(), on_token_error=mocker.MagicMock())
+        statements = parser.iter_statements()
+        next(statements)
+
+        # Only the tokens ahead are taken, and the parsed ones are dropped
+        assert len(taken) < len(tokens)
+        assert len(parser.tokens) < len(taken)
+        assert len(list(statements)) == 999
+        assert taken == tokens
+
+    @pytest.mark.parametrize(
+        "source,expected",
+        [
+            ("1 - 2 - 3;", "(- (- 1.0 2.0) 3.0)"),
+            ("1 / 2 * 3;", "(* (/ 1.0 2.0) 3.0)"),
+            ("-1 * 2 + 3 < 4 == !5;", "(== (< (+ (* (- 1.0) 2.0) 3.0) 4.0) (! 5.0))"),
+            ("1 + 2 * 3 - 4;", "(- (+ 1.0 (* 2.0 3.0)) 4.0)"),
+            ("--1 >= (2 != 3);", "(>= (- (- 1.0)) (group (!= 2.0 3.0)))"),
+        ],
+    )
+    def test_precedence(self, mocker, source, expected):
+        on_error_mock = mocker.MagicMock()
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=on_error_mock).parse()
+
+        assert AstPrinter().print(statements[0].expression) == expected
+        assert not on_error_mock.called
+
+    def test_assignment_and_calls(self, mocker):
+        source = "a = b.c(d).e = f or g and h;"
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+
+        assign = statements[0].expression
+        assert isinstance(assign, Assign)
+        assert assign.name.lexeme == "a"
+        # Assignment is right associative, and binds looser than `or`
+        assert isinstance(assign.value, Set)
+        assert assign.value.name.lexeme == "e"
+        assert isinstance(assign.value.obj, Call)
+        assert isinstance(assign.value.obj.callee, Get)
+        assert isinstance(assign.value.obj.arguments[0], Variable)
+        logical = assign.value.value
+        assert isinstance(logical, Logical)
+        assert logical.operator.lexeme == "or"
+        assert isinstance(logical.right, Logical)
+        assert logical.right.operator.lexeme == "and"
+
+    @pytest.mark.parametrize(
+        "source,lexeme,message",
+        [
+            ("a + b = c;", "=", "Invalid assignment target."),
+            ("-a = 1;", "=", "Invalid assignment target."),
+            ("1 +;", ";", "Expect expression"),
+            ("a.;", ";", "Expect property name after '.'."),
+            ("super;", ";", "Expect '.' after 'super'."),
+        ],
+    )
+    def test_expression_errors(self, mocker, source, lexeme, message):
+        on_error_mock = mocker.MagicMock()
+        tokens = Scanner(source).scan_tokens()
+        Parser(tokens, on_token_error=on_error_mock).parse()
+
+        token, reported = on_error_mock.call_args[0]
+        assert (token.lexeme, reported) == (lexeme, message)
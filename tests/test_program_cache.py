@@ -0,0 +1,148 @@
+import os
+import pickle
+
+import pytest
+
+from yaplox import program_cache
+from yaplox.lazy_function import LazyFunction
+from yaplox.parser import Parser
+from yaplox.program_cache import ProgramCache
+from yaplox.yaplox import Yaplox
+
+
+@pytest.fixture
+def script(tmp_path):
+    return tmp_path / "script.lox"
+
+
+@pytest.fixture
+def run_file(tmp_path, script):
+    """ Run `script` like run_file does, with a cache in `tmp_path` """
+
+    def run(check: str = "hash", lazy: bool = False, scanner: str = "regex") -> Yaplox:
+        yaplox = Yaplox(backend="interpreter", scanner=scanner, lazy=lazy)
+        yaplox.cache = ProgramCache(str(tmp_path / "cache"), check, scanner)
+        source = Yaplox._load_file(str(script))
+        yaplox.run(source, str(script))
+        source.close()
+        return yaplox
+
+    return run
+
+
+class TestProgramCache:
+    def test_cached(self, run_file, script, capsys, mocker):
+        script.write_text("fun f(a) {\n  return a + 1;\n}\nprint f(1);")
+        run_file()
+        store = mocker.spy(ProgramCache, "store")
+        parse = mocker.spy(Parser, "parse")
+
+        run_file()
+
+        assert capsys.readouterr().out == "2\n2\n"
+        store.assert_not_called()
+        parse.assert_not_called()
+
+    def test_changed_source(self, run_file, script, capsys):
+        script.write_text("print 1;")
+        run_file()
+        script.write_text("print 2;")
+        run_file()
+
+        assert capsys.readouterr().out == "1\n2\n"
+
+    @pytest.mark.parametrize(
+        "name, value", [("cache_format", lambda: "changed"), ("__version__", "99.0.0")]
+    )
+    def test_changed_front_end(
+        self, run_file, script, tmp_path, mocker, monkeypatch, name, value
+    ):
+        script.write_text("print 1;")
+        run_file()
+        monkeypatch.setattr(program_cache, name, value)
+        store = mocker.spy(ProgramCache, "store")
+
+        run_file()
+
+        store.assert_called_once()
+        # The entry of the script is replaced
+        assert len(os.listdir(tmp_path / "cache")) == 1
+
+    def test_changed_scanner(self, run_file, script, mocker):
+        script.write_text("print 1;")
+        run_file(scanner="classic")
+        store = mocker.spy(ProgramCache, "store")
+
+        run_file(scanner="regex")
+        run_file(scanner="regex")
+
+        store.assert_called_once()
+
+    def test_front_end_modules(self):
+        names = {module.__name__ for module in program_cache.FRONT_END_MODULES}
+
+        assert {"yaplox.parser", "yaplox.scanner", "yaplox.regex_scanner"} <= names
+
+    def test_timestamp(self, run_file, script, capsys):
+        script.write_text("print 1;")
+        os.utime(script, ns=(0, 0))
+        run_file(check="timestamp")
+        # The same size and time, so the cached statements are used
+        script.write_text("print 2;")
+        os.utime(script, ns=(0, 0))
+        run_file(check="timestamp")
+        os.utime(script, ns=(1, 1))
+        run_file(check="timestamp")
+
+        assert capsys.readouterr().out == "1\n1\n2\n"
+
+    def test_errors_are_not_cached(self, run_file, script, tmp_path, capsys):
+        script.write_text("print ;")
+        run_file()
+        run_file()
+
+        assert capsys.readouterr().err == (
+            "[line 1] Error  at ';' : Expect expression\n" * 2
+        )
+        assert not (tmp_path / "cache").exists()
+
+    def test_lazy_functions(self, run_file, script, capsys):
+        script.write_text("fun f(a) {\n  return a * 2;\n}\nprint f(2);")
+        run_file(lazy=True)
+        yaplox = run_file(lazy=True)
+
+        assert capsys.readouterr().out == "4\n4\n"
+        function = next(iter(yaplox.interpreter.functions))
+        assert isinstance(function, LazyFunction)
+        assert function.loaded
+
+    def test_not_written(self, tmp_path):
+        directory = tmp_path / "cache"
+        directory.write_text("not a directory")
+        cache = ProgramCache(str(directory))
+
+        cache.store("script.lox", "print 1;", False, [])
+
+        assert cache.load("script.lox", "print 1;", False) is None
+
+    def test_unreadable(self, tmp_path):
+        cache = ProgramCache(str(tmp_path))
+        cache.store("script.lox", "print 1;", False, [])
+        entry = tmp_path / os.listdir(tmp_path)[0]
+        entry.write_bytes(entry.read_bytes()[:-4])
+
+        assert cache.load("script.lox", "print 1;", False) is None
+
+    def test_missing_class(self, tmp_path):
+        cache = ProgramCache(str(tmp_path))
+        cache.store("script.lox", "print 1;", False, [])
+        header = cache._header("script.lox", "print 1;", False)
+        # A class that was renamed since the entry was written
+        entry = tmp_path / os.listdir(tmp_path)[0]
+        entry.write_bytes(pickle.dumps(header) + b"cyaplox.stmt\nGone\n.")
+
+        assert cache.load("script.lox", "print 1;", False) is None
+
+    def test_unknown_check(self):
+        with pytest.raises(ValueError):
+            ProgramCache("cache", check="never")
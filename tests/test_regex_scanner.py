@@ -0,0 +1,121 @@
+import io
+import mmap
+from pathlib import Path
+
+import pytest
+
+from yaplox import scanner
+from yaplox.regex_scanner import RegexScanner
+from yaplox.scanner import Scanner, chunks
+from yaplox.token_type import TokenType
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+def _scan(scanner_class, source, on_error):
+    tokens = scanner_class(source, on_error=on_error).scan_tokens()
+    return [(t.token_type, t.lexeme, t.literal, t.line) for t in tokens]
+
+
+class TestRegexScanner:
+    @pytest.mark.parametrize(
+        "source",
+        [program.read_text() for program in PROGRAMS]
+        + [
+            '"multi\nline"\nprint a;',
+            "123foo_bar bar-stool spam_egg_1.3_chickens 13.",
+            "!*+-/=<> <= == != >= // operators\n/",
+            "café = 1;\r\n\tü_2;",
+            # Numbers are ASCII digits, other digits are in identifiers or errors
+            "1٣ ٣ 1.٣ x٣ 1² ²",
+        ],
+    )
+    def test_same_tokens_as_scanner(self, mocker, source):
+        expected_error = mocker.MagicMock()
+        on_error = mocker.MagicMock()
+
+        expected = _scan(Scanner, source, expected_error)
+
+        assert _scan(RegexScanner, source, on_error) == expected
+        assert on_error.call_args_list == expected_error.call_args_list
+
+    def test_unterminated_string(self, mocker):
+        on_error = mocker.MagicMock()
+        scanner = RegexScanner('+\n"This is an\nunterminated string', on_error=on_error)
+
+        tokens = scanner.scan_tokens()
+
+        assert [token.token_type for token in tokens] == [
+            TokenType.PLUS,
+            TokenType.EOF,
+        ]
+        on_error.assert_called_once_with(3, "Unterminated string.")
+
+    def test_bad_char(self, mocker):
+        on_error = mocker.MagicMock()
+        scanner = RegexScanner("1\n@ 2", on_error=on_error)
+
+        tokens = scanner.scan_tokens()
+
+        assert [token.literal for token in tokens] == [1.0, 2.0, None]
+        on_error.assert_called_once_with(2, "Unexpected character: @")
+
+    def test_chunks(self, tmp_path):
+        source = "print 1;\nprint 2;\n\nprint 3;"
+        path = tmp_path / "source.lox"
+        path.write_text(source)
+
+        with path.open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            pieces = list(chunks(mapped, size=4))
+        text_pieces = list(chunks(io.StringIO(source), size=4))
+
+        assert pieces == ["print 1;\n", "print 2;\n", "\nprint 3;"]
+        assert text_pieces == pieces
+        assert list(chunks(source)) == [source]
+
+    @pytest.mark.parametrize(
+        "source",
+        [program.read_text() for program in PROGRAMS]
+        + ['"multi\nline\nstring"\nprint a;', '1\n"unterminated\n\n', "1\n@ 2\n"],
+    )
+    def test_same_tokens_from_file(self, mocker, source):
+        expected_error = mocker.MagicMock()
+        on_error = mocker.MagicMock()
+        expected = _scan(RegexScanner, source, expected_error)
+        # Small pieces, so strings continue in the next one
+        read = chunks
+        mocker.patch.object(scanner, "chunks", lambda source: read(source, size=2))
+
+        assert _scan(RegexScanner, io.StringIO(source), on_error) == expected
+        assert on_error.call_args_list == expected_error.call_args_list
+
+    def test_tokens_are_taken_while_scanning(self, mocker):
+        source = io.StringIO("print 1;\nprint 2;\nprint 3;\n")
+        mocker.patch.object(scanner, "chunks", lambda source: chunks(source, size=1))
+        tokens = RegexScanner(source).iter_tokens()
+
+        assert next(tokens).lexeme == "print"
+        # The line that is scanned and the next one were read, not the last one
+        assert source.tell() == len("print 1;\nprint 2;\n")
+
+    def test_lexemes_are_shared(self):
+        tokens = RegexScanner("var total = total == total;\n1 == 2;").scan_tokens()
+
+        totals = [token.lexeme for token in tokens if token.lexeme == "total"]
+        equals = [token.lexeme for token in tokens if token.lexeme == "=="]
+        assert len(totals) == 3
+        assert totals[0] is totals[1] is totals[2]
+        assert equals[0] is equals[1]
+        assert not hasattr(tokens[0], "__dict__")
+
+    def test_selected_scanner(self):
+        assert Yaplox(scanner="regex").scanner is RegexScanner
+        assert Yaplox(scanner="classic").scanner is Scanner
+
+    def test_unknown_scanner(self):
+        with pytest.raises(ValueError) as excinfo:
+            Yaplox(scanner="telepathy")
+
+        assert "Unknown scanner 'telepathy'." in str(excinfo.value)
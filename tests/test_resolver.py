@@ -1,4 +1,6 @@
+from yaplox.parser import Parser
 from yaplox.resolver import Resolver
+from yaplox.scanner import Scanner
 from yaplox.token_type import TokenType
 
 
@@ -18,11 +20,12 @@ class TestResolver:
 
         # Assert that the identifier token has been added
         assert "identifier" in resolver.scopes[0]
-        assert resolver.scopes[0]["identifier"] is False
+        assert resolver.scopes[0]["identifier"].defined is False
+        assert resolver.scopes[0]["identifier"].slot == 0
 
         # And define the token
         resolver._define(test_token)
-        assert resolver.scopes[0]["identifier"] is True
+        assert resolver.scopes[0]["identifier"].defined is True
 
     def test_resolver(self, run_code_block):
         lines = """
@@ -109,3 +112,78 @@ class TestResolver:
         code = 'return "at top level";'
 
         assert "Can't return from top-level code." in run_code_block(code).err
+
+    def test_slots(self, mocker):
+        source = """
+        {
+          var a = 1;
+          var b = 2;
+          {
+            var c = 3;
+            print b + c;
+          }
+        }
+        """
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        interpreter = mocker.MagicMock()
+        Resolver(interpreter).resolve(statements)
+
+        # `b` is one scope up, as the second variable. `c` is the first one in the
+        # current scope. Uses are reported when the scope of the variable ends.
+        resolved = [call.args[1:] for call in interpreter.resolve.call_args_list]
+        assert resolved == [(0, 0), (1, 1)]
+
+    def test_upvalues(self, mocker):
+        source = """
+        fun outer() {
+          var a = 1;
+          var b = 2;
+          fun middle() {
+            fun inner() {
+              return b;
+            }
+            return inner;
+          }
+          return a;
+        }
+        """
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        interpreter = mocker.MagicMock()
+        Resolver(interpreter).resolve(statements)
+
+        outer = statements[0]
+        middle = outer.body[2]
+        inner = middle.body[0]
+        upvalues = {
+            call.args[0]: call.args[1]
+            for call in interpreter.resolve_function.call_args_list
+        }
+        # `middle` captures `b` from `outer`, so `inner` can capture it from `middle`
+        assert upvalues == {inner: [(False, 0, 0)], middle: [(True, 0, 1)], outer: []}
+        interpreter.capture.assert_called_once_with(outer.body[1].name)
+        interpreter.resolve_upvalue.assert_called_once_with(inner.body[0].value, 0)
+        # `a` is not captured and stays an ordinary local
+        interpreter.resolve.assert_any_call(outer.body[3].value, 0, 0)
+
+    def test_elide_scope(self, mocker):
+        source = """
+        {
+          var a = 1;
+          for (;;) {
+            {
+              print a;
+            }
+          }
+        }
+        """
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        interpreter = mocker.MagicMock()
+        Resolver(interpreter).resolve(statements)
+
+        # None of the blocks in the loop declare anything, so `a` is in the scope
+        # of the statement that prints it
+        assert interpreter.elide_scope.call_count == 2
+        interpreter.resolve.assert_called_once_with(mocker.ANY, 0, 0)
@@ -1,3 +1,5 @@
+import io
+
 import pytest
 
 from yaplox.scanner import Scanner
@@ -232,3 +234,13 @@ class TestScanner:
         assert tokens[8].lexeme == "_chickens"
 
         assert not on_error_mock.called
+
+    def test_file_source(self):
+        source = 'var a = "multi\nline";\nprint a;\n'
+
+        expected = Scanner(source).scan_tokens()
+        tokens = Scanner(io.StringIO(source)).scan_tokens()
+
+        assert [(t.token_type, t.lexeme, t.line) for t in tokens] == [
+            (t.token_type, t.lexeme, t.line) for t in expected
+        ]
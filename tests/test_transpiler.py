@@ -0,0 +1,160 @@
+import ast
+from pathlib import Path
+
+import pytest
+
+from yaplox.parser import Parser
+from yaplox.scanner import Scanner
+from yaplox.transpiler import Transpiler
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+class TestTranspiler:
+    @pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: path.stem)
+    def test_same_output_as_interpreter(self, run_code_block, program):
+        source = program.read_text()
+
+        expected = run_code_block(source, backend="interpreter")
+        captured = run_code_block(source, backend="python")
+
+        assert captured.out == expected.out
+        assert captured.err == expected.err
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "print 1;\nprint undefined;",
+            "undefined = 3;",
+            "fun f() {\n  return g();\n}\nf();",
+            "var a = 1;\na();",
+            "fun f(a) {}\nf(\n1,\n2\n);",
+            "class A {}\nA(1);",
+            'var s = "x";\ns.field = 1;',
+            "class A {}\nA()\n.nope();",
+            "var N = 1;\nclass B < N {}",
+            "class A {}\nclass B < A {\n m() {\n  return super.nope;\n }\n}\nB().m();",
+            'print -"s";',
+            'print 1\n<\n"a";',
+            "print 2 * nil;",
+        ],
+    )
+    def test_same_runtime_error_as_interpreter(self, capsys, code):
+        expected = Yaplox(backend="interpreter")
+        expected.run(code)
+        expected_captured = capsys.readouterr()
+
+        yaplox = Yaplox(backend="python")
+        yaplox.run(code)
+        captured = capsys.readouterr()
+
+        assert yaplox.had_runtime_error
+        assert expected.had_runtime_error
+        assert captured.err == expected_captured.err
+
+    def test_selected_backend(self):
+        assert isinstance(Yaplox(backend="python").interpreter, Transpiler)
+
+    def test_transpile(self, mocker):
+        source = """
+        var a = 1;
+        fun add(b) {
+          return a + b;
+        }
+        """
+        tokens = Scanner(source).scan_tokens()
+        statements = Parser(tokens, on_token_error=mocker.MagicMock()).parse()
+        module = Transpiler().transpile(statements)
+
+        script = module.body[0]
+        assert isinstance(script, ast.FunctionDef)
+        assert script.name == "rt_script"
+        assert script.body[0].names == ["g_a", "g_add"]
+        params = [node.arg for node in ast.walk(module) if isinstance(node, ast.arg)]
+        assert params == ["l1_b"]
+        compile(module, "<test>", "exec")
+
+    def test_closure_in_loop_gets_new_variable(self, run_code_block):
+        code = """
+        var first;
+        var second;
+        for (var i = 0; i < 2; i = i + 1) {
+          var captured = i;
+          fun get() {
+            return captured;
+          }
+          if (first == nil) first = get; else second = get;
+        }
+        print first();
+        print second();
+        """
+
+        assert run_code_block(code, backend="python").out == "0\n1\n"
+
+    def test_return_from_loop_with_closure(self, run_code_block):
+        code = """
+        fun find(n) {
+          var i = 0;
+          while (true) {
+            fun next() {
+              i = i + 1;
+            }
+            if (i == n) return i * 10;
+            next();
+          }
+        }
+        print find(3);
+        """
+
+        assert run_code_block(code, backend="python").out == "30\n"
+
+    def test_shadowing(self, run_code_block):
+        code = """
+        var a = "global";
+        {
+          var a = "outer";
+          {
+            var a = "inner";
+            print a;
+          }
+          print a;
+        }
+        print a;
+        """
+
+        assert run_code_block(code, backend="python").out == "inner\nouter\nglobal\n"
+
+    def test_globals_survive_between_runs(self, capsys):
+        yaplox = Yaplox(backend="python")
+        yaplox.run("var a = 1;")
+        yaplox.run("print a + 1;")
+
+        assert capsys.readouterr().out == "2\n"
+
+    def test_too_many_nested_loops(self, run_code_block):
+        code = "var i = 0;\n" + "while (i < 1) {\n" * 21 + "i = 1;\n" + "}" * 21
+
+        captured = run_code_block(code, backend="python")
+
+        assert captured.out == ""
+        assert captured.err.startswith("Too much nesting for the 'python' backend.")
+        # The other backends run it
+        assert run_code_block(code, backend="interpreter").err == ""
+
+    def test_nested_calls(self, run_code_block):
+        # Arguments emitted in both the fast and the slow call would double the code
+        # for every level
+        code = (
+            "fun f(x) { print x; return x + 1; }\n"
+            "class A { m(x) { return x * 2; } }\n"
+            "var a = A();\n"
+            f"print {'f(' * 30}1{')' * 30};\n"
+            f"print {'a.m(' * 30}1{')' * 30};\n"
+            "print f(nil(1));"
+        )
+
+        captured = run_code_block(code, backend="python")
+
+        assert captured.out == "".join(f"{n}\n" for n in range(1, 32)) + "1073741824\n"
+        assert captured.err == "Can only call functions and classes. in line [line6]\n"
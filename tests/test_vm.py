@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import pytest
+
+from yaplox.vm import VM
+from yaplox.yaplox import Yaplox
+
+PROGRAMS = sorted(Path(__file__).parent.joinpath("lox").glob("*.lox"))
+
+
+class TestVM:
+    @pytest.mark.parametrize("program", PROGRAMS, ids=lambda path: path.stem)
+    def test_same_output_as_interpreter(self, run_code_block, program):
+        source = program.read_text()
+
+        expected = run_code_block(source, backend="interpreter")
+        captured = run_code_block(source, backend="vm")
+
+        assert captured.out == expected.out
+        assert captured.err == expected.err
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "print undefined;",
+            "undefined = 3;",
+            "var a = 1;\na();",
+            "fun f(a) {}\nf(\n1,\n2\n);",
+            "class A {}\nA(1);",
+            "class A { init(a) {} }\nA();",
+            'var s = "x";\ns.field;',
+            'var s = "x";\ns.field = 1;',
+            'var s = "x";\ns.method();',
+            "class A {}\nA()\n.nope();",
+            "var N = 1;\nclass B < N {}",
+            "class A {}\nclass B < A {\n m() {\n  return super.nope();\n }\n}\n"
+            "B().m();",
+            "class A {}\nclass B < A {\n m() {\n  return super.nope;\n }\n}\nB().m();",
+            'print -"s";',
+            'print 1\n<\n"a";',
+            'print "a" + 1;',
+            "print 2 * nil;",
+            "print clock(1);",
+        ],
+    )
+    def test_same_runtime_error_as_interpreter(self, capsys, code):
+        expected = Yaplox(backend="interpreter")
+        expected.run(code)
+        expected_captured = capsys.readouterr()
+
+        yaplox = Yaplox(backend="vm")
+        yaplox.run(code)
+        captured = capsys.readouterr()
+
+        assert yaplox.had_runtime_error
+        assert expected.had_runtime_error
+        assert captured.err == expected_captured.err
+
+    def test_selected_backend(self):
+        assert isinstance(Yaplox(backend="vm").interpreter, VM)
+
+    def test_field_holding_function(self, run_code_block):
+        code = """
+        fun double(x) {
+          return x * 2;
+        }
+        class A {
+          init() {
+            this.f = double;
+          }
+        }
+        print A().f(21);
+        """
+
+        assert run_code_block(code, backend="vm").out == "42\n"
+
+    def test_stack_overflow(self, run_code_block):
+        code = """
+        fun forever(n) {
+          return forever(n + 1);
+        }
+        forever(0);
+        """
+
+        assert (
+            run_code_block(code, backend="vm").err
+            == "Stack overflow. in line [line3]\n"
+        )
+
+    def test_deep_recursion(self, run_code_block):
+        code = """
+        fun sum(n) {
+          if (n == 0) return 0;
+          return n + sum(n - 1);
+        }
+        print sum(99990);
+        """
+
+        assert run_code_block(code, backend="vm").out == "4999050045\n"
+
+    def test_max_frames(self, capsys):
+        yaplox = Yaplox(backend="vm")
+        yaplox.interpreter = VM(max_frames=3)
+        # f(2) nests exactly three calls
+        yaplox.run("fun f(n) {\n  if (n > 0) f(n - 1);\n}\nf(2);\nprint 1;\nf(3);")
+
+        assert capsys.readouterr() == ("1\n", "Stack overflow. in line [line2]\n")
+
+    def test_globals_survive_between_runs(self, capsys):
+        """ Like the REPL, every run continues with the globals of the last one """
+        yaplox = Yaplox(backend="vm")
+        yaplox.run("var a = 1;")
+        yaplox.run("print a + 1;")
+
+        assert capsys.readouterr().out == "2\n"
+
+    def test_closure_survives_runtime_error(self, capsys):
+        yaplox = Yaplox(backend="vm")
+        yaplox.run(
+            """
+            var get;
+            fun fail() {
+              var captured = "kept";
+              fun inner() {
+                return captured;
+              }
+              get = inner;
+              return nil + 1;
+            }
+            fail();
+            """
+        )
+        yaplox.run("print get();")
+
+        captured = capsys.readouterr()
+        assert (
+            captured.err
+            == "Operands must be two numbers or two strings in line [line9]\n"
+        )
+        assert captured.out == "kept\n"
@@ -45,3 +45,95 @@ class TestMain:
                 yaplox.main()
             assert pytest_wrapped_e.value.code == 64
             assert pytest_wrapped_e.type == SystemExit
+
+    def test_run_file_source(self, capsys, tmp_path):
+        path = tmp_path / "source.lox"
+        path.write_text('print "a";\n\nprint "b" + nil;\n')
+
+        yaplox = Yaplox()
+        yaplox.run(Yaplox._load_file(str(path)))
+
+        captured = capsys.readouterr()
+        assert captured.out == "a\n"
+        # Every line is read once
+        assert captured.err == (
+            "Operands must be two numbers or two strings in line [line3]\n"
+        )
+
+    def test_run_file_closes_source(self, tmp_path, mocker):
+        path = tmp_path / "source.lox"
+        path.write_text("print 1;\n")
+        run = mocker.patch.object(Yaplox, "run", side_effect=KeyboardInterrupt)
+
+        with pytest.raises(KeyboardInterrupt):
+            Yaplox().run_file(str(path))
+
+        # The file is unmapped when the run doesn't finish too
+        source = run.call_args[0][0]
+        assert source.closed
+
+    def test_run_empty_file(self, capsys, tmp_path):
+        path = tmp_path / "empty.lox"
+        path.write_text("")
+
+        Yaplox().run(Yaplox._load_file(str(path)))
+
+        assert capsys.readouterr() == ("", "")
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "vm", "python"])
+    def test_long_flat_chain(self, capsys, backend):
+        # The parser loops over the chain, the later stages recurse on it
+        yaplox = Yaplox(backend=backend)
+        yaplox.run("var a = 1;\nprint a" + " + a" * 3000 + ";")
+
+        assert capsys.readouterr() == (
+            "",
+            "[line 2] Error  at 'a' : Too much nesting.\n",
+        )
+        assert yaplox.had_error
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "vm", "python"])
+    def test_deep_blocks(self, capsys, backend):
+        yaplox = Yaplox(backend=backend)
+        yaplox.run("print 1;\n" + "{" * 300 + "print 2;" + "}" * 300 + "\nprint 3;")
+
+        assert capsys.readouterr() == (
+            "",
+            "[line 2] Error  at '{' : Too much nesting.\n",
+        )
+        assert yaplox.had_error
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "python"])
+    @pytest.mark.parametrize("lazy", [False, True])
+    def test_stack_overflow_is_runtime_error(self, capsys, tmp_path, backend, lazy):
+        # The calls exhaust the Python stack while the program runs
+        path = tmp_path / "overflow.lox"
+        path.write_text(
+            'print "start";\nfun f(n) {\n  return g(n) + 1;\n}\n'
+            "fun g(n) {\n  return f(n) + 1;\n}\nprint f(1);\n"
+        )
+
+        yaplox = Yaplox(backend=backend, lazy=lazy)
+        with pytest.raises(SystemExit) as pytest_wrapped_e:
+            yaplox.run_file(str(path))
+
+        assert pytest_wrapped_e.value.code == 70
+        out, err = capsys.readouterr()
+        assert out == "start\n"
+        # The innermost call is in `f` or in `g`
+        assert err in (
+            "Stack overflow. in line [line3]\n",
+            "Stack overflow. in line [line6]\n",
+        )
+        assert not yaplox.had_error
+
+    @pytest.mark.parametrize("backend", ["interpreter", "closure", "vm", "python"])
+    @pytest.mark.parametrize("optimize", [False, True])
+    def test_long_else_if_chain(self, capsys, backend, optimize):
+        branches = " else ".join(f"if (a == {n}) {{ print {n}; }}" for n in range(3000))
+        source = f"var a = 2999;\n{branches} else {{ print -1; }}\n"
+        yaplox = Yaplox(backend=backend, optimize=optimize)
+        yaplox.run(source)
+        yaplox.run(source.replace("2999", "3000", 1))
+
+        assert capsys.readouterr() == ("2999\n-1\n", "")